@@ -0,0 +1,186 @@
+""" Scaling benchmarks of the scheduler on synthetic task graphs
+
+Every shape in dag_generator.py is generated at each size, written out as
+JSON lines descriptions and scheduled in a fresh process so peak memory is
+that case's alone. Load, validation, prioritization and simulation are timed
+separately and the makespan is reported against a lower bound, the larger of
+the critical path and the total core time spread over every core. Results are
+written as JSON, pass an earlier run's results as --baseline to flag phases
+that got slower
+
+python3 benchmarks/bench_scaling.py --sizes 100 1000 10000 --output results.json
+python3 benchmarks/bench_scaling.py --output new.json --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import dag_generator
+
+PHASES = ('load', 'validation', 'prioritization', 'simulation')
+
+
+def peak_memory():
+    """ Peak resident memory of this process in bytes """
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(resources_path, tasks_path, compact, strategy):
+    """ Schedule one generated graph, returning its measurements """
+    import task_scheduler
+
+    ts = task_scheduler.TaskScheduler()
+    seconds = {}
+    start = time.perf_counter()
+    ts.load(resources_path, tasks_path, compact=compact)
+    seconds['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ts.check_circular_dependencies()
+    ts.check_resources_needed()
+    seconds['validation'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prioritized_tasks = ts.prioritize_tasks(strategy)
+    seconds['prioritization'] = time.perf_counter() - start
+
+    # The lower bound needs the original execution times, which the
+    # simulation uses up when scheduling Task objects
+    bound = ts.lower_bounds().makespan
+
+    start = time.perf_counter()
+    makespan = ts.simulate_events(prioritized_tasks)
+    seconds['simulation'] = time.perf_counter() - start
+
+    return {
+        'seconds': seconds,
+        'peak_memory_bytes': peak_memory(),
+        'makespan': makespan,
+        'lower_bound': bound,
+        'makespan_ratio': float(makespan) / bound if bound else 1.0,
+    }
+
+
+def bench(shape, task_count, seed, compact, strategy, workdir):
+    """ Generate a graph and schedule it in a child process """
+    directory = os.path.join(workdir, '{0}_{1}'.format(shape, task_count))
+    start = time.perf_counter()
+    paths = dag_generator.write_description(directory, shape, task_count, seed)
+    generate_seconds = time.perf_counter() - start
+
+    command = [sys.executable, os.path.realpath(__file__), '--run-case',
+               paths[0], paths[1], '--strategy', strategy]
+    if compact:
+        command.append('--compact')
+    output = subprocess.check_output(command)
+    shutil.rmtree(directory)
+
+    result = {'shape': shape, 'tasks': task_count, 'seed': seed,
+              'resources': len(dag_generator.resources(task_count, seed)),
+              'generate_seconds': generate_seconds}
+    result.update(json.loads(output.decode()))
+    return result
+
+
+def environment():
+    """ What the results were measured on, including the commit if run from
+        a git checkout """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=filepath, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """ Descriptions of each phase of each case that took more than tolerance
+        times longer than the baseline did, or whose makespan got worse """
+    previous = dict(((r['shape'], r['tasks'], r['seed']), r)
+                    for r in baseline['results'])
+    found = []
+    for result in results['results']:
+        before = previous.get((result['shape'], result['tasks'], result['seed']))
+        if before is None:
+            continue
+        case = '{0} {1} tasks'.format(result['shape'], result['tasks'])
+        for phase in PHASES:
+            old, new = before['seconds'][phase], result['seconds'][phase]
+            # Ignore noise on phases too quick to time reliably
+            if new > old * tolerance and new - old > 0.01:
+                found.append('{0}: {1} {2:.3f}s -> {3:.3f}s'.format(case, phase, old, new))
+        if result['makespan'] > before['makespan']:
+            found.append('{0}: makespan {1} -> {2}'.format(
+                case, before['makespan'], result['makespan']))
+    return found
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--shapes', nargs='+', choices=dag_generator.SHAPES,
+                           default=list(dag_generator.SHAPES))
+    argparser.add_argument('--sizes', type=int, nargs='+',
+                           default=[100, 1000, 10000, 100000, 1000000])
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--strategy', default='cores_full_time')
+    argparser.add_argument('--compact', action='store_true',
+                           help='schedule compact TaskGraphs rather than Task objects')
+    argparser.add_argument('--output', default=None,
+                           help='file to write the JSON results to, stdout by default')
+    argparser.add_argument('--baseline', default=None,
+                           help='earlier JSON results to check for regressions against')
+    argparser.add_argument('--tolerance', type=float, default=1.25,
+                           help='how many times slower than the baseline a phase may get')
+    argparser.add_argument('--run-case', nargs=2, metavar=('RESOURCES', 'TASKS'),
+                           help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case[0], args.run_case[1],
+                                  args.compact, args.strategy)))
+        sys.exit(0)
+
+    results = {'environment': environment(), 'compact': args.compact,
+               'strategy': args.strategy, 'results': []}
+    workdir = tempfile.mkdtemp()
+    try:
+        for task_count in args.sizes:
+            for shape in args.shapes:
+                result = bench(shape, task_count, args.seed, args.compact,
+                               args.strategy, workdir)
+                results['results'].append(result)
+                sys.stderr.write('{0:>12} {1:>8} tasks {2:>8.2f}s makespan {3:.3f}x lower bound\n'.format(
+                    shape, task_count, sum(result['seconds'].values()),
+                    result['makespan_ratio']))
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            sys.stderr.write('REGRESSION ' + line + '\n')
+        if found:
+            sys.exit(1)
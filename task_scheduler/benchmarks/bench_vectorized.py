@@ -0,0 +1,75 @@
+""" Compare the pure Python and numpy graph computations
+
+Builds random layered graphs and times the priority metric (which includes
+the topological order and path lengths) plus the oversized task check both
+ways, verifying the results match
+
+python3 benchmarks/bench_vectorized.py --sizes 10000 100000 1000000
+"""
+import argparse
+import array
+import os
+import random
+import sys
+import time
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import task_scheduler
+import vectorized
+
+
+def layered_graph(task_count, seed=0, width=1000, max_parents=3):
+    """ Random graph of task_count tasks in layers of width tasks, each
+        task's parents being picked from the layer before it """
+    rng = random.Random(seed)
+    parent_offsets = array.array('q', [0])
+    parents = array.array('q')
+    for i in range(task_count):
+        layer_start = (i // width) * width
+        if layer_start:
+            previous = range(layer_start - width, layer_start)
+            parents.extend(rng.sample(previous, rng.randint(1, max_parents)))
+        parent_offsets.append(len(parents))
+    return task_scheduler.TaskScheduler.TaskGraph(
+        ['task{0}'.format(i) for i in range(task_count)],
+        array.array('q', (rng.randint(1, 8) for i in range(task_count))),
+        array.array('q', (rng.randint(1, 1000) for i in range(task_count))),
+        parent_offsets, parents)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def bench(task_count, resource_cores):
+    graph = layered_graph(task_count)
+
+    largest = max(resource_cores)
+    graph.cache.clear()
+    graph.vectorized = False
+    python, python_time = timed(lambda: (graph.priority_metrics(),
+        [i for i, c in enumerate(graph.cores_required) if c > largest]))
+
+    graph.cache.clear()
+    numpy, numpy_time = timed(lambda: (vectorized.priority_metrics(graph),
+        vectorized.oversized_tasks(graph.cores_required, resource_cores)))
+
+    if python[0] != numpy[0].tolist() or python[1] != numpy[1].tolist():
+        raise AssertionError('numpy results differ at {0} tasks'.format(task_count))
+    return python_time, numpy_time
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--sizes', type=int, nargs='+',
+                           default=[10000, 100000, 1000000])
+    args = argparser.parse_args()
+
+    print('{0:>10} {1:>12} {2:>12} {3:>8}'.format('tasks', 'python (s)', 'numpy (s)', 'speedup'))
+    for task_count in args.sizes:
+        python_time, numpy_time = bench(task_count, [4, 6, 8])
+        print('{0:>10} {1:>12.3f} {2:>12.3f} {3:>7.1f}x'.format(
+            task_count, python_time, numpy_time, python_time / numpy_time))
@@ -0,0 +1,134 @@
+""" Seeded synthetic task graphs and matching resource sets for benchmarks
+
+Each shape is a generator of (cores_required, execution_time, parent ids)
+for tasks in id order, parents always being earlier tasks so every graph is
+acyclic. The same shape, size and seed always gives the same graph
+
+python3 benchmarks/dag_generator.py layered 100000 /tmp/graph --seed 1
+"""
+import argparse
+import json
+import os
+import random
+
+SHAPES = ('layered', 'fork_join', 'long_chain', 'wide_fan_out', 'random')
+
+# Largest core count any task asks for, every resource set has at least
+# one resource this big so no task is oversized
+MAX_TASK_CORES = 8
+
+
+def task_costs(rng):
+    return rng.randint(1, MAX_TASK_CORES), rng.randint(1, 100)
+
+
+def layered(task_count, rng):
+    """ Layers of about sqrt(task_count) tasks, each task depending on up to
+        three tasks of the layer before it """
+    width = max(1, int(task_count ** 0.5))
+    for i in range(task_count):
+        layer_start = (i // width) * width
+        parents = []
+        if layer_start:
+            previous = range(layer_start - width, layer_start)
+            parents = rng.sample(previous, rng.randint(1, min(3, width)))
+        yield task_costs(rng) + (parents,)
+
+
+def fork_join(task_count, rng, branches=16):
+    """ Chained blocks of a fork task, branches parallel tasks and a join
+        task, each fork depending on the join before it """
+    block = branches + 2
+    for i in range(task_count):
+        start = (i // block) * block
+        offset = i - start
+        if offset == 0:
+            parents = [start - 1] if start else []
+        elif offset <= branches:
+            parents = [start]
+        else:
+            parents = list(range(start + 1, i))
+        yield task_costs(rng) + (parents,)
+
+
+def long_chain(task_count, rng, chains=4):
+    """ A few long independent chains, task i following task i - chains """
+    for i in range(task_count):
+        yield task_costs(rng) + ([i - chains] if i >= chains else [],)
+
+
+def wide_fan_out(task_count, rng):
+    """ One root task every other task depends on """
+    for i in range(task_count):
+        yield task_costs(rng) + ([0] if i else [],)
+
+
+def random_dag(task_count, rng, max_parents=3, window=1000):
+    """ Up to max_parents parents picked at random from the window of tasks
+        before each task """
+    for i in range(task_count):
+        earlier = range(max(0, i - window), i)
+        parents = rng.sample(earlier, min(i, rng.randint(0, max_parents)))
+        yield task_costs(rng) + (sorted(parents),)
+
+
+GENERATORS = {
+    'layered': layered,
+    'fork_join': fork_join,
+    'long_chain': long_chain,
+    'wide_fan_out': wide_fan_out,
+    'random': random_dag,
+}
+
+
+def generate(shape, task_count, seed=0):
+    """ (cores_required, execution_time, parent ids) of each task of a seeded
+        graph of the given shape """
+    if shape not in GENERATORS:
+        raise ValueError('unknown graph shape "{0}"'.format(shape))
+    return GENERATORS[shape](task_count, random.Random(seed))
+
+
+def resources(task_count, seed=0):
+    """ (name, cores) of a resource set scaled to the graph, about one
+        resource per 500 tasks so they are kept busy """
+    rng = random.Random(seed)
+    count = max(2, task_count // 500)
+    cores = [MAX_TASK_CORES] + [rng.choice((4, 8, 16, 32)) for i in range(count - 1)]
+    return [('compute{0}'.format(i), c) for i, c in enumerate(cores)]
+
+
+def task_name(i):
+    return 'task{0}'.format(i)
+
+
+def write_description(directory, shape, task_count, seed=0):
+    """ Write a seeded graph as JSON lines task and resource descriptions,
+        returning their (resources path, tasks path) """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    resources_path = os.path.join(directory, 'resources.jsonl')
+    tasks_path = os.path.join(directory, 'tasks.jsonl')
+    with open(resources_path, 'w') as f:
+        for name, cores in resources(task_count, seed):
+            f.write(json.dumps({name: cores}) + '\n')
+    with open(tasks_path, 'w') as f:
+        for i, (cores, execution_time, parents) in enumerate(
+                generate(shape, task_count, seed)):
+            f.write(json.dumps({task_name(i): {
+                'cores_required': cores,
+                'execution_time': execution_time,
+                'parent_tasks': [task_name(p) for p in parents]}}) + '\n')
+    return resources_path, tasks_path
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('shape', choices=SHAPES)
+    argparser.add_argument('task_count', type=int)
+    argparser.add_argument('directory', help='where to write resources.jsonl and tasks.jsonl')
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args()
+
+    for path in write_description(args.directory, args.shape, args.task_count, args.seed):
+        print(path)
@@ -0,0 +1,183 @@
+""" Chain contraction, scheduling a smaller graph in place of a huge one
+
+A chain is a run of tasks each the only child of the one before it and each
+the only parent of the one after it, so nothing else ever waits on or feeds
+into the middle of it. Running a chain back to back on one resource is
+always a valid way of running it, so each chain is contracted into a single
+super-task taking the chain's total execution time, scheduled in place of
+its tasks and expanded back into a placement per task afterwards.
+
+Tasks in a chain normally have to need the same cores and memory, otherwise
+the super-task would hold the most any of them needs for the whole chain.
+max_waste allows chains whose tasks differ, so long as the cores left idle
+that way (cores times execution time) stay within that fraction of the
+chain's own core time. Other shapes, fork-join blocks say, can't be merged
+without running their parallel branches one after the other, so they're
+left as they are """
+import collections
+import operator
+
+# How much smaller the graph got, tasks before and after contracting and
+# the chains (of two or more tasks) contracted. uncoarsened_makespan is the
+# makespan of scheduling the graph as it is, if that was worked out too
+CoarseningReport = collections.namedtuple('CoarseningReport',
+    ['tasks', 'coarse_tasks', 'chains', 'makespan', 'uncoarsened_makespan'])
+
+
+class Coarsening:
+    """ A TaskGraph with its chains contracted, coarse being the smaller
+        TaskGraph. Super-task s stands for the task ids
+        member_ids[member_offsets[s]:member_offsets[s+1]] in chain order (CSR
+        layout, the same as the graph's links) and super_task maps task ids
+        back. Super-tasks are named after their first task and kept in the
+        order of it, so ties in priority still go the same way """
+    def __init__(self, graph, max_waste=0.0):
+        import array
+        import itertools
+        from task_scheduler import typed_array
+
+        self.graph = graph
+        n = len(graph)
+        cores = list(graph.cores_required)
+        memory = graph.memory_required
+        if memory is not None:
+            memory = list(memory)
+        times = list(graph.execution_times)
+        parent_offsets = list(graph.parent_offsets)
+        child_offsets = list(graph.child_offsets)
+        graph_parents = list(graph.parents)
+        children = list(graph.children)
+
+        # Task following each task in its chain, -1 for the last
+        following = [-1] * n
+        follows = bytearray(n)
+        for i in range(n):
+            if child_offsets[i+1] - child_offsets[i] == 1:
+                c = children[child_offsets[i]]
+                if parent_offsets[c+1] - parent_offsets[c] == 1:
+                    following[i] = c
+                    follows[c] = 1
+
+        # Walk each chain from its first task, splitting it wherever taking
+        # the next task would leave too many cores idle. Tasks caught in a
+        # dependency cycle have no first task and are left out. Each
+        # super-task needs the most cores any of its tasks do for the time
+        # they take between them
+        ids = []
+        offsets = [0]
+        super_cores = []
+        super_times = []
+        self.super_task = super_task = [None] * n
+        for i in range(n):
+            if follows[i]:
+                continue
+            head = i
+            widest, work, span = cores[i], cores[i] * times[i], times[i]
+            super_task[i] = len(super_cores)
+            ids.append(i)
+            j = following[i]
+            while j != -1:
+                c, t = cores[j], times[j]
+                same_memory = memory is None or memory[j] == memory[head]
+                if same_memory and c == widest:
+                    work, span = work + c * t, span + t
+                elif same_memory and max_waste and \
+                        max(widest, c) * (span + t) - (work + c * t) <= max_waste * (work + c * t):
+                    widest, work, span = max(widest, c), work + c * t, span + t
+                else:
+                    offsets.append(len(ids))
+                    super_cores.append(widest)
+                    super_times.append(span)
+                    head = j
+                    widest, work, span = c, c * t, t
+                super_task[j] = len(super_cores)
+                ids.append(j)
+                j = following[j]
+            offsets.append(len(ids))
+            super_cores.append(widest)
+            super_times.append(span)
+        self.member_ids = array.array('q', ids)
+        self.member_offsets = array.array('q', offsets)
+
+        # Links between chains, a chain's parents being its first task's and
+        # its children its last task's. Those are all the first task of
+        # their own chain, so children mapped to super-tasks stay in id order
+        heads = [ids[o] for o in offsets[:-1]]
+        tails = [ids[o - 1] for o in offsets[1:]]
+        parents = array.array('q', [super_task[p] for i in heads
+                                    for p in graph_parents[parent_offsets[i]:parent_offsets[i+1]]])
+        parent_links = array.array('q', [0])
+        parent_links.extend(itertools.accumulate(
+            parent_offsets[i+1] - parent_offsets[i] for i in heads))
+        chain_children = array.array('q', [super_task[c] for i in tails
+                                           for c in children[child_offsets[i]:child_offsets[i+1]]])
+        child_links = array.array('q', [0])
+        child_links.extend(itertools.accumulate(
+            child_offsets[i+1] - child_offsets[i] for i in tails))
+        names = graph.names
+        self.coarse = type(graph)([names[i] for i in heads],
+            typed_array(super_cores), typed_array(super_times),
+            parent_links, parents, child_links, chain_children)
+        if memory is not None:
+            self.coarse.memory_required = typed_array([memory[i] for i in heads])
+        self.coarse.vectorized = graph.vectorized
+
+        # Whatever the graph already worked out carries over, a chain comes
+        # in the topological order where its first task did and its path
+        # lengths are those of its last task (upward) and first (downward)
+        cache = graph.cache
+        if 'topological_order' in cache:
+            is_head = bytearray(n)
+            for i in heads:
+                is_head[i] = 1
+            self.coarse.cache['topological_order'] = [
+                super_task[i] for i in cache['topological_order'] if is_head[i]]
+        if 'path_lengths' in cache:
+            upward, downward = cache['path_lengths']
+            self.coarse.cache['path_lengths'] = ([upward[i] for i in tails],
+                                                 [downward[i] for i in heads])
+
+    def members(self, s):
+        """ Task ids super-task s stands for, in chain order """
+        return self.member_ids[self.member_offsets[s]:self.member_offsets[s+1]]
+
+    def chains(self):
+        """ How many super-tasks stand for two or more tasks """
+        offsets = self.member_offsets
+        return sum(1 for s in range(len(offsets) - 1) if offsets[s+1] - offsets[s] > 1)
+
+    def expand_order(self, order):
+        """ Task ids in the priority order of super-task ids order """
+        ids, offsets = self.member_ids, self.member_offsets
+        return [j for s in order for j in ids[offsets[s]:offsets[s+1]]]
+
+    def expand(self, record, resources):
+        """ (task id, resource name, start, end) of every task, from the
+            (super-task id, resource name, start, end) of every super-task.
+            Each chain runs back to back on its super-task's resource, only
+            the running total of its execution times being scaled to the
+            resource's speed, so it ends when the super-task does """
+        by_name = dict((r.name, r) for r in resources)
+        times = self.graph.execution_times
+        ids, offsets = self.member_ids, self.member_offsets
+        placements = []
+        for s, name, start, end in record:
+            first, last = offsets[s], offsets[s+1]
+            if last - first == 1:
+                placements.append((ids[first], name, start, end))
+                continue
+            resource = by_name[name]
+            if resource.speed == 1:
+                for j in ids[first:last]:
+                    placements.append((j, name, start, start + times[j]))
+                    start += times[j]
+                continue
+            done = 0
+            for j in ids[first:last]:
+                begin = start + resource.scaled_time(done)
+                done += times[j]
+                placements.append((j, name, begin, start + resource.scaled_time(done)))
+        # Placements stay in the order tasks start, the same as a simulation
+        # records them
+        placements.sort(key=operator.itemgetter(2))
+        return placements
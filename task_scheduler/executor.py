@@ -0,0 +1,209 @@
+""" Running scheduled tasks for real on this machine
+
+Tasks can name a command (run through the shell) in their description. A
+LocalExecutor takes the placements of a ScheduleResult and runs those
+commands in asyncio subprocesses, each on the resource the scheduler put it
+on. The cores of every resource are mapped onto this machine's CPUs and a
+task is pinned (with os.sched_setaffinity, where there is one) to the CPUs
+of the cores it was given, so resources never run more than their cores'
+worth of tasks at once.
+
+Tasks start as soon as their parents have actually finished and their
+resource has the cores free, in the order the schedule started them, rather
+than waiting for their predicted tick. Tasks without a command finish as
+soon as they start. If a command fails the tasks depending on it are skipped """
+import asyncio
+import collections
+import functools
+import json
+import os
+import sys
+import time
+
+# One task run for real, the predicted start and end in ticks from the
+# schedule next to the actual ones in seconds from the start of the run.
+# returncode is None (as are start and end) for tasks skipped because a
+# task they depend on failed
+ExecutionRecord = collections.namedtuple('ExecutionRecord', [
+    'task', 'resource', 'cpus', 'predicted_start', 'predicted_end', 'start',
+    'end', 'returncode'])
+
+# Environment variable telling a command which CPUs it's been given
+CPUS_VARIABLE = 'TASK_SCHEDULER_CPUS'
+
+
+def available_cpus():
+    """ CPUs this process may run on """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_cpus(resources, cpus):
+    """ CPU for each core of each resource, keyed by resource name. Cores are
+        handed out in turn, so resources share CPUs once there are more cores
+        than CPUs """
+    mapping = {}
+    position = 0
+    for resource in resources:
+        mapping[resource.name] = [cpus[(position + c) % len(cpus)]
+                                  for c in range(resource.cores_total)]
+        position += resource.cores_total
+    return mapping
+
+
+def pin(cpus):
+    """ Restrict the calling process to cpus, run in each child before it
+        starts its command """
+    os.sched_setaffinity(0, cpus)
+
+
+async def run_command(command, cpus, cwd=None):
+    """ Run command through the shell pinned to cpus, returning its exit
+        status """
+    env = dict(os.environ)
+    env[CPUS_VARIABLE] = ','.join(str(c) for c in sorted(cpus))
+    preexec_fn = None
+    if hasattr(os, 'sched_setaffinity'):
+        preexec_fn = functools.partial(pin, cpus)
+    process = await asyncio.create_subprocess_shell(command, cwd=cwd, env=env,
+                                                    preexec_fn=preexec_fn)
+    return await process.wait()
+
+
+class ExecutionResult:
+    def __init__(self, records, seconds):
+        """ records holds an ExecutionRecord for each task in the order they
+            started, skipped tasks last, and seconds the wall time taken """
+        self.records = records
+        self.seconds = seconds
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def failed(self):
+        """ Records of tasks that ran and failed """
+        return [r for r in self.records if r.returncode not in (0, None)]
+
+    def skipped(self):
+        return [r for r in self.records if r.returncode is None]
+
+    def write(self, f):
+        """ Write the records as JSON lines, followed by a summary line """
+        for record in self.records:
+            f.write(json.dumps(record._asdict()) + '\n')
+        f.write(json.dumps({'seconds': self.seconds,
+                            'failed': len(self.failed()),
+                            'skipped': len(self.skipped())}) + '\n')
+
+    def save(self, path):
+        """ Write the records to path, '-' for stdout """
+        if path == '-':
+            self.write(sys.stdout)
+        else:
+            with open(path, 'w') as f:
+                self.write(f)
+
+
+class LocalExecutor:
+    def __init__(self, scheduler, result, cpus=None, cwd=None):
+        """ Run the tasks of scheduler following result, a ScheduleResult
+            from it. cpus lists the CPUs to map resource cores onto, all
+            of this process's by default, and cwd is where commands run """
+        graph = scheduler.task_graph()
+        self.graph = graph
+        self.commands = graph.commands or [None] * len(graph)
+        self.cwd = cwd
+        self.cpus = core_cpus(scheduler.resources, cpus or available_cpus())
+        self.placements = dict((graph.index(p.task), p) for p in result.placements)
+        if len(self.placements) != len(graph):
+            raise ValueError('the schedule does not place every task')
+        # Start tasks in the order the schedule started them
+        self.rank = dict((graph.index(p.task), position)
+                         for position, p in enumerate(result.placements))
+
+    def run(self):
+        """ Run every task, returning an ExecutionResult """
+        return asyncio.run(self.run_tasks())
+
+    async def run_tasks(self):
+        graph = self.graph
+        started = time.monotonic()
+        # Free cores of each resource, as positions into its CPU list
+        free = dict((name, list(range(len(cpus))))
+                    for name, cpus in self.cpus.items())
+        parents_left = [len(graph.task_parents(i)) for i in range(len(graph))]
+        ready = sorted((self.rank[i], i) for i in range(len(graph))
+                       if parents_left[i] == 0)
+        records = {}
+        running = {}
+        skipped = set()
+
+        def finish(i, cores, returncode):
+            """ Record task i as done, freeing its cores and readying its
+                children or skipping everything below it if it failed """
+            placement = self.placements[i]
+            free[placement.resource].extend(cores)
+            records[i] = records[i]._replace(end=time.monotonic() - started,
+                                             returncode=returncode)
+            if returncode != 0:
+                below = list(graph.task_children(i))
+                while below:
+                    c = below.pop()
+                    if c not in skipped:
+                        skipped.add(c)
+                        below.extend(graph.task_children(c))
+                return
+            for c in graph.task_children(i):
+                parents_left[c] -= 1
+                if parents_left[c] == 0 and c not in skipped:
+                    ready.append((self.rank[c], c))
+
+        while ready or running:
+            # Start whatever ready tasks have their cores free, in schedule
+            # order. Tasks without a command finish straight away, which can
+            # ready more tasks so go round until nothing more starts
+            progress = True
+            while progress:
+                progress = False
+                pending = sorted(ready)
+                del ready[:]
+                for rank, i in pending:
+                    placement = self.placements[i]
+                    cores_free = free[placement.resource]
+                    cores_required = graph.cores_required[i]
+                    if cores_required > len(cores_free):
+                        ready.append((rank, i))
+                        continue
+                    cores_free.sort()
+                    cores = cores_free[:cores_required]
+                    del cores_free[:cores_required]
+                    cpus = set(self.cpus[placement.resource][c] for c in cores)
+                    records[i] = ExecutionRecord(placement.task, placement.resource,
+                        sorted(cpus), placement.start, placement.end,
+                        time.monotonic() - started, None, None)
+                    progress = True
+                    if self.commands[i]:
+                        running[asyncio.ensure_future(
+                            run_command(self.commands[i], cpus, self.cwd))] = (i, cores)
+                    else:
+                        finish(i, cores, 0)
+
+            if not running:
+                break
+            done, _ = await asyncio.wait(list(running),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                i, cores = running.pop(future)
+                finish(i, cores, future.result())
+
+        ran = sorted(records.values(), key=lambda r: r.start)
+        names = graph.names
+        ran.extend(ExecutionRecord(names[i], self.placements[i].resource, [],
+                                   self.placements[i].start, self.placements[i].end,
+                                   None, None, None)
+                   for i in sorted(skipped))
+        return ExecutionResult(ran, time.monotonic() - started)
@@ -0,0 +1,144 @@
+""" Compiled binary form of parsed and validated task/resource descriptions
+
+Compiled graphs are written to a cache directory under a hash of the
+description files they came from, later runs on the same files memory map
+the compiled graph instead of parsing the descriptions all over again """
+import array
+import collections
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+FORMAT_VERSION = 4
+
+# The byte order is part of the magic so a cache written on another machine
+# is treated as a miss rather than misread
+MAGIC = b'TSGRAPH' + (b'L' if sys.byteorder == 'little' else b'B')
+
+# magic, version, task count, parent link count, resource count,
+# task names size, resource names size, task commands size, task memory
+# count, resource memory count
+HEADER = struct.Struct('=8sQQQQQQQQQ')
+
+# Tasks are indexed by their position in task_names, parents of task i are
+# parents[parent_offsets[i]:parent_offsets[i+1]] (CSR layout). Resources are
+# sorted by name, with speeds as floats. task_commands holds the command of
+# each task ('' for tasks without one), or is None if no task has one.
+# memory_required is None if no task needs memory, resource_memory None if
+# no resource limits it and -1 for each resource that doesn't
+CompiledGraph = collections.namedtuple('CompiledGraph', [
+    'task_names', 'cores_required', 'execution_times', 'parent_offsets',
+    'parents', 'resource_names', 'resource_cores', 'resource_speeds',
+    'task_commands', 'memory_required', 'resource_memory'],
+    defaults=(None, None, None))
+
+
+def description_hash(*paths):
+    """ Hash of the contents of the given description files """
+    digest = hashlib.sha256('{0}:{1}'.format(FORMAT_VERSION, len(paths)).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        # Keep the boundary between files so contents can't shift between them
+        digest.update(b'\0' + str(os.path.getsize(path)).encode())
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir, resources_path, tasks_path):
+    return os.path.join(cache_dir,
+        description_hash(resources_path, tasks_path) + '.tsgraph')
+
+
+def join_names(names):
+    blob = '\0'.join(names).encode('utf-8')
+    if len(names) and blob.count(b'\0') != len(names) - 1:
+        raise ValueError('names containing NUL characters can not be compiled')
+    return blob
+
+
+def split_names(blob, count):
+    if count == 0:
+        return []
+    return bytes(blob).decode('utf-8').split('\0')
+
+
+def write_graph(path, graph):
+    """ Write a CompiledGraph, via a temporary file so readers never see a
+        partially written graph """
+    task_names = join_names(graph.task_names)
+    resource_names = join_names(graph.resource_names)
+    task_commands = join_names(graph.task_commands) if graph.task_commands else b''
+    memory_required = graph.memory_required or []
+    resource_memory = graph.resource_memory or []
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(graph.task_names),
+            len(graph.parents), len(graph.resource_names), len(task_names),
+            len(resource_names), len(task_commands), len(memory_required),
+            len(resource_memory)))
+        for values in (graph.cores_required, graph.execution_times,
+                       graph.parent_offsets, graph.parents, graph.resource_cores):
+            array.array('q', values).tofile(f)
+        array.array('d', graph.resource_speeds).tofile(f)
+        for values in (memory_required, resource_memory):
+            array.array('q', values).tofile(f)
+        f.write(task_names)
+        f.write(resource_names)
+        f.write(task_commands)
+    os.replace(tmp_path, path)
+
+
+def read_graph(path):
+    """ Memory map a CompiledGraph written by write_graph, the numeric fields
+        are views straight onto the mapped file. Returns None if the file
+        isn't a compiled graph this version can read """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            return None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    (magic, version, task_count, link_count, resource_count,
+     task_names_size, resource_names_size, task_commands_size,
+     task_memory_count, resource_memory_count) = HEADER.unpack_from(view)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        return None
+    counts = ((task_count, 'q'), (task_count, 'q'), (task_count + 1, 'q'),
+              (link_count, 'q'), (resource_count, 'q'), (resource_count, 'd'),
+              (task_memory_count, 'q'), (resource_memory_count, 'q'))
+    # A file cut short or padded out is a miss rather than a wrong graph
+    if task_memory_count not in (0, task_count) or \
+            resource_memory_count not in (0, resource_count) or \
+            HEADER.size + sum(count * 8 for count, _ in counts) + task_names_size + \
+            resource_names_size + task_commands_size != len(view):
+        return None
+
+    offset = HEADER.size
+    fields = []
+    for count, typecode in counts:
+        size = count * 8
+        fields.append(view[offset:offset+size].cast(typecode))
+        offset += size
+    try:
+        task_names = split_names(view[offset:offset+task_names_size], task_count)
+        offset += task_names_size
+        resource_names = split_names(view[offset:offset+resource_names_size],
+                                     resource_count)
+        offset += resource_names_size
+        task_commands = None
+        if task_commands_size:
+            task_commands = split_names(view[offset:offset+task_commands_size],
+                                        task_count)
+    except UnicodeDecodeError:
+        return None
+    if len(task_names) != task_count or len(resource_names) != resource_count or \
+            (task_commands is not None and len(task_commands) != task_count):
+        return None
+    (cores_required, execution_times, parent_offsets, parents, resource_cores,
+     resource_speeds, memory_required, resource_memory) = fields
+    return CompiledGraph(task_names, cores_required, execution_times,
+        parent_offsets, parents, resource_names, resource_cores, resource_speeds,
+        task_commands, memory_required if task_memory_count else None,
+        resource_memory if resource_memory_count else None)
@@ -0,0 +1,167 @@
+""" Anytime improvement of list schedules by local search over priority orders
+
+Starting from a priority order (normally the one find_schedule used) tasks on
+the critical chain of the current schedule that sat waiting for a resource
+are moved ahead of tasks that got placed while they waited, keeping changes
+by simulated annealing until the time budget runs out or the schedule hits
+its lower bound.
+
+Moving a task x ahead in the order only changes how x compares to other
+tasks, and the order of ready tasks is all that's ever compared, so the new
+schedule is the same as the old one up to the tick x became ready. Each
+candidate is simulated from that tick on, picking up the placements made
+before it, rather than from the start """
+import bisect
+import math
+import random
+import time
+
+# Critical chains in a row with nothing to move before giving up
+MAX_STUCK = 20
+
+
+class Candidate:
+    """ A priority order along with the schedule it gave, record holding
+        (task id, resource name, start, end) in the order tasks were placed """
+    def __init__(self, order, record, makespan):
+        self.order = order
+        self.record = record
+        self.makespan = makespan
+        self.starts = [start for _, _, start, _ in record]
+        self.times = None
+
+    def task_times(self, task_count):
+        """ Start and end tick of each task by id """
+        if self.times is None:
+            start = [None] * task_count
+            end = [None] * task_count
+            for i, _, s, e in self.record:
+                start[i] = s
+                end[i] = e
+            self.times = (start, end)
+        return self.times
+
+
+class LocalSearch:
+    def __init__(self, scheduler, graph, rng):
+        self.scheduler = scheduler
+        self.graph = graph
+        self.rng = rng
+        self.evaluations = 0
+
+    def evaluate(self, order, since=0, previous=None):
+        """ Simulate order, picking up previous's schedule at tick since when
+            given. previous must have made the same choices as order would up
+            to since """
+        graph = self.graph
+        self.evaluations += 1
+        if previous is None or since == 0:
+            record = []
+            makespan = self.scheduler.simulate_graph(graph, order, record=record)
+            return Candidate(order, record, makespan)
+
+        # Everything placed before since carries over, finished or running
+        prefix = previous.record[:bisect.bisect_left(previous.starts, since)]
+        record = []
+        makespan = self.scheduler.resume_graph(graph, order, prefix, since, record)
+        return Candidate(order, record, makespan)
+
+    def ready_time(self, i, end):
+        return max([end[p] for p in self.graph.task_parents(i)] or [0])
+
+    def critical_chain(self, candidate):
+        """ Tasks along a chain ending with the last task to finish, each
+            waiting on the one before it either as a parent or for the
+            resources it freed up """
+        graph = self.graph
+        start, end = candidate.task_times(len(graph))
+        ends_at = {}
+        for i, _, _, e in candidate.record:
+            ends_at.setdefault(e, []).append(i)
+        i = max(ends_at[candidate.makespan])
+        chain = []
+        while True:
+            chain.append(i)
+            if start[i] == 0:
+                break
+            blockers = [p for p in graph.task_parents(i) if end[p] == start[i]]
+            blockers = blockers or ends_at.get(start[i])
+            if not blockers:
+                break
+            i = self.rng.choice(blockers)
+        return chain
+
+    def neighbour(self, candidate):
+        """ A changed priority order and the tick the schedule can be picked
+            up from, or None if nothing on the critical chain can move """
+        start, end = candidate.task_times(len(self.graph))
+        delayed = [(i, self.ready_time(i, end)) for i in self.critical_chain(candidate)]
+        delayed = [(i, ready) for i, ready in delayed if start[i] > ready]
+        if not delayed:
+            return None
+        i, ready = self.rng.choice(delayed)
+
+        # Move the task ahead of one of the tasks placed while it waited, or
+        # anywhere earlier if those all come after it already
+        order = candidate.order
+        position = order.index(i)
+        placed_while_waiting = candidate.record[
+            bisect.bisect_left(candidate.starts, ready):
+            bisect.bisect_left(candidate.starts, start[i])]
+        targets = [order.index(j) for j, _, _, _ in placed_while_waiting]
+        targets = [t for t in targets if t < position]
+        if targets:
+            target = self.rng.choice(targets)
+        elif position:
+            target = self.rng.randrange(position)
+        else:
+            return None
+        order = order[:target] + [i] + order[target:position] + order[position+1:]
+        return order, ready
+
+
+def improve(scheduler, order, budget, seed=0, max_iterations=None, bound=0,
+            profiler=None):
+    """ Search for a better priority order than order (task ids) for up to
+        budget seconds, returning the best Candidate found. Stops early once
+        the makespan reaches bound """
+    graph = scheduler.task_graph()
+    rng = random.Random(seed)
+    search = LocalSearch(scheduler, graph, rng)
+    deadline = time.perf_counter() + budget
+
+    current = best = search.evaluate(list(order))
+    temperature = max(1.0, 0.01 * best.makespan)
+    iterations = accepted = stuck = 0
+    while best.makespan > bound and time.perf_counter() < deadline:
+        if max_iterations is not None and iterations >= max_iterations:
+            break
+        iterations += 1
+        move = search.neighbour(current)
+        if move is None:
+            # Nothing on this critical chain can move, try another chain
+            # from the best schedule, giving up if none ever can
+            stuck += 1
+            if stuck > MAX_STUCK:
+                break
+            current = best
+            continue
+        stuck = 0
+        order, since = move
+        candidate = search.evaluate(order, since, current)
+
+        # Annealing, worse schedules are taken less often as the budget runs
+        # out and the larger the loss
+        remaining = max(0.0, deadline - time.perf_counter()) / budget if budget else 0
+        delta = candidate.makespan - current.makespan
+        if delta <= 0 or rng.random() < math.exp(-delta / (temperature * remaining + 1e-9)):
+            current = candidate
+            accepted += 1
+            if current.makespan < best.makespan:
+                best = current
+
+    if profiler is not None:
+        profiler.count('local_search_iterations', iterations)
+        profiler.count('local_search_accepted', accepted)
+        profiler.count('local_search_evaluations', search.evaluations)
+    return best
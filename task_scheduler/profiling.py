@@ -0,0 +1,145 @@
+""" Per phase instrumentation of scheduling runs
+
+A Profiler records the wall time of each phase of a run (loading,
+validation, prioritization, simulation), how often hot functions were
+called, counters like events processed and optionally the tracemalloc peak
+of each phase. Schedulers only touch a profiler when one has been set, so
+runs without one pay nothing for it """
+import collections
+import functools
+import json
+import sys
+import time
+
+
+class Phase:
+    """ Totals for every run of one named phase """
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.calls = 0
+        self.memory_peak = None
+
+    def report(self):
+        report = collections.OrderedDict([
+            ('name', self.name), ('seconds', self.seconds), ('calls', self.calls)])
+        if self.memory_peak is not None:
+            report['tracemalloc_peak_bytes'] = self.memory_peak
+        return report
+
+
+class Profiler:
+    def __init__(self, memory=False):
+        """ memory has tracemalloc track the peak memory of each phase, which
+            slows everything down a good deal """
+        self.memory = memory
+        self.phases = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+        # Running memory peak of each phase currently open, innermost last
+        self.open_peaks = []
+        self.started = time.perf_counter()
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def counted(self, name, fn):
+        """ fn wrapped to count its calls under name """
+        counters = self.counters
+        counters.setdefault(name, 0)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            counters[name] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    def count_calls(self, owner, attribute, name=None):
+        """ Context counting calls of owner.attribute (a class or instance
+            attribute) while it is open """
+        return CountCalls(self, owner, attribute, name or attribute)
+
+    def phase(self, name):
+        """ Context timing one run of the named phase """
+        return PhaseTimer(self, name)
+
+    def enter_phase(self):
+        if self.memory:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.open_peaks:
+                self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+            self.open_peaks.append(0)
+            tracemalloc.reset_peak()
+        return time.perf_counter()
+
+    def exit_phase(self, name, started):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name)
+        phase.seconds += time.perf_counter() - started
+        phase.calls += 1
+        if self.memory:
+            import tracemalloc
+            peak = max(self.open_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            phase.memory_peak = max(phase.memory_peak or 0, peak)
+            # The enclosing phase saw this peak too
+            if self.open_peaks:
+                self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+
+    def report(self):
+        """ Everything recorded so far as a JSON serializable dict """
+        return collections.OrderedDict([
+            ('total_seconds', time.perf_counter() - self.started),
+            ('phases', [phase.report() for phase in self.phases.values()]),
+            ('counters', self.counters),
+        ])
+
+    def write_report(self, path):
+        """ Write the report as JSON to path, '-' for stderr """
+        if path == '-':
+            sys.stderr.write(json.dumps(self.report(), indent=2) + '\n')
+        else:
+            with open(path, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+
+
+class PhaseTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = self.profiler.enter_phase()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.exit_phase(self.name, self.started)
+        return False
+
+
+class CountCalls:
+    def __init__(self, profiler, owner, attribute, name):
+        self.profiler = profiler
+        self.owner = owner
+        self.attribute = attribute
+        self.name = name
+
+    def __enter__(self):
+        # Remember whether the attribute was the owner's own or looked up
+        # through its class, so the right one is put back afterwards
+        self.own = self.attribute in vars(self.owner)
+        self.original = vars(self.owner).get(self.attribute)
+        setattr(self.owner, self.attribute, self.profiler.counted(
+            self.name, getattr(self.owner, self.attribute)))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.own:
+            setattr(self.owner, self.attribute, self.original)
+        else:
+            delattr(self.owner, self.attribute)
+        return False
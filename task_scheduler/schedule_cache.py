@@ -0,0 +1,306 @@
+""" Persistent cache of schedules, with warm starts from similar graphs
+
+Schedules are kept in a directory, one JSON file per schedule named after a
+hash of the task graph, the resources and the scheduling parameters. Task
+order counts as part of the graph since it breaks priority ties, the layout
+of the description files doesn't. Least recently used schedules are evicted
+once there are more than max_entries (a hit touches the file's mtime).
+
+With no exact hit the closest cached schedule for the same resources and
+parameters, going by a bottom-k sketch of the tasks in each graph, is used
+as a warm start. Path lengths are only worked out again for tasks whose
+ancestors (upward lengths) or descendants (downward lengths) changed. Tasks
+that changed, or whose priority did, can only affect the schedule once they
+become ready, so the cached schedule is kept up to the first tick any of
+them (or any task since removed) became ready and simulated from there """
+import hashlib
+import json
+import os
+import zlib
+
+FORMAT_VERSION = 2
+
+# Task hashes kept in each graph's sketch
+SKETCH_SIZE = 64
+
+INDEX = 'index.json'
+
+
+def task_memory(graph):
+    """ Memory each task of a graph needs, as a list """
+    if graph.memory_required is None:
+        return [0] * len(graph)
+    return list(graph.memory_required)
+
+
+def task_lines(graph):
+    """ Canonical encoding of each task, its name, cores, memory, execution
+        time and sorted parent names """
+    names = graph.names
+    memory = task_memory(graph)
+    for i, name in enumerate(names):
+        parents = sorted(names[p] for p in graph.task_parents(i))
+        yield '{0}\0{1}\0{2}\0{3}\0{4}\n'.format(name, graph.cores_required[i],
+            memory[i], graph.execution_times[i], '\0'.join(parents)).encode('utf-8')
+
+
+def family_hash(resources, strategy, placement, backfill):
+    """ Hash of everything besides the task graph a schedule depends on """
+    digest = hashlib.sha256('{0}:{1}:{2}:{3}'.format(
+        FORMAT_VERSION, strategy, placement, bool(backfill)).encode())
+    for r in resources:
+        digest.update('{0}\0{1}\0{2}\0{3}\n'.format(r.name, r.cores_total, r.speed,
+                                                    r.memory_total).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def graph_hash(graph, family):
+    """ (key, sketch) of a TaskGraph, key hashing the family and every task
+        in order and sketch holding the smallest SKETCH_SIZE task hashes """
+    digest = hashlib.sha256(family.encode())
+    hashes = set()
+    for line in task_lines(graph):
+        digest.update(line)
+        hashes.add(zlib.crc32(line))
+    return digest.hexdigest(), sorted(hashes)[:SKETCH_SIZE]
+
+
+def similarity(a, b):
+    """ Estimated Jaccard similarity of two graphs from their sketches """
+    if not a or not b:
+        return 0.0
+    smallest = sorted(set(a) | set(b))[:SKETCH_SIZE]
+    common = set(a) & set(b)
+    return sum(1 for h in smallest if h in common) / float(len(smallest))
+
+
+class ScheduleCache:
+    def __init__(self, directory, max_entries=64):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if index.get('version') == FORMAT_VERSION else {}
+
+    def write_json(self, path, value):
+        """ Write via a temporary file so readers never see half a file """
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """ Cached entry for key, or None """
+        try:
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def closest(self, family, sketch):
+        """ Key of the cached schedule in family with the most similar graph,
+            or None if none share any tasks """
+        entries = self.read_index().get('entries', {})
+        best = None
+        for key, summary in entries.items():
+            if summary['family'] != family:
+                continue
+            score = similarity(sketch, summary['sketch'])
+            if score > 0 and (best is None or score > best[0]):
+                best = (score, key)
+        return best[1] if best else None
+
+    def put(self, key, family, sketch, entry):
+        """ Cache entry under key, evicting the least recently used entries
+            past max_entries """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.write_json(self.path(key), entry)
+        index = self.read_index()
+        entries = index.get('entries', {})
+        entries[key] = {'family': family, 'sketch': sketch}
+        used = []
+        for k in list(entries):
+            try:
+                used.append((os.path.getmtime(self.path(k)), k))
+            except OSError:
+                del entries[k]
+        for _, k in sorted(used)[:max(0, len(used) - self.max_entries)]:
+            del entries[k]
+            try:
+                os.remove(self.path(k))
+            except OSError:
+                pass
+        self.write_json(os.path.join(self.directory, INDEX),
+                        {'version': FORMAT_VERSION, 'entries': entries})
+
+
+def make_entry(graph, resources, order, metrics, record, makespan):
+    """ JSON entry of a schedule, record holding (task id, resource name,
+        start, end) tuples in the order tasks were placed """
+    upward, downward = graph.path_lengths()
+    resource_ids = dict((r.name, n) for n, r in enumerate(resources))
+    return {
+        'names': list(graph.names),
+        'cores_required': list(graph.cores_required),
+        'memory_required': task_memory(graph),
+        'execution_times': list(graph.execution_times),
+        'parent_offsets': list(graph.parent_offsets),
+        'parents': list(graph.parents),
+        'upward': list(upward),
+        'downward': list(downward),
+        'metrics': list(metrics),
+        'order': list(order),
+        'resources': [r.name for r in resources],
+        'placements': [[i, resource_ids[res], start, end]
+                       for i, res, start, end in record],
+        'makespan': makespan,
+    }
+
+
+class WarmStart:
+    """ How a TaskGraph differs from the graph of a cached entry """
+    def __init__(self, graph, entry):
+        self.graph = graph
+        self.entry = entry
+        old_names = entry['names']
+        old_offsets, old_parents = entry['parent_offsets'], entry['parents']
+        old_index = dict((name, i) for i, name in enumerate(old_names))
+        # Old id of each task, None for new tasks
+        self.old = [old_index.get(name) for name in graph.names]
+        kept = bytearray(len(old_names))
+        # Tasks that are new or whose cores, memory, time or parents changed
+        self.changed = bytearray(len(graph))
+        memory = task_memory(graph)
+        for i, o in enumerate(self.old):
+            if o is None:
+                self.changed[i] = 1
+                continue
+            kept[o] = 1
+            parents = [self.old[p] for p in graph.task_parents(i)]
+            if (graph.cores_required[i] != entry['cores_required'][o] or
+                    memory[i] != entry['memory_required'][o] or
+                    graph.execution_times[i] != entry['execution_times'][o] or
+                    None in parents or sorted(parents) !=
+                    sorted(old_parents[old_offsets[o]:old_offsets[o+1]])):
+                self.changed[i] = 1
+        self.removed = [o for o in range(len(old_names)) if not kept[o]]
+        # Tasks still here that lost a removed child
+        new_index = graph.index
+        self.lost_child = set()
+        for o in self.removed:
+            for p in old_parents[old_offsets[o]:old_offsets[o+1]]:
+                if kept[p]:
+                    self.lost_child.add(new_index(old_names[p]))
+
+    def closure(self, start, links):
+        """ Tasks reachable from start (task ids) through links(i) """
+        seen = bytearray(len(self.graph))
+        stack = list(start)
+        for i in stack:
+            seen[i] = 1
+        while stack:
+            i = stack.pop()
+            for j in links(i):
+                if not seen[j]:
+                    seen[j] = 1
+                    stack.append(j)
+        return seen
+
+    def path_lengths(self):
+        """ Upward and downward path lengths, reusing the cached ones of tasks
+            whose ancestors (upward) or descendants (downward) didn't change.
+            Returns them along with how many were worked out again """
+        graph = self.graph
+        changed = [i for i in range(len(graph)) if self.changed[i]]
+        old_upward, old_downward = self.entry['upward'], self.entry['downward']
+        times = graph.execution_times
+
+        stale_up = self.closure(changed, graph.task_children)
+        upward = [old_upward[o] if o is not None else 0 for o in self.old]
+        recomputed = self.relax(stale_up, upward, graph.task_parents,
+                                graph.task_children, times)
+
+        stale_down = self.closure(changed + sorted(self.lost_child), graph.task_parents)
+        downward = [old_downward[o] if o is not None else 0 for o in self.old]
+        recomputed += self.relax(stale_down, downward, graph.task_children,
+                                 graph.task_parents, times)
+        return upward, downward, recomputed
+
+    def relax(self, stale, lengths, before, after, times):
+        """ Work out lengths[i] = times[i] + max(lengths of before(i)) for the
+            stale tasks, in dependency order within them (Kahn's algorithm
+            over just the stale tasks) """
+        waiting = {}
+        ready = []
+        for i in range(len(stale)):
+            if stale[i]:
+                waiting[i] = sum(1 for j in before(i) if stale[j])
+                if waiting[i] == 0:
+                    ready.append(i)
+        count = 0
+        while ready:
+            i = ready.pop()
+            count += 1
+            lengths[i] = times[i] + max([lengths[j] for j in before(i)] or [0])
+            for j in after(i):
+                if stale[j]:
+                    waiting[j] -= 1
+                    if waiting[j] == 0:
+                        ready.append(j)
+        return count
+
+    def resume_tick(self, order, metrics):
+        """ First tick the cached schedule can differ from scheduling order
+            with metrics, 0 if it can't be reused at all and None if it all
+            can. Returns it along with the cached prefix to pick up from """
+        graph, entry = self.graph, self.entry
+        old_metrics = entry['metrics']
+        end = {}
+        for o, _, start, e in entry['placements']:
+            end[o] = e
+        old_offsets, old_parents = entry['parent_offsets'], entry['parents']
+
+        def old_ready(o):
+            return max([end[p] for p in old_parents[old_offsets[o]:old_offsets[o+1]]] or [0])
+
+        dirty = bytearray(len(graph))
+        since = None
+        for i, o in enumerate(self.old):
+            if self.changed[i] or old_metrics[o] != metrics[i]:
+                dirty[i] = 1
+                ready = max([end[self.old[p]] for p in graph.task_parents(i)
+                             if self.old[p] is not None] or [0])
+                if o is not None:
+                    ready = min(ready, old_ready(o))
+                since = ready if since is None else min(since, ready)
+        for o in self.removed:
+            ready = old_ready(o)
+            since = ready if since is None else min(since, ready)
+
+        # Tasks that didn't change have to keep their order among themselves
+        clean = [self.old[i] for i in order if not dirty[i]]
+        kept = bytearray(len(entry['names']))
+        for o in clean:
+            kept[o] = 1
+        if clean != [o for o in entry['order'] if kept[o]]:
+            return 0, []
+
+        new_index = graph.index
+        names, resources = entry['names'], entry['resources']
+        prefix = []
+        for o, r, start, e in entry['placements']:
+            if since is not None and start >= since:
+                break
+            prefix.append((new_index(names[o]), resources[r], start, e))
+        return since, prefix
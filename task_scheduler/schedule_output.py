@@ -0,0 +1,146 @@
+""" Schedules as data, plus writers for them
+
+find_schedule returns a ScheduleResult rather than printing placements as
+they happen. Results are written out in bulk, as the original text output,
+JSON lines (one object per placement), CSV or an SVG Gantt chart """
+import collections
+import csv
+import json
+
+# One task placed onto a resource, running from start up to end
+Placement = collections.namedtuple('Placement', ['task', 'resource', 'start', 'end'])
+
+# Placements are written in blocks of this many lines rather than one write
+# per placement
+WRITE_BLOCK = 65536
+
+
+class ScheduleResult:
+    def __init__(self, placements, makespan, prioritized_tasks=None, strategy=None,
+                 lower_bounds=None, coarsening=None, utilization=None, placement=None):
+        """ placements holds a Placement for each task in the order tasks were
+            placed, prioritized_tasks the task names in priority order,
+            lower_bounds the LowerBounds on the makespan if known,
+            coarsening a coarsening.CoarseningReport if chains of tasks were
+            contracted before scheduling, utilization a
+            utilization.UtilizationReport of where cores were left idle and
+            placement the placement policy the schedule needs, if it isn't
+            the scheduler's own """
+        self.placements = placements
+        self.makespan = makespan
+        self.prioritized_tasks = prioritized_tasks or []
+        self.strategy = strategy
+        self.lower_bounds = lower_bounds
+        self.coarsening = coarsening
+        self.utilization = utilization
+        self.placement = placement
+
+    def gap(self):
+        """ How far over the lower bound the makespan is, 0.1 being 10% """
+        if not self.lower_bounds or not self.lower_bounds.makespan:
+            return None
+        return float(self.makespan) / self.lower_bounds.makespan - 1
+
+    def __len__(self):
+        return len(self.placements)
+
+    def __iter__(self):
+        return iter(self.placements)
+
+    def write(self, f, format='text'):
+        """ Write the schedule to an open file in one of FORMATS """
+        if format not in FORMATS:
+            raise ValueError('unknown schedule format "{0}"'.format(format))
+        FORMATS[format](self, f)
+
+    def save(self, path, format=None):
+        """ Write the schedule to path, in the format its extension names
+            (.jsonl, .csv, .svg, anything else text) unless given one """
+        if format is None:
+            format = {'.jsonl': 'jsonl', '.csv': 'csv', '.svg': 'svg'}.get(
+                path[path.rfind('.'):].lower(), 'text')
+        newline = '' if format == 'csv' else None
+        with open(path, 'w', newline=newline) as f:
+            self.write(f, format)
+
+
+def write_blocks(f, lines):
+    """ Write an iterable of lines a block at a time """
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) == WRITE_BLOCK:
+            f.write(''.join(block))
+            block = []
+    f.write(''.join(block))
+
+
+def write_text(result, f):
+    """ The scheduler's original output, the prioritized tasks, each task
+        and the resource it ran on and the makespan """
+    f.write('PRIORITIZED_TASKS: {0}\n\n'.format(result.prioritized_tasks))
+    write_blocks(f, ('{0}: {1}\n'.format(p.task, p.resource) for p in result.placements))
+    f.write('\nSCHEDULE MAKESPAN: {0}\n'.format(result.makespan))
+    if result.lower_bounds:
+        f.write('SCHEDULE LOWER BOUND: {0.makespan} (critical path {0.critical_path}, work per core {0.work_per_core})\n'.format(
+            result.lower_bounds))
+    if result.coarsening:
+        c = result.coarsening
+        f.write('COARSENED TASKS: {0.tasks} -> {0.coarse_tasks} ({1:.1f}% fewer, {0.chains} chains contracted)\n'.format(
+            c, 100.0 * (c.tasks - c.coarse_tasks) / c.tasks if c.tasks else 0.0))
+        if c.uncoarsened_makespan is not None:
+            f.write('UNCOARSENED MAKESPAN: {0} ({1:+d} from coarsening)\n'.format(
+                c.uncoarsened_makespan, c.makespan - c.uncoarsened_makespan))
+    if result.utilization:
+        u = result.utilization
+        f.write('RESOURCE UTILIZATION: {0:.1f}% (idle core time {1})\n'.format(
+            100 * u.utilization, u.idle))
+        for r in u.resources:
+            f.write('{0.resource} UTILIZATION: {1:.1f}% of {0.cores} cores (idle core time {0.idle})\n'.format(
+                r, 100 * r.utilization))
+        for g in u.gaps:
+            blocked = ', '.join('{0.task} ({0.cores_required} cores, {0.waited} ticks)'.format(b)
+                                for b in g.blocked)
+            f.write('IDLE GAP: {0.resource} {0.start}-{0.end}, {0.free_cores} cores free (idle core time {0.idle}), blocked: {1}\n'.format(
+                g, blocked or 'none'))
+
+
+def write_jsonl(result, f):
+    """ A JSON object per placement followed by one holding the makespan """
+    write_blocks(f, (json.dumps({'task': p.task, 'resource': p.resource,
+                                 'start': p.start, 'end': p.end}) + '\n'
+                     for p in result.placements))
+    summary = {'makespan': result.makespan}
+    if result.lower_bounds:
+        summary['lower_bounds'] = dict(result.lower_bounds._asdict())
+    if result.coarsening:
+        summary['coarsening'] = dict(result.coarsening._asdict())
+    if result.utilization:
+        u = result.utilization
+        summary['utilization'] = {
+            'utilization': u.utilization, 'idle': u.idle,
+            'resources': [dict(r._asdict()) for r in u.resources],
+            'gaps': [dict(g._replace(blocked=[dict(b._asdict()) for b in g.blocked])._asdict())
+                     for g in u.gaps]}
+    f.write(json.dumps(summary) + '\n')
+
+
+def write_csv(result, f):
+    """ task,resource,start,end rows, the makespan being the latest end """
+    writer = csv.writer(f)
+    writer.writerow(Placement._fields)
+    writer.writerows(result.placements)
+
+
+def write_svg(result, f):
+    """ Gantt chart of the schedule, see utilization.write_gantt """
+    import utilization
+    utilization.write_gantt(result, f)
+
+
+FORMATS = collections.OrderedDict([
+    ('text', write_text),
+    ('jsonl', write_jsonl),
+    ('csv', write_csv),
+    ('svg', write_svg),
+])
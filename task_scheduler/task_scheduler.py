@@ -1,6 +1,13 @@
+import bisect
+import collections
+import contextlib
+import heapq
+import math
 import os
 import sys
 
+from schedule_output import Placement, ScheduleResult
+
 filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
 
 def check_python3():
@@ -11,35 +18,181 @@ def check_python3():
 if __name__ == 'task_scheduler':
     check_python3();
 
+def typed_array(values):
+    """ Pack numbers into a typed array, integers if they all are """
+    import array
+    try:
+        return array.array('q', values)
+    except TypeError:
+        return array.array('d', values)
+
+class SchedulerError(Exception):
+    """ Raised when tasks can't be loaded or scheduled """
+
+class DescriptionError(SchedulerError):
+    """ A task or resource description that failed to load or validate """
+
+class CircularDependencyError(SchedulerError):
+    """ Tasks depending on each other in a cycle, cycle holding the task
+        names around it """
+    def __init__(self, message, cycle):
+        SchedulerError.__init__(self, message)
+        self.cycle = cycle
+
+class ResourceError(SchedulerError):
+    """ Tasks that no compute resource can run """
+
 class TaskScheduler:
+    # Ways prioritize_tasks can rank tasks, see TaskGraph.priority_metrics
+    PRIORITY_STRATEGIES = ('cores_full_time', 'critical_path',
+                           'heft_upward_rank', 'longest_processing_time')
+
     def __init__(self):
+        # (TaskDict, its version, self.graph) the graph cache was filled for
+        self._graph_key = None
+        self._graph_cached = {}
         self.tasks = {}
         self.resources = []
+        # Compact TaskGraph scheduled in place of self.tasks, see load()
+        self.graph = None
+        # Use the numpy graph computations in vectorized.py
+        self.vectorized = False
+        # Don't write schedules out from find_schedule, only return them
+        self.quiet = False
+        # How tasks are placed onto resources, either 'best_fit' (the
+        # resource with the fewest cores to spare) or 'earliest_finish' (the
+        # resource that would finish the task soonest given its speed)
+        self.placement = 'best_fit'
+        # EASY backfilling in the event simulator, the highest priority task
+        # that doesn't fit gets a reservation on the resource that frees up
+        # its cores soonest and lower priority tasks only take cores from
+        # that resource if they'll be done by then, see simulate_graph
+        self.backfill = False
+        # profiling.Profiler recording each phase of a run, see profile()
+        self.profiler = None
+        # schedule_cache.ScheduleCache find_schedule keeps its schedules in
+        # and warm starts from
+        self.schedule_cache = None
+        # Contract chains of tasks before scheduling (see coarsening.py),
+        # None not to, otherwise the fraction of idle core time a chain of
+        # differing tasks may add. coarsen_compare also schedules the graph
+        # as it is to report what contracting it did to the makespan
+        self.coarsen = None
+        self.coarsen_compare = False
+        # Keep a utilization.UsageTimeline of each simulation for the
+        # ScheduleResult's utilization report, see utilization.py
+        self.track_usage = True
+        # OnlineState while scheduling online, see start_online()
+        self.online = None
+        # Placement index held for the simulation in progress, see
+        # indexed_resources()
+        self._resource_index = None
+
+    @property
+    def tasks(self):
+        """ Task objects by name, a TaskDict """
+        return self._tasks
+
+    @tasks.setter
+    def tasks(self, tasks):
+        self._tasks = self.TaskDict(tasks)
+        self._graph_key = None
+
+    class TaskDict(dict):
+        """ Dict of Task objects by name whose version goes up whenever a
+            task is added, removed or replaced or a task in it changes (see
+            Task.changed), so schedulers know to drop anything they've
+            worked out from the tasks """
+        def __init__(self, *args, **kwargs):
+            dict.__init__(self)
+            self.version = 0
+            self.update(*args, **kwargs)
+
+        def __setitem__(self, name, task):
+            if name in self:
+                self[name].watchers.remove(self)
+            dict.__setitem__(self, name, task)
+            task.watchers.append(self)
+            self.version += 1
+
+        def __delitem__(self, name):
+            self[name].watchers.remove(self)
+            dict.__delitem__(self, name)
+            self.version += 1
+
+        def pop(self, name, *default):
+            if name not in self:
+                return dict.pop(self, name, *default)
+            task = self[name]
+            del self[name]
+            return task
+
+        def popitem(self):
+            name, task = dict.popitem(self)
+            task.watchers.remove(self)
+            self.version += 1
+            return name, task
+
+        def setdefault(self, name, task=None):
+            if name not in self:
+                self[name] = task
+            return self[name]
+
+        def update(self, *args, **kwargs):
+            for name, task in dict(*args, **kwargs).items():
+                self[name] = task
+
+        def __ior__(self, other):
+            self.update(other)
+            return self
+
+        def clear(self):
+            for task in self.values():
+                task.watchers.remove(self)
+            dict.clear(self)
+            self.version += 1
 
     class Task:
-        def __init__(self, name, cores_required, execution_time):
-            self.name = name
-            self.cores_required = cores_required
-            self.execution_time = execution_time
-            self.parents = []
-            self.children = []
+        # Attributes that change what the task is, setting one counts as
+        # changing the task (see changed)
+        SPEC = frozenset(['cores_required', 'execution_time', 'memory_required',
+                          'command'])
+
+        def __init__(self, name, cores_required, execution_time, memory_required=0):
+            # Set straight into __dict__, a new task has nothing to tell.
+            # watchers holds the TaskDicts holding this task, told whenever
+            # it changes, command the command line run for the task by
+            # executor.py if it has one
+            self.__dict__.update(watchers=[], name=name, cores_required=cores_required,
+                                 execution_time=execution_time,
+                                 memory_required=memory_required, parents=[],
+                                 children=[], command=None)
+
+        def __setattr__(self, name, value):
+            object.__setattr__(self, name, value)
+            if name in TaskScheduler.Task.SPEC:
+                self.changed()
+
+        def changed(self):
+            """ Bump the version of every TaskDict holding this task """
+            for tasks in self.watchers:
+                tasks.version += 1
+
+        def set_time_left(self, execution_time):
+            """ Execution time left as a simulation uses it up, unlike
+                setting execution_time this doesn't count as changing the
+                task so what was worked out from the tasks still holds """
+            self.__dict__['execution_time'] = execution_time
 
         def add_parent(self, parent):
             if isinstance(parent, self.__class__):
                 self.parents.append(parent)
+                self.changed()
 
         def add_child(self, child):
             if isinstance(child, self.__class__):
                 self.children.append(child)
-
-        def get_full_execution_time(self, exclude_parents=[]):
-            full_execution_time = self.execution_time
-            # We want to ignore parents that overlap between dependent tasks
-            # due to including them leading to multiples of the same execution times
-            # being includes in the full execution times
-            for p in list(set(self.parents) - set(exclude_parents)):
-                full_execution_time += p.get_full_execution_time(exclude_parents+self.parents)
-            return full_execution_time
+                self.changed()
 
         def is_done(self):
             return self.execution_time <= 0
@@ -52,17 +205,25 @@ class TaskScheduler:
         def is_ready(self):
             return not self.is_done() and self.is_parents_done()
 
-        def iterate(self):
+        def iterate(self, amount=1):
             if self.is_ready():
-                self.execution_time -= 1
+                self.set_time_left(self.execution_time - amount)
 
 
     class ComputeResource:
-        def __init__(self, name, cores_total):
+        def __init__(self, name, cores_total, speed=1, memory_total=None):
             self.name = name
             self.cores_total = cores_total
+            # How many ticks worth of a task's execution time this resource
+            # gets through each tick
+            self.speed = speed
             self.cores_used = 0
+            # Memory tasks can have between them, None if it isn't limited
+            self.memory_total = memory_total
+            self.memory_used = 0
             self.tasks_in_progress = []
+            # Best fit index this resource is kept in, if any
+            self.index = None
 
         def task_count(self):
             return len(self.tasks_in_progress)
@@ -70,12 +231,34 @@ class TaskScheduler:
         def cores_available(self):
             return self.cores_total - self.cores_used
 
+        def memory_available(self):
+            if self.memory_total is None:
+                return math.inf
+            return self.memory_total - self.memory_used
+
+        def available(self):
+            """ (cores, memory) available, memory being math.inf if this
+                resource doesn't limit it """
+            return self.cores_available(), self.memory_available()
+
+        def fits(self, task):
+            """ Whether task fits in every resource dimension right now """
+            return (task.cores_required <= self.cores_available() and
+                    task.memory_required <= self.memory_available())
+
+        def scaled_time(self, execution_time):
+            """ Ticks this resource takes to get through execution_time """
+            if self.speed == 1:
+                return execution_time
+            return int(math.ceil(execution_time / float(self.speed)))
+
         def add_task(self, task):
-            if task.cores_required <= self.cores_available():
+            if self.fits(task):
                 self.tasks_in_progress.append(task)
-                #Print out task name and what compute resource it's on
-                print(task.name + ': ' + self.name)
                 self.cores_used += task.cores_required
+                self.memory_used += task.memory_required
+                if self.index is not None:
+                    self.index.update(self)
                 return True
             return False
 
@@ -83,126 +266,1159 @@ class TaskScheduler:
             try:
                 self.tasks_in_progress.remove(task)
                 self.cores_used -= task.cores_required
+                self.memory_used -= task.memory_required
+                if self.index is not None:
+                    self.index.update(self)
             except ValueError:
                 pass # If the task doesn't exist in our list ignore it
 
         def iterate(self):
             """ Iterate all tasks in progress removing tasks once done """
             task_completed = False
-            for task in self.tasks_in_progress:
-                task.iterate()
+            # Walk a copy since finished tasks are removed as we go, otherwise
+            # the task after a finished one would miss this tick
+            for task in list(self.tasks_in_progress):
+                task.iterate(self.speed)
                 if task.is_done():
                     self.remove_task(task)
                     task_completed = True
             return task_completed
 
+    class FreeCoresIndex:
+        """ Best fit index over a list of compute resources. Resources are
+            bucketed by cores available, with the distinct core counts kept
+            sorted so the tightest fitting bucket is a bisect away. Within a
+            bucket resources are kept in a heap by list position, so ties go
+            to the earlier resource the same as a stable sort would. claim
+            has the resources keep this index up to date themselves """
+        def __init__(self, resources, claim=True):
+            self.resources = list(resources)
+            self.position = {}
+            self.free = []
+            self.free_values = []
+            self.buckets = {}
+            self.counts = {}
+            for pos, resource in enumerate(self.resources):
+                self.position[resource] = pos
+                self.free.append(None)
+                self.insert(pos, resource.cores_available())
+                if claim:
+                    resource.index = self
+
+        def insert(self, pos, cores):
+            self.free[pos] = cores
+            if cores not in self.counts:
+                self.counts[cores] = 0
+                self.buckets[cores] = []
+                bisect.insort(self.free_values, cores)
+            self.counts[cores] += 1
+            bucket = self.buckets[cores]
+            heapq.heappush(bucket, pos)
+            # Entries for resources that have since left the bucket are only
+            # dropped lazily, compact the heap before they pile up
+            if len(bucket) > 2 * self.counts[cores] + 8:
+                bucket[:] = sorted(set(p for p in bucket if self.free[p] == cores))
+
+        def discard(self, pos):
+            cores = self.free[pos]
+            self.counts[cores] -= 1
+            if self.counts[cores] == 0:
+                del self.counts[cores]
+                del self.buckets[cores]
+                del self.free_values[bisect.bisect_left(self.free_values, cores)]
+
+        def update(self, resource):
+            """ Move a resource to the bucket matching its cores available """
+            pos = self.position[resource]
+            cores = resource.cores_available()
+            if cores != self.free[pos]:
+                self.discard(pos)
+                self.insert(pos, cores)
+
+        def find(self, cores_required, execution_time=None, memory_required=0):
+            """ Resource with the fewest cores available that still has at
+                least cores_required free, None if there is no such resource.
+                Memory isn't looked at, see VectorFitIndex """
+            idx = bisect.bisect_left(self.free_values, cores_required)
+            if idx == len(self.free_values):
+                return None
+            cores = self.free_values[idx]
+            bucket = self.buckets[cores]
+            while self.free[bucket[0]] != cores:
+                heapq.heappop(bucket)
+            return self.resources[bucket[0]]
+
+        def most_memory(self, cores_required):
+            """ Most memory free on any resource with cores_required cores
+                free, math.inf as these resources don't limit memory, None if
+                there is no such resource """
+            if self.free_values and self.free_values[-1] >= cores_required:
+                return math.inf
+            return None
+
+        def hide(self, resource):
+            """ Leave a resource out of lookups until show is called """
+            pos = self.position[resource]
+            self.discard(pos)
+            self.free[pos] = None
+
+        def show(self, resource):
+            self.insert(self.position[resource], resource.cores_available())
+
+    class VectorFitIndex:
+        """ Best fit index over compute resources that limit memory as well
+            as cores. Resources are bucketed by cores available as in
+            FreeCoresIndex, each bucket holding (memory available, position)
+            pairs in sorted order, so the tightest memory fit within a bucket
+            is a bisect away. A lookup walks the buckets with enough cores
+            from the tightest up, scoring each bucket's tightest memory fit by
+            the L1 norm of what it would leave over (cores and memory each as
+            a fraction of the most any resource has) and stopping once the
+            cores left over alone can't beat the best score. That is a bisect
+            per distinct core count rather than a scan of every resource.
+            Resources that don't limit memory count as leaving all of it
+            over, ties go to the earlier resource """
+        def __init__(self, resources, claim=True):
+            self.resources = list(resources)
+            self.position = {}
+            self.free = []
+            self.free_values = []
+            self.buckets = {}
+            self.core_scale = float(max([r.cores_total for r in self.resources] + [1]))
+            self.memory_scale = float(max([r.memory_total for r in self.resources
+                                           if r.memory_total is not None] + [1]))
+            for pos, resource in enumerate(self.resources):
+                self.position[resource] = pos
+                self.free.append(None)
+                self.insert(pos, resource.available())
+                if claim:
+                    resource.index = self
+
+        def insert(self, pos, available):
+            self.free[pos] = available
+            cores, memory = available
+            if cores not in self.buckets:
+                self.buckets[cores] = []
+                bisect.insort(self.free_values, cores)
+            bisect.insort(self.buckets[cores], (memory, pos))
+
+        def discard(self, pos):
+            cores, memory = self.free[pos]
+            bucket = self.buckets[cores]
+            del bucket[bisect.bisect_left(bucket, (memory, pos))]
+            if not bucket:
+                del self.buckets[cores]
+                del self.free_values[bisect.bisect_left(self.free_values, cores)]
+
+        def update(self, resource):
+            """ Move a resource to where its cores and memory available put it """
+            pos = self.position[resource]
+            available = resource.available()
+            if available != self.free[pos]:
+                self.discard(pos)
+                self.insert(pos, available)
+
+        def find(self, cores_required, execution_time=None, memory_required=0):
+            """ Resource leaving the least cores and memory over once given a
+                task needing cores_required and memory_required, None if no
+                resource has both free """
+            best = None
+            free_values = self.free_values
+            for idx in range(bisect.bisect_left(free_values, cores_required),
+                             len(free_values)):
+                cores = free_values[idx]
+                spare = (cores - cores_required) / self.core_scale
+                if best is not None and spare > best[0]:
+                    break
+                bucket = self.buckets[cores]
+                at = bisect.bisect_left(bucket, (memory_required, -1))
+                if at == len(bucket):
+                    continue
+                memory, pos = bucket[at]
+                if memory == math.inf:
+                    spare += 1.0
+                else:
+                    spare += (memory - memory_required) / self.memory_scale
+                if best is None or (spare, pos) < best:
+                    best = (spare, pos)
+            return self.resources[best[1]] if best is not None else None
+
+        def most_memory(self, cores_required):
+            """ Most memory free on any resource with cores_required cores
+                free, None if there is no such resource """
+            free_values = self.free_values
+            idx = bisect.bisect_left(free_values, cores_required)
+            if idx == len(free_values):
+                return None
+            return max(self.buckets[cores][-1][0] for cores in free_values[idx:])
+
+        def hide(self, resource):
+            """ Leave a resource out of lookups until show is called """
+            pos = self.position[resource]
+            self.discard(pos)
+            self.free[pos] = None
+
+        def show(self, resource):
+            self.insert(self.position[resource], resource.available())
+
+    class EarliestFinishIndex:
+        """ Placement index for resources of differing speeds, finding the
+            resource that can start a task now and finish it soonest. Keeps a
+            best fit index (a VectorFitIndex if any resource limits memory,
+            a FreeCoresIndex otherwise) per distinct speed, fastest first, so
+            a lookup is a best fit lookup per speed rather than a scan of
+            every resource. Ties go to the tighter fit, then the earlier
+            resource """
+        def __init__(self, resources, claim=True):
+            if any(r.memory_total is not None for r in resources):
+                index_class = TaskScheduler.VectorFitIndex
+            else:
+                index_class = TaskScheduler.FreeCoresIndex
+            self.best_fit = index_class(resources, claim=False)
+            # Distinct core counts free, kept sorted by best_fit
+            self.free_values = self.best_fit.free_values
+            self.by_speed = {}
+            for speed in sorted(set(r.speed for r in resources), reverse=True):
+                self.by_speed[speed] = index_class(
+                    [r for r in resources if r.speed == speed], claim=False)
+            if claim:
+                for resource in resources:
+                    resource.index = self
+
+        def update(self, resource):
+            self.best_fit.update(resource)
+            self.by_speed[resource.speed].update(resource)
+
+        def find(self, cores_required, execution_time=None, memory_required=0):
+            """ Resource finishing a task needing cores_required cores,
+                memory_required memory and execution_time ticks (at speed 1)
+                soonest, None if no resource has the cores and memory free """
+            if execution_time is None:
+                return self.best_fit.find(cores_required, None, memory_required)
+            best = None
+            for index in self.by_speed.values():
+                resource = index.find(cores_required, None, memory_required)
+                if resource is not None:
+                    key = (resource.scaled_time(execution_time),
+                           resource.cores_available(),
+                           self.best_fit.position[resource])
+                    if best is None or key < best[0]:
+                        best = (key, resource)
+            return best[1] if best is not None else None
+
+        def most_memory(self, cores_required):
+            return self.best_fit.most_memory(cores_required)
+
+        def hide(self, resource):
+            self.best_fit.hide(resource)
+            self.by_speed[resource.speed].hide(resource)
+
+        def show(self, resource):
+            self.best_fit.show(resource)
+            self.by_speed[resource.speed].show(resource)
+
+    class ReadyBySize:
+        """ Ready tasks needing memory as well as cores, as heaps of entries
+            (priority keys, lowest first) per (cores, memory) size. For each
+            core count a segment tree over the memory sizes seen holds the
+            entry at the head of each heap, so the first entry that could fit
+            given the most memory free alongside each core count is a prefix
+            minimum per core count away. That is never a look at every size,
+            however many distinct memory sizes there are. A memory size not
+            seen before rebuilds its core count's tree, sizes passed in up
+            front never do """
+        EMPTY = ((math.inf,), None)
+
+        def __init__(self, sizes=()):
+            self.heaps = {}
+            # Sorted memory sizes per core count, and the tree over them with
+            # (head entry, memory) leaves from the middle of the list on
+            self.memories = {}
+            self.trees = {}
+            for size in set(sizes):
+                self.heaps[size] = []
+                self.memories.setdefault(size[0], []).append(size[1])
+            for cores, memories in self.memories.items():
+                memories.sort()
+                self.build(cores)
+
+        def build(self, cores):
+            memories = self.memories[cores]
+            width = 1
+            while width < len(memories):
+                width *= 2
+            tree = [self.EMPTY] * (2 * width)
+            for leaf, memory in enumerate(memories):
+                heap = self.heaps[(cores, memory)]
+                if heap:
+                    tree[width + leaf] = (heap[0], memory)
+            for pos in range(width - 1, 0, -1):
+                tree[pos] = min(tree[2 * pos], tree[2 * pos + 1])
+            self.trees[cores] = tree
+
+        def refresh(self, size):
+            """ Update the tree after the head of size's heap changed """
+            cores, memory = size
+            tree = self.trees[cores]
+            heap = self.heaps[size]
+            pos = len(tree) // 2 + bisect.bisect_left(self.memories[cores], memory)
+            tree[pos] = (heap[0], memory) if heap else self.EMPTY
+            pos //= 2
+            while pos:
+                tree[pos] = min(tree[2 * pos], tree[2 * pos + 1])
+                pos //= 2
+
+        def push(self, size, entry):
+            heap = self.heaps.get(size)
+            if heap is None:
+                self.heaps[size] = [entry]
+                bisect.insort(self.memories.setdefault(size[0], []), size[1])
+                self.build(size[0])
+                return
+            heapq.heappush(heap, entry)
+            if heap[0] is entry:
+                self.refresh(size)
+
+        def pop(self, size):
+            """ Remove and return the head entry of size's heap """
+            entry = heapq.heappop(self.heaps[size])
+            self.refresh(size)
+            return entry
+
+        def first(self):
+            """ (entry, size) of the first entry of all, None if empty """
+            best = min(((tree[1], cores) for cores, tree in self.trees.items()),
+                       default=(self.EMPTY, None))
+            (entry, memory), cores = best
+            return (entry, (cores, memory)) if memory is not None else None
+
+        def best(self, most_memory):
+            """ (entry, size) of the first entry that could fit, most_memory
+                giving the most memory free on any resource with a number of
+                cores free (None if there is no such resource). None if no
+                entry could fit """
+            best = None
+            for cores, tree in self.trees.items():
+                if tree[1][1] is None or (best is not None and tree[1] >= best[0]):
+                    continue
+                memory = most_memory(cores)
+                if memory is None:
+                    continue
+                found = self.EMPTY
+                lo = len(tree) // 2
+                hi = lo + bisect.bisect_right(self.memories[cores], memory)
+                while lo < hi:
+                    if lo & 1:
+                        found = min(found, tree[lo])
+                        lo += 1
+                    if hi & 1:
+                        hi -= 1
+                        found = min(found, tree[hi])
+                    lo //= 2
+                    hi //= 2
+                if found[1] is not None and (best is None or found < best[0]):
+                    best = (found, cores)
+            if best is None:
+                return None
+            (entry, memory), cores = best
+            return entry, (cores, memory)
+
+    class TaskGraph:
+        """ Compact array backed task graph. Tasks are integer ids (their
+            position in names) with cores and execution times held in typed
+            arrays, and parent and child links held as CSR offset and index
+            arrays, the parents of task i being
+            parents[parent_offsets[i]:parent_offsets[i+1]]. A graph is never
+            modified once built so anything derived from it is cached on it.
+            The child CSR arrays are worked out from the parent links unless
+            they're passed in, each task's children in id order """
+        def __init__(self, names, cores_required, execution_times,
+                     parent_offsets, parents, child_offsets=None, children=None):
+            import array
+
+            self.names = names
+            self.cores_required = cores_required
+            self.execution_times = execution_times
+            self.parent_offsets = parent_offsets
+            self.parents = parents
+            # Compute orders and path lengths with the numpy versions in
+            # vectorized.py rather than per task Python loops
+            self.vectorized = False
+            self.cache = {}
+            # Command line of each task ('' or None for tasks without one),
+            # None if no task has one
+            self.commands = None
+            # Memory each task needs, None if no task needs any
+            self.memory_required = None
+            if children is not None:
+                self.child_offsets = child_offsets
+                self.children = children
+                return
+            # Invert the parent links into the child CSR arrays, a counting
+            # sort by parent which keeps each task's children in id order
+            counts = [0] * (len(names) + 1)
+            for p in parents:
+                counts[p + 1] += 1
+            for i in range(len(names)):
+                counts[i + 1] += counts[i]
+            self.child_offsets = array.array('q', counts)
+            fill = counts[:-1]
+            children = [0] * len(parents)
+            for i in range(len(names)):
+                for p in parents[parent_offsets[i]:parent_offsets[i+1]]:
+                    children[fill[p]] = i
+                    fill[p] += 1
+            self.children = array.array('q', children)
+
+        @classmethod
+        def from_tasks(cls, tasks):
+            """ Compile Task objects into a TaskGraph, links to tasks outside
+                of the given ones are dropped """
+            import array
+
+            tasks = list(tasks)
+            index = dict((id(t), i) for i, t in enumerate(tasks))
+            parent_offsets = array.array('q', [0])
+            parents = array.array('q')
+            for task in tasks:
+                parents.extend(index[id(p)] for p in task.parents if id(p) in index)
+                parent_offsets.append(len(parents))
+            graph = cls([t.name for t in tasks],
+                typed_array([t.cores_required for t in tasks]),
+                typed_array([t.execution_time for t in tasks]),
+                parent_offsets, parents)
+            if any(t.command for t in tasks):
+                graph.commands = [t.command for t in tasks]
+            if any(t.memory_required for t in tasks):
+                graph.memory_required = typed_array([t.memory_required for t in tasks])
+            return graph
+
+        @classmethod
+        def from_compiled(cls, graph):
+            """ TaskGraph over a graph_cache.CompiledGraph, using its arrays
+                (memory mapped ones included) as they are """
+            task_graph = cls(graph.task_names, graph.cores_required,
+                graph.execution_times, graph.parent_offsets, graph.parents)
+            task_graph.commands = graph.task_commands
+            task_graph.memory_required = graph.memory_required
+            return task_graph
+
+        def __len__(self):
+            return len(self.names)
+
+        def index(self, name):
+            """ Id of the task called name """
+            if 'index' not in self.cache:
+                self.cache['index'] = dict((n, i) for i, n in enumerate(self.names))
+            return self.cache['index'][name]
+
+        def task_parents(self, i):
+            return self.parents[self.parent_offsets[i]:self.parent_offsets[i+1]]
+
+        def task_children(self, i):
+            return self.children[self.child_offsets[i]:self.child_offsets[i+1]]
+
+        def task(self, i):
+            """ Stand alone (unlinked) Task object for task i """
+            memory = self.memory_required[i] if self.memory_required is not None else 0
+            return TaskScheduler.Task(self.names[i], self.cores_required[i],
+                                      self.execution_times[i], memory)
+
+        def topological_order(self):
+            """ Task ids ordered so each task comes after all of its parents
+                (Kahn's algorithm), tasks caught in a dependency cycle are
+                left out """
+            if 'topological_order' not in self.cache and self.vectorized:
+                import vectorized
+                self.cache['topological_order'] = \
+                    vectorized.topological_order(self).tolist()
+            if 'topological_order' not in self.cache:
+                offsets = self.parent_offsets
+                parents_left = [offsets[i+1] - offsets[i] for i in range(len(self))]
+                order = [i for i, count in enumerate(parents_left) if count == 0]
+                child_offsets = self.child_offsets
+                children = self.children
+                idx = 0
+                while idx < len(order):
+                    i = order[idx]
+                    for c in children[child_offsets[i]:child_offsets[i+1]]:
+                        parents_left[c] -= 1
+                        if parents_left[c] == 0:
+                            order.append(c)
+                    idx += 1
+                self.cache['topological_order'] = order
+            return self.cache['topological_order']
+
+        def find_cycle(self):
+            """ Ids of tasks forming a dependency cycle (each one a parent of
+                the next, ending where it started) or None if the graph is
+                acyclic """
+            order = self.topological_order()
+            if len(order) == len(self):
+                return None
+            # Every task Kahn's algorithm couldn't reach still has a parent
+            # that wasn't reached either, so following those parents has to
+            # loop back on itself eventually
+            unreached = set(range(len(self))) - set(order)
+            i = next(iter(unreached))
+            seen = {}
+            path = []
+            while i not in seen:
+                seen[i] = len(path)
+                path.append(i)
+                i = next(p for p in self.task_parents(i) if p in unreached)
+            cycle = path[seen[i]:]
+            cycle.reverse()
+            return cycle + cycle[:1]
+
+        def path_lengths(self, costs=None):
+            """ Longest execution time paths through each task as two lists
+                indexed by id, upward (the task plus its longest chain of
+                ancestors) and downward (the task plus its longest chain of
+                descendants), each filled in one pass over the topological
+                order. costs weighs tasks by something other than their
+                execution times, those lengths aren't cached """
+            if costs is not None:
+                if self.vectorized:
+                    import vectorized
+                    upward, downward = vectorized.path_lengths(self, costs)
+                    return upward.tolist(), downward.tolist()
+                return self.weighted_path_lengths(costs)
+            if 'path_lengths' not in self.cache and self.vectorized:
+                import vectorized
+                upward, downward = vectorized.path_lengths(self)
+                self.cache['path_lengths'] = (upward.tolist(), downward.tolist())
+            if 'path_lengths' not in self.cache:
+                self.cache['path_lengths'] = \
+                    self.weighted_path_lengths(self.execution_times)
+            return self.cache['path_lengths']
+
+        def weighted_path_lengths(self, costs):
+            order = self.topological_order()
+            offsets, parents = self.parent_offsets, self.parents
+            upward = list(costs)
+            for i in order:
+                longest = 0
+                for p in parents[offsets[i]:offsets[i+1]]:
+                    if upward[p] > longest:
+                        longest = upward[p]
+                upward[i] += longest
+            offsets, children = self.child_offsets, self.children
+            downward = list(costs)
+            for i in reversed(order):
+                longest = 0
+                for c in children[offsets[i]:offsets[i+1]]:
+                    if downward[c] > longest:
+                        longest = downward[c]
+                downward[i] += longest
+            return upward, downward
+
+        def mean_costs(self, resource_profile):
+            """ HEFT's mean cost of each task, its execution time averaged
+                over every resource with enough cores to ever run it.
+                resource_profile holds a (cores_total, speed) pair for each
+                resource """
+            # Resources by descending cores with running sums of 1 / speed,
+            # so the resources able to fit a task are a prefix found by bisect
+            profile = sorted(resource_profile, key=lambda r: -r[0])
+            cores = [-c for c, _ in profile]
+            inverse_sums = [0.0]
+            for _, speed in profile:
+                inverse_sums.append(inverse_sums[-1] + 1.0 / speed)
+            costs = []
+            for t, c in zip(self.execution_times, self.cores_required):
+                fits = bisect.bisect_right(cores, -c)
+                costs.append(t * inverse_sums[fits] / fits if fits else t)
+            return costs
+
+        def lower_bounds(self, resource_profile):
+            """ LowerBounds on the makespan of any schedule of this graph onto
+                resources with the given (cores_total, speed) profile. Each
+                task takes at least its time on the fastest resource it fits
+                on, so no schedule beats the longest path of those times, nor
+                the total work spread over every core at its speed """
+            profile = sorted(resource_profile, key=lambda r: -r[0])
+            cores = [-c for c, _ in profile]
+            fastest = []
+            for _, speed in profile:
+                fastest.append(max(speed, fastest[-1]) if fastest else speed)
+            costs = list(self.execution_times)
+            if any(speed != 1 for _, speed in profile):
+                for i, c in enumerate(self.cores_required):
+                    fits = bisect.bisect_right(cores, -c)
+                    if fits:
+                        costs[i] = int(math.ceil(costs[i] / float(fastest[fits - 1])))
+                upward, _ = self.path_lengths(costs)
+            else:
+                upward, _ = self.path_lengths()
+            critical_path = max(upward) if len(upward) else 0
+
+            work = sum(c * t for c, t in zip(self.cores_required, self.execution_times))
+            capacity = sum(c * speed for c, speed in profile)
+            work_per_core = int(math.ceil(work / float(capacity))) if capacity else 0
+            return LowerBounds(critical_path, work_per_core,
+                               max(critical_path, work_per_core))
+
+        def priority_metrics(self, strategy='cores_full_time', resource_profile=None):
+            """ Priority metric of every task under one of
+                TaskScheduler.PRIORITY_STRATEGIES:
+                cores_full_time - cores required times upward path length
+                critical_path - length of the longest path through the task
+                heft_upward_rank - HEFT's upward rank, the task's mean cost
+                    plus the largest rank among its children. With identical
+                    resources that is the downward path length
+                longest_processing_time - the task's own execution time
+                resource_profile, (cores_total, speed) for each resource, is
+                only used by heft_upward_rank for mean costs when resource
+                speeds differ """
+            if strategy not in TaskScheduler.PRIORITY_STRATEGIES:
+                raise ValueError('unknown priority strategy "{0}"'.format(strategy))
+            key = ('priority_metrics', strategy)
+            if (strategy == 'heft_upward_rank' and resource_profile and
+                    any(speed != 1 for _, speed in resource_profile)):
+                profile = tuple(sorted(resource_profile))
+                key = ('priority_metrics', strategy, profile)
+                if key not in self.cache:
+                    _, downward = self.path_lengths(self.mean_costs(profile))
+                    self.cache[key] = downward
+            if key not in self.cache and self.vectorized:
+                import vectorized
+                self.cache[key] = vectorized.priority_metrics(self, strategy).tolist()
+            if key not in self.cache:
+                upward, downward = self.path_lengths()
+                if strategy == 'cores_full_time':
+                    metrics = [c * u for c, u in zip(self.cores_required, upward)]
+                elif strategy == 'critical_path':
+                    metrics = [u + d - t for u, d, t in
+                               zip(upward, downward, self.execution_times)]
+                elif strategy == 'heft_upward_rank':
+                    metrics = list(downward)
+                else:
+                    metrics = list(self.execution_times)
+                self.cache[key] = metrics
+            return self.cache[key]
+
+        def prioritize(self, strategy='cores_full_time', resource_profile=None):
+            """ Task ids by descending priority metric, ties keep id order """
+            metrics = self.priority_metrics(strategy, resource_profile)
+            if self.vectorized:
+                import vectorized
+                import numpy
+                return vectorized.prioritize(self, numpy.array(metrics)).tolist()
+            return sorted(range(len(self)), key=lambda i: -metrics[i])
+
+        def __getstate__(self):
+            """ Pickle memory mapped arrays as plain typed arrays, keeping the
+                topological order and path lengths but not the name index """
+            import array
+
+            state = dict(self.__dict__)
+            for name in ('cores_required', 'execution_times', 'parent_offsets',
+                         'parents', 'child_offsets', 'children', 'memory_required'):
+                if isinstance(state[name], memoryview):
+                    packed = array.array(state[name].format)
+                    packed.frombytes(state[name].cast('B'))
+                    state[name] = packed
+            state['cache'] = dict((key, value) for key, value in self.cache.items()
+                                  if key in ('topological_order', 'path_lengths'))
+            return state
+
+    class OnlineState:
+        """ Book keeping for scheduling online, tasks are looked up by name """
+        def __init__(self, strategy, time):
+            self.strategy = strategy
+            self.time = time
+            # Execution times as submitted, Task objects only hold what's left
+            self.execution_times = {}
+            # Upward and downward path lengths the priority metrics come from
+            self.upward = {}
+            self.downward = {}
+            # Submission order, breaking ties between equal priorities the
+            # same as the stable sort of prioritize_tasks
+            self.order = {}
+            self.parents_left = {}
+            self.finished = set()
+            # Ready tasks as (-metric, order, name) entries in a ReadyBySize,
+            # ready_keys holding each ready task's current key so entries
+            # left behind by priority changes can be skipped
+            self.ready = TaskScheduler.ReadyBySize()
+            self.ready_keys = {}
+            # Running tasks to (end, assignment number, resource, start), with a
+            # heap of (end, assignment number, name) completions. A completion
+            # whose assignment number no longer matches was interrupted
+            self.running = {}
+            self.completions = []
+            self.assigned = 0
+            # (task name, resource name, start, end) of every placement, and
+            # (task name, resource name, start, interrupted at) of every task
+            # requeued because its resource was removed
+            self.placements = []
+            self.interrupted = []
+
+    def graph_cache(self):
+        """ Dict for caching values derived from the task graph, emptied
+            whenever self.tasks or self.graph are replaced, tasks are added,
+            removed or replaced in self.tasks or a task changes (see
+            TaskDict). Execution time used up by simulations isn't a change,
+            the graph keeps the times the tasks were compiled with """
+        key = self._graph_key
+        if key is None or key[0] is not self._tasks or \
+                key[1] != self._tasks.version or key[2] is not self.graph:
+            self._graph_key = (self._tasks, self._tasks.version, self.graph)
+            self._graph_cached = {}
+        return self._graph_cached
+
+    def task_graph(self):
+        """ The TaskGraph being scheduled, either the compact graph loaded by
+            load(..., compact=True) or one compiled from self.tasks """
+        if self.graph is not None:
+            graph = self.graph
+        else:
+            cache = self.graph_cache()
+            if 'task_graph' not in cache:
+                cache['task_graph'] = self.TaskGraph.from_tasks(self.tasks.values())
+            graph = cache['task_graph']
+        graph.vectorized = self.vectorized
+        return graph
+
+    def topological_order(self):
+        """ Task names ordered so each task comes after all of its parents,
+            tasks caught in a dependency cycle are left out """
+        graph = self.task_graph()
+        return [graph.names[i] for i in graph.topological_order()]
+
+    def get_path_lengths(self):
+        """ Longest execution time paths through each task as two dicts keyed
+            by task name, upward (the task plus its longest chain of ancestors)
+            and downward (the task plus its longest chain of descendants).
+            Both are filled in a single pass over the topological order and
+            cached until the task graph changes """
+        cache = self.graph_cache()
+        if 'path_lengths' not in cache:
+            graph = self.task_graph()
+            upward, downward = graph.path_lengths()
+            cache['path_lengths'] = (dict(zip(graph.names, upward)),
+                                     dict(zip(graph.names, downward)))
+        return cache['path_lengths']
+
     def get_priority_metric(self, name):
         """ Our priority metric is the full execution time of a task
-         (execution time of the task plus all ancestor tasks execution times)
+         (execution time of the task plus its longest chain of ancestor tasks)
           multiplied by cores required so that long tasks get priority
          and core heavy tasks will get an extra advantage """
-        return (self.tasks[name].cores_required *
-            self.tasks[name].get_full_execution_time())
+        graph = self.task_graph()
+        return graph.priority_metrics()[graph.index(name)]
 
-    def prioritize_tasks(self):
-        """ Prioritize tasks based on priority metric """
-        prioritized_tasks =\
-            sorted(self.tasks, key=self.get_priority_metric, reverse=True)
-        return prioritized_tasks
+    def prioritize_tasks(self, strategy='cores_full_time'):
+        """ Prioritize tasks based on priority metric, or one of the other
+            PRIORITY_STRATEGIES """
+        graph = self.task_graph()
+        return [graph.names[i] for i in
+                graph.prioritize(strategy, self.resource_profile())]
 
-    def find_free_compute_resource(self, task):
-        """ Find the compute resource based on cores available non-greedy """
-        for resource in sorted(self.resources, key=lambda r: r.cores_available()):
-            if resource.cores_available() >= task.cores_required:
-                return resource
-        return None
+    def profile(self, memory=False):
+        """ Start profiling each phase of scheduling, returning the
+            profiling.Profiler the report can be had from. memory also
+            records tracemalloc peaks """
+        import profiling
+        self.profiler = profiling.Profiler(memory)
+        return self.profiler
 
-    def load_yaml(self, resources_path, tasks_path):
-        """ Load resources and task yaml description files and
-            initialize classes for each """
-        # Attempt to use the system's pyyaml, if that fails use our own
-        try:
-            import yaml
-        except ImportError:
-            sys.path.insert(0, os.path.join(filepath, 'pyyaml'))
-            import yaml
+    def phase(self, name):
+        """ Context timing the named phase when profiling """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
 
-        # Try and load yaml files in separate try blocks so we can error our
-        # more descriptively
+    def count_calls(self, owner, attribute, name=None):
+        """ Context counting calls of owner.attribute when profiling """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.count_calls(owner, attribute, name)
+
+    def lower_bounds(self):
+        """ LowerBounds on the makespan of scheduling the tasks onto
+            self.resources, see TaskGraph.lower_bounds """
+        return self.task_graph().lower_bounds(self.resource_profile())
+
+    def resource_profile(self):
+        """ (cores_total, speed) of each resource """
+        return [(r.cores_total, r.speed) for r in self.resources]
+
+    def resource_index(self, claim=False):
+        """ Placement index over self.resources for the placement policy, the
+            one held by the simulation in progress if there is one and built
+            from the resources as they are now otherwise. claim has the
+            resources keep a newly built index up to date themselves """
+        if self._resource_index is not None:
+            return self._resource_index
+        if self.placement == 'earliest_finish':
+            return self.EarliestFinishIndex(self.resources, claim)
+        elif any(r.memory_total is not None for r in self.resources):
+            return self.VectorFitIndex(self.resources, claim)
+        return self.FreeCoresIndex(self.resources, claim)
+
+    @contextlib.contextmanager
+    def indexed_resources(self):
+        """ Hold one placement index over self.resources for the duration,
+            kept up to date by the resources as tasks come and go. Resources
+            mustn't be added, removed or replaced meanwhile, simulations
+            build the index afresh each time so changes in between are
+            always picked up """
+        index = self.resource_index(claim=True)
+        self._resource_index = index
         try:
-            resource_dict = yaml.safe_load(open(resources_path, 'r'))
-        except:
-            print('\nERROR: "{0}", failed to load\n'.format(resources_path))
-            exit(-1)
+            yield index
+        finally:
+            self._resource_index = None
+            for resource in self.resources:
+                if resource.index is index:
+                    resource.index = None
+
+    def usage_timeline(self, graph):
+        """ utilization.UsageTimeline for simulating graph onto
+            self.resources, None unless self.track_usage """
+        if not self.track_usage:
+            return None
+        import utilization
+        return utilization.UsageTimeline(self.resources, len(graph))
+
+    def utilization_report(self, graph, makespan, record=None, timeline=None):
+        """ utilization.UtilizationReport of a schedule of graph, from the
+            UsageTimeline kept while simulating it or else replayed from
+            record, (task id, resource name, start, end) of each placement.
+            None unless self.track_usage """
+        if not self.track_usage:
+            return None
+        import utilization
+        with self.phase('utilization'):
+            if timeline is None:
+                timeline = utilization.UsageTimeline.replay(self.resources, graph, record)
+            return timeline.report(makespan, graph)
+
+    def find_reservation(self, completions, cores_required, memory_required=0):
+        """ Earliest a resource will have cores_required cores and
+            memory_required memory free going by completions, a heap of
+            (completion tick, assignment order, task id, task object,
+            resource). Returns (resource, tick, spare cores, spare memory)
+            with the spares being what's left over on that resource at that
+            tick, or None. The heap is walked in completion order without
+            being popped or copied, stopping as soon as a resource frees up
+            enough """
+        free = {}
+        found = None
+        walk = [(completions[0], 0)] if completions else []
+        while walk:
+            (end, _, _, task, res), pos = heapq.heappop(walk)
+            if found is not None and end > found[1]:
+                break
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if child < len(completions):
+                    heapq.heappush(walk, (completions[child], child))
+            if found is not None and res is not found[0]:
+                continue
+            cores, memory = free.get(res) or res.available()
+            free[res] = (cores + task.cores_required, memory + task.memory_required)
+            if found is None and free[res][0] >= cores_required and \
+                    free[res][1] >= memory_required:
+                found = (res, end)
+        if found is None:
+            return None
+        res, end = found
+        return res, end, free[res][0] - cores_required, free[res][1] - memory_required
+
+    def find_free_compute_resource(self, task):
+        """ Find the compute resource based on cores available non-greedy,
+            the tightest fit wins and ties go to the earlier resource. With
+            earliest_finish placement the resource finishing the task soonest
+            wins instead """
+        return self.resource_index().find(task.cores_required, task.execution_time,
+                                          task.memory_required)
+
+    def read_description(self, path):
+        """ Parse a task or resource description file into a list of
+            (name, value) pairs. .json files hold a single JSON object,
+            .jsonl files one JSON object per line which are streamed in
+            and anything else is read as yaml, with libyaml's C loader when
+            pyyaml was built with it """
         try:
-            task_dict = yaml.safe_load(open(tasks_path, 'r'))
-        except:
-            print('\nERROR: "{0}", failed to load\n'.format(tasks_path))
-            exit(-1)
+            extension = os.path.splitext(path)[1].lower()
+            if extension == '.json':
+                import json
+                with open(path, 'r') as f:
+                    return list(json.load(f).items())
+            if extension == '.jsonl':
+                import json
+                items = []
+                with open(path, 'r') as f:
+                    for line in f:
+                        if line.strip():
+                            items.extend(json.loads(line).items())
+                return items
 
-        # Initialize task objects from dict
-        for name, value in task_dict.items():
+            # Attempt to use the system's pyyaml, if that fails use our own
             try:
-                self.tasks[name] = self.Task(name, value['cores_required'],
-                    value['execution_time'])
-            except KeyError:
-                print('\nERROR: task "{0}", expected keys in load tasks yaml are not where expected\n'.format(name))
-                exit(-1)
+                import yaml
+            except ImportError:
+                sys.path.insert(0, os.path.join(filepath, 'pyyaml'))
+                import yaml
+            loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+            with open(path, 'r') as f:
+                return list(yaml.load(f, Loader=loader).items())
+        except Exception:
+            raise DescriptionError('"{0}", failed to load'.format(path))
 
-        # Link parents<->children
-        for name, value in task_dict.items():
-            for pname in [p.strip() for p in value.get('parent_tasks', '').split(',')]:
+    def compile_description(self, resource_items, task_items):
+        """ Validate parsed resource and task descriptions, returning them
+            as a graph_cache.CompiledGraph """
+        import array
+        import graph_cache
+
+        task_names = []
+        task_index = {}
+        cores_required = []
+        execution_times = []
+        parent_tasks = []
+        commands = []
+        memory_required = []
+        for name, value in task_items:
+            try:
+                cores_required.append(value['cores_required'])
+                execution_times.append(value['execution_time'])
+            except (KeyError, TypeError):
+                raise DescriptionError('task "{0}", expected keys in load tasks yaml are not where expected'.format(name))
+            if name in task_index:
+                raise DescriptionError('task "{0}" is described more than once'.format(name))
+            task_index[name] = len(task_names)
+            task_names.append(name)
+            parent_tasks.append(value.get('parent_tasks', ''))
+            command = value.get('command', '')
+            if not isinstance(command, str):
+                raise DescriptionError('task "{0}" command must be a string'.format(name))
+            commands.append(command)
+            memory_required.append(value.get('memory_required', 0))
+
+        invalid = [i for i in (self.first_non_integer(cores_required),
+                               self.first_non_integer(execution_times))
+                   if i is not None]
+        if invalid:
+            raise DescriptionError('task "{0}" cores_required and execution_time must be integer values'.format(task_names[min(invalid)]))
+        invalid = self.first_non_integer(memory_required)
+        if invalid is not None:
+            raise DescriptionError('task "{0}" memory_required must be an integer value'.format(task_names[invalid]))
+
+        # Resolve parent names to task indexes, parent_tasks is either a comma
+        # separated string or a list of names
+        parent_offsets = array.array('q', [0])
+        parents = array.array('q')
+        for name, pnames in zip(task_names, parent_tasks):
+            if isinstance(pnames, str):
+                pnames = pnames.split(',')
+            for pname in pnames:
+                pname = pname.strip()
                 if pname:
-                    parent = self.tasks.get(pname, None)
-                    if parent is not None:
-                        self.tasks[name].add_parent(parent)
-                        parent.add_child(self.tasks[name])
-                    else:
-                        print('\nERROR: {0}\'s parent task: "{1}", does not exist in task list\n'.format(name, pname))
-                        exit(-1)
-
-        # Initialize sorted (by name) compute resources list
-        for name, cores in sorted(resource_dict.items(), key=lambda r: r[0]):
-            if not isinstance(cores, int):
-                print('\nERROR: resource "{0}" cores count is not an interger value\n'.format(name))
-                exit(-1)
-            self.resources.append(self.ComputeResource(name, cores))
+                    pidx = task_index.get(pname, None)
+                    if pidx is None:
+                        raise DescriptionError('{0}\'s parent task: "{1}", does not exist in task list'.format(name, pname))
+                    parents.append(pidx)
+            parent_offsets.append(len(parents))
+
+        # A resource is either a core count, or a mapping with cores, an
+        # optional relative speed (defaulting to 1) and optional memory (not
+        # limited by default, -1 once compiled)
+        resource_items = sorted(resource_items, key=lambda r: r[0])
+        resource_names = []
+        resource_cores = []
+        resource_speeds = []
+        resource_memory = []
+        for name, value in resource_items:
+            speed = 1
+            memory = -1
+            if isinstance(value, dict):
+                speed = value.get('speed', 1)
+                memory = value.get('memory', -1)
+                value = value.get('cores')
+            if isinstance(speed, bool) or not isinstance(speed, (int, float)) or not speed > 0:
+                raise DescriptionError('resource "{0}" speed must be a positive number'.format(name))
+            if isinstance(memory, bool) or not isinstance(memory, int) or memory < -1:
+                raise DescriptionError('resource "{0}" memory must be a non negative integer'.format(name))
+            resource_names.append(name)
+            resource_cores.append(value)
+            resource_speeds.append(speed)
+            resource_memory.append(memory)
+        invalid = self.first_non_integer(resource_cores)
+        if invalid is not None:
+            raise DescriptionError('resource "{0}" cores count is not an interger value'.format(resource_names[invalid]))
+
+        return graph_cache.CompiledGraph(task_names,
+            array.array('q', cores_required), array.array('q', execution_times),
+            parent_offsets, parents, resource_names,
+            array.array('q', resource_cores), array.array('d', resource_speeds),
+            commands if any(commands) else None,
+            array.array('q', memory_required) if any(memory_required) else None,
+            array.array('q', resource_memory) if any(m >= 0 for m in resource_memory) else None)
+
+    def first_non_integer(self, values):
+        """ Position of the first of values that isn't an integer, or None """
+        if self.vectorized:
+            import vectorized
+            invalid = vectorized.non_integer_counts(values)
+            return int(invalid[0]) if len(invalid) else None
+        for i, value in enumerate(values):
+            if not isinstance(value, int):
+                return i
+        return None
+
+    def load_compiled(self, graph):
+        """ Initialize task and resource classes from a CompiledGraph """
+        tasks = [self.Task(name, cores, execution_time) for name, cores, execution_time
+                 in zip(graph.task_names, graph.cores_required, graph.execution_times)]
+        if graph.memory_required is not None:
+            for task, memory in zip(tasks, graph.memory_required):
+                task.memory_required = memory
+        offsets = graph.parent_offsets
+        for task in tasks:
+            self.tasks[task.name] = task
+        if graph.task_commands:
+            for task, command in zip(tasks, graph.task_commands):
+                task.command = command or None
+        # Link parents<->children
+        for idx, task in enumerate(tasks):
+            for pidx in graph.parents[offsets[idx]:offsets[idx+1]]:
+                parent = tasks[pidx]
+                task.add_parent(parent)
+                parent.add_child(task)
+
+        self.load_resources(graph)
+
+    def load_resources(self, graph):
+        """ Initialize compute resources from a CompiledGraph, which already
+            has them sorted by name """
+        memory = graph.resource_memory
+        if memory is None:
+            memory = [-1] * len(graph.resource_names)
+        for name, cores, speed, memory_total in zip(graph.resource_names,
+                graph.resource_cores, graph.resource_speeds, memory):
+            # Whole speeds stay ints so scaled times stay exact
+            if speed == int(speed):
+                speed = int(speed)
+            self.resources.append(self.ComputeResource(name, cores, speed,
+                memory_total if memory_total >= 0 else None))
+
+    def load(self, resources_path, tasks_path, cache_dir=None, compact=False):
+        """ Load resources and task description files and initialize classes
+            for each. With a cache_dir the validated descriptions are compiled
+            to a binary file there, keyed by a hash of both files, which is
+            memory mapped in place of parsing on later loads. With compact
+            tasks are kept in a TaskGraph (self.graph) rather than as Task
+            objects """
+        import graph_cache
+
+        graph = None
+        path = None
+        if cache_dir is not None:
+            try:
+                with self.phase('load.read_cache'):
+                    path = graph_cache.cache_path(cache_dir, resources_path, tasks_path)
+                    if os.path.exists(path):
+                        graph = graph_cache.read_graph(path)
+            except (OSError, ValueError):
+                # Unreadable inputs get reported when parsing them below
+                path = None
+
+        if graph is None:
+            with self.phase('load.parse'):
+                resource_items = self.read_description(resources_path)
+                task_items = self.read_description(tasks_path)
+            with self.phase('load.compile'):
+                graph = self.compile_description(resource_items, task_items)
+            if path is not None:
+                try:
+                    if not os.path.isdir(cache_dir):
+                        os.makedirs(cache_dir)
+                    graph_cache.write_graph(path, graph)
+                except (OSError, ValueError):
+                    pass # Caching is only an optimization, carry on without it
+
+        with self.phase('load.build'):
+            if compact:
+                self.graph = self.TaskGraph.from_compiled(graph)
+                self.load_resources(graph)
+            else:
+                self.load_compiled(graph)
+        return graph
+
+    def load_yaml(self, resources_path, tasks_path):
+        """ Load resources and task yaml description files and
+            initialize classes for each """
+        self.load(resources_path, tasks_path)
+
+    def find_cycle(self):
+        """ Return the names of tasks forming a dependency cycle (each one a
+            parent of the next, ending where it started) or None if the graph
+            is acyclic """
+        graph = self.task_graph()
+        cycle = graph.find_cycle()
+        if cycle is None:
+            return None
+        return [graph.names[i] for i in cycle]
 
     def check_circular_dependencies(self):
-        """ Simple circular build dependency check by counting depedents
-            seen and comparing to total task count"""
-        for name, task in self.tasks.items():
-            import copy
-            dependents = copy.copy(task.children)
-            for idx, depend in enumerate(dependents):
-                if idx > len(self.tasks.keys()):
-                    print('\nERROR: Circular dependencies detected between tasks\n')
-                    exit(-1)
-                dependents += depend.children
+        """ Verify the task graph has no circular dependencies in linear time,
+            returning the topological order of the tasks for later stages """
+        cycle = self.find_cycle()
+        if cycle is not None:
+            raise CircularDependencyError('Circular dependencies detected between tasks: {0}'.format(' -> '.join(cycle)), cycle)
+        return self.topological_order()
 
     def check_resources_needed(self):
         """ Verify that all given tasks are able to fit on a resource """
-        for name, task in self.tasks.items():
-            if self.find_free_compute_resource(task) is None:
-                print('\nERROR: Task "{0}" requires {1} cores, no resoure can handle that requirement\n'.format(task.name, task.cores_required))
-                exit(-1)
-
-    def find_schedule(self):
-        """ Simulator for finding the optimum task schedule """
+        graph = self.task_graph()
+        free_values = self.resource_index().free_values
+        if self.vectorized:
+            import vectorized
+            oversized = vectorized.oversized_tasks(graph.cores_required,
+                                                   free_values)
+            oversized = oversized[:1].tolist()
+        else:
+            largest = free_values[-1] if free_values else 0
+            oversized = [i for i, cores in enumerate(graph.cores_required)
+                         if cores > largest][:1]
+        for i in oversized:
+            raise ResourceError('Task "{0}" requires {1} cores, no resoure can handle that requirement'.format(graph.names[i], graph.cores_required[i]))
+        if graph.memory_required is not None and \
+                any(r.memory_total is not None for r in self.resources):
+            self.check_memory_needed(graph)
 
-        # Check for circular dependencies and tasks that are oversized for our
-        # resources, erroring our and exiting if so
-        self.check_circular_dependencies()
-        self.check_resources_needed()
+    def check_memory_needed(self, graph):
+        """ Verify every task fits on a single resource in cores and memory
+            together, not just on one with the cores and another with the
+            memory. With resources sorted by cores and a running maximum of
+            memory from the largest down, the most memory among resources
+            with enough cores for a task is a bisect away """
+        resources = sorted(self.resources, key=lambda r: r.cores_total)
+        cores = [r.cores_total for r in resources]
+        most_memory = [r.memory_available() for r in resources]
+        for i in range(len(most_memory) - 2, -1, -1):
+            most_memory[i] = max(most_memory[i], most_memory[i + 1])
+        for i, (c, m) in enumerate(zip(graph.cores_required, graph.memory_required)):
+            fits = bisect.bisect_left(cores, c)
+            if fits < len(cores) and m > most_memory[fits]:
+                raise ResourceError('Task "{0}" requires {1} cores and {2} memory, no resource has both'.format(graph.names[i], c, m))
 
-        current_ticks = 0 
-        prioritized_tasks = self.prioritize_tasks()
-        print('PRIORITIZED_TASKS: ' + str(prioritized_tasks) + '\n')
+    def simulate_ticks(self, prioritized_tasks, record=None):
+        """ Reference simulator, steps the schedule forward one tick at a time
+            returning the makespan. If record is a list a Placement is
+            appended to it for each task placed """
+        if self._resource_index is None:
+            with self.indexed_resources():
+                return self.simulate_ticks(prioritized_tasks, record)
+        current_ticks = 0
         while prioritized_tasks:
-            tasks_processed = False
             # For each prioritized task try and assign 
-            # it to a free compute resource
-            for t in prioritized_tasks:
+            # it to a free compute resource, walking a copy of the list since
+            # assigned tasks are removed from it as we go
+            for t in list(prioritized_tasks):
                 task = self.tasks[t]
                 if task.is_ready():
                     res = self.find_free_compute_resource(task)
@@ -213,7 +1429,9 @@ class TaskScheduler:
                         #print('-'*40 + str(current_ticks) + '-'*40)
                         if res.add_task(task):
                             prioritized_tasks.remove(task.name)
-                            tasks_processed = True
+                            if record is not None:
+                                record.append(Placement(task.name, res.name, current_ticks,
+                                    current_ticks + res.scaled_time(task.execution_time)))
                         else:
                             print("Failed to add task to resource")
             for resource in self.resources:
@@ -225,9 +1443,805 @@ class TaskScheduler:
             current_ticks += 1
             for resource in self.resources:
                 resource.iterate()
-        # If we care to double check the makespan, uncomment and run
-        print("\nSCHEDULE MAKESPAN: {0}".format(current_ticks))
-        
+        if self.profiler is not None:
+            self.profiler.count('ticks', current_ticks)
+        return current_ticks
+
+    def simulate_events(self, prioritized_tasks, record=None, timeline=None):
+        """ Discrete event simulator, instead of stepping one tick at a time
+            jump straight to the next task completion. Gives the same
+            assignments and makespan as simulate_ticks, including the
+            Placements appended to record if it's a list """
+        graph = self.task_graph()
+        order = [graph.index(name) for name in prioritized_tasks]
+        placements = [] if record is not None else None
+        if self.graph is not None:
+            makespan = self.simulate_graph(graph, order, record=placements,
+                                           timeline=timeline)
+        else:
+            # Task objects carry how much of their execution time is left
+            tasks = list(self.tasks.values())
+            makespan = self.simulate_graph(graph, order,
+                [t.execution_time for t in tasks], tasks.__getitem__, placements,
+                timeline=timeline)
+        if record is not None:
+            names = graph.names
+            record.extend(Placement(names[i], resource, start, end)
+                          for i, resource, start, end in placements)
+        return makespan
+
+    def simulate_graph(self, graph, order, execution_times=None, task_object=None,
+                       record=None, start=0, running=(), timeline=None):
+        """ Discrete event simulation of a TaskGraph onto self.resources.
+            order holds task ids in priority order, execution_times the time
+            left for each task (the graph's execution times by default, tasks
+            with none left count as done) and task_object(i) gives the object
+            put onto a ComputeResource for task i. If record is a list a
+            (task id, resource name, start, end) tuple is appended to it for
+            each placement, and if timeline is a utilization.UsageTimeline
+            the cores in use on each resource along with when each task
+            became ready and started are kept in it. Returns the makespan
+
+            A simulation can also pick up part way through from the start
+            tick, with running holding (task id, resource, end) for tasks
+            already on resources. Those tasks are left out of order but need
+            some execution time left so their children wait on them
+
+            With self.backfill the first ready task in priority order that
+            doesn't fit anywhere reserves the resource that will have its cores
+            free soonest (see find_reservation). Lower priority tasks can still
+            go on that resource if they finish by the reserved tick or leave
+            the reserved cores free, otherwise they're tried elsewhere. The
+            reservation is worked out again each time tasks are assigned so
+            the simulation only ever depends on its current state """
+        if self._resource_index is None:
+            with self.indexed_resources():
+                return self.simulate_graph(graph, order, execution_times, task_object,
+                                           record, start, running, timeline)
+
+        if execution_times is None:
+            execution_times = graph.execution_times
+        if task_object is None:
+            task_object = graph.task
+        cores_required = graph.cores_required
+        memory_required = graph.memory_required
+        child_offsets, children = graph.child_offsets, graph.children
+
+        # Tasks only become ready once their last parent finishes, tracked by
+        # counting down the parents each task is still waiting on
+        rank = [None] * len(graph)
+        parents_left = [None] * len(graph)
+        for idx, i in enumerate(order):
+            rank[i] = idx
+            parents_left[i] = sum(1 for p in graph.task_parents(i)
+                                  if execution_times[p] > 0)
+        # Ready tasks are kept in heaps of (rank, task id) by priority, one
+        # heap per task size. A task's size is its core count, and if a task
+        # can't fit anywhere neither can any needing as many cores, so each
+        # assignment pass only looks at the heads of heaps smaller than
+        # too_large. If tasks need memory a size is (cores, memory), with the
+        # heaps in a ReadyBySize that only gives the first task that fits.
+        # next_ready gives the (entry, size) to try next, None once done
+        if memory_required is None:
+            ready = {}
+
+            def make_ready(i):
+                heapq.heappush(ready.setdefault(cores_required[i], []), (rank[i], i))
+
+            def next_ready():
+                heads = [(heap[0], size) for size, heap in ready.items()
+                         if heap and (too_large is None or size < too_large)]
+                return min(heads) if heads else None
+
+            def pop_ready(size):
+                return heapq.heappop(ready[size])
+
+            def push_ready(size, entry):
+                heapq.heappush(ready[size], entry)
+        else:
+            ready = self.ReadyBySize(zip(cores_required, memory_required))
+
+            def make_ready(i):
+                ready.push((cores_required[i], memory_required[i]), (rank[i], i))
+
+            def next_ready():
+                found = ready.best(index.most_memory)
+                if self.backfill and reservation is None:
+                    # The first task that doesn't fit gets the reservation
+                    first = ready.first()
+                    if found is None or first < found:
+                        return first
+                return found
+
+            pop_ready = ready.pop
+            push_ready = ready.push
+
+        pending = 0
+        for i in order:
+            if execution_times[i] > 0:
+                pending += 1
+                if parents_left[i] == 0:
+                    make_ready(i)
+                    if timeline is not None:
+                        timeline.ready[i] = start
+
+        index = self.resource_index()
+        find = index.find
+        if self.profiler is not None:
+            find = self.profiler.counted('find_free_compute_resource', find)
+        current_ticks = start
+        events = 0
+        backfilled = 0
+        # Heap of (completion tick, assignment order, task id, task object,
+        # resource), the assignment order breaks ties so nothing past it is
+        # ever compared
+        completions = []
+        assigned = 0
+        for i, res, end in running:
+            task = task_object(i)
+            res.add_task(task)
+            if timeline is not None:
+                timeline.change(res, start)
+            completions.append((end, assigned, i, task, res))
+            assigned += 1
+        heapq.heapify(completions)
+        pending += assigned
+        while pending > assigned or completions:
+            # Assign ready tasks to free compute resources in priority order,
+            # nothing changes between completions so this only needs to
+            # happen once per event
+            too_large = None
+            # Reserved (resource, tick, spare cores, spare memory) and the
+            # ready entries held back by it, put back once this pass is done
+            reservation = None
+            deferred = []
+            while True:
+                found = next_ready()
+                if found is None:
+                    break
+                (_, i), size = found
+                cores = cores_required[i]
+                memory = memory_required[i] if memory_required is not None else 0
+                res = find(cores, execution_times[i], memory)
+                if res is None and self.backfill and reservation is None:
+                    reservation = self.find_reservation(completions, cores, memory)
+                elif res is not None and reservation is not None and \
+                        res is reservation[0] and \
+                        (cores > reservation[2] or memory > reservation[3]) and \
+                        current_ticks + res.scaled_time(execution_times[i]) > reservation[1]:
+                    # Would hold up the reserved task, try the other resources
+                    index.hide(res)
+                    try:
+                        res = find(cores, execution_times[i], memory)
+                    finally:
+                        index.show(reservation[0])
+                    if res is None:
+                        deferred.append((size, pop_ready(size)))
+                        continue
+                task = task_object(i) if res else None
+                if res and res.add_task(task):
+                    pop_ready(size)
+                    end = current_ticks + res.scaled_time(execution_times[i])
+                    heapq.heappush(completions, (end, assigned, i, task, res))
+                    assigned += 1
+                    if record is not None:
+                        record.append((i, res.name, current_ticks, end))
+                    if timeline is not None:
+                        timeline.change(res, current_ticks)
+                        timeline.started[i] = current_ticks
+                    if reservation is not None:
+                        backfilled += 1
+                        if res is reservation[0] and end > reservation[1]:
+                            reservation = (res, reservation[1], reservation[2] - cores,
+                                           reservation[3] - memory)
+                elif memory_required is None:
+                    too_large = size
+                else:
+                    # Held back for the rest of the pass like a deferred task
+                    deferred.append((size, pop_ready(size)))
+            for size, entry in deferred:
+                push_ready(size, entry)
+
+            if not completions:
+                waiting = [graph.names[i] for i in order if execution_times[i] > 0]
+                raise ResourceError('Tasks {0} can never be scheduled'.format(waiting))
+
+            # Skip ahead to the next completion, retiring every task that
+            # finishes on that same tick before assigning again. Once all
+            # tasks are assigned this drains the running tasks for the makespan
+            current_ticks = completions[0][0]
+            events += 1
+            while completions and completions[0][0] == current_ticks:
+                _, _, i, task, res = heapq.heappop(completions)
+                task.set_time_left(0)
+                res.remove_task(task)
+                if timeline is not None:
+                    timeline.change(res, current_ticks)
+                for c in children[child_offsets[i]:child_offsets[i+1]]:
+                    if parents_left[c] is not None:
+                        parents_left[c] -= 1
+                        if parents_left[c] == 0 and execution_times[c] > 0:
+                            make_ready(c)
+                            if timeline is not None:
+                                timeline.ready[c] = current_ticks
+        if self.profiler is not None:
+            self.profiler.count('events', events)
+            self.profiler.count('tasks_placed', assigned)
+            if self.backfill:
+                self.profiler.count('backfilled', backfilled)
+        return current_ticks
+
+    def resume_graph(self, graph, order, prefix, since, record=None):
+        """ simulate_graph picking up from the since tick, with the placements
+            in prefix, (task id, resource name, start, end) tuples for tasks
+            placed before since, carried over from an earlier simulation that
+            made the same choices up to since. If record is a list prefix is
+            appended to it followed by the new placements. Returns the
+            makespan """
+        resources = dict((r.name, r) for r in self.resources)
+        execution_times = list(graph.execution_times)
+        placed = bytearray(len(graph))
+        running = []
+        makespan = since
+        for i, name, start, end in prefix:
+            placed[i] = 1
+            makespan = max(makespan, end)
+            if end > since:
+                running.append((i, resources[name], end))
+            else:
+                execution_times[i] = 0
+        if record is not None:
+            record.extend(prefix)
+        return max(makespan, self.simulate_graph(graph,
+            [i for i in order if not placed[i]], execution_times,
+            record=record, start=since, running=running))
+
+    def find_schedule(self, simulation='event', strategy='cores_full_time'):
+        """ Simulator for finding the optimum task schedule, simulation is
+            either 'event' (skip between task completions) or 'tick' and
+            strategy one of PRIORITY_STRATEGIES. Returns a ScheduleResult,
+            which is also written to stdout in the text format unless quiet """
+
+        # Check for circular dependencies and tasks that are oversized for our
+        # resources, erroring our and exiting if so
+        with self.phase('check_circular_dependencies'):
+            self.check_circular_dependencies()
+        with self.phase('check_resources_needed'):
+            self.check_resources_needed()
+
+        if self.coarsen is not None:
+            if simulation == 'tick':
+                raise ValueError('Coarsening needs the event simulation')
+            if self.schedule_cache is not None:
+                raise ValueError('Coarsening can not be combined with the schedule cache')
+            result = self.find_schedule_coarsened(strategy)
+        elif self.schedule_cache is not None and simulation == 'event':
+            result = self.find_schedule_cached(strategy)
+        else:
+            with self.phase('prioritize_tasks'):
+                prioritized_tasks = self.prioritize_tasks(strategy)
+            # Worked out ahead of simulating, which uses up Task execution times
+            with self.phase('lower_bounds'):
+                lower_bounds = self.lower_bounds()
+            placements = []
+            graph = self.task_graph()
+            if simulation == 'tick':
+                if self.graph is not None:
+                    raise ValueError('Tick simulation needs Task objects, load without compact')
+                if self.backfill:
+                    raise ValueError('Backfilling needs the event simulation')
+                with self.phase('simulation'), \
+                        self.count_calls(self, 'find_free_compute_resource'), \
+                        self.count_calls(self.Task, 'is_ready', 'Task.is_ready'):
+                    current_ticks = self.simulate_ticks(list(prioritized_tasks), placements)
+                utilization = self.utilization_report(graph, current_ticks,
+                    [(graph.index(p.task), p.resource, p.start, p.end) for p in placements])
+            else:
+                timeline = self.usage_timeline(graph)
+                with self.phase('simulation'):
+                    current_ticks = self.simulate_events(prioritized_tasks, placements,
+                                                         timeline)
+                utilization = self.utilization_report(graph, current_ticks,
+                                                      timeline=timeline)
+            result = ScheduleResult(placements, current_ticks, prioritized_tasks, strategy,
+                                    lower_bounds, utilization=utilization)
+        if not self.quiet:
+            with self.phase('output'):
+                result.write(sys.stdout)
+        return result
+
+    def find_schedule_cached(self, strategy='cores_full_time'):
+        """ find_schedule going through self.schedule_cache. An exact hit is
+            returned as it is, otherwise the closest cached schedule warm
+            starts this one (see schedule_cache.py) and the result is cached """
+        import schedule_cache
+
+        graph = self.task_graph()
+        cache = self.schedule_cache
+        profile = self.resource_profile()
+        with self.phase('schedule_cache.lookup'):
+            family = schedule_cache.family_hash(self.resources, strategy,
+                                                self.placement, self.backfill)
+            key, sketch = schedule_cache.graph_hash(graph, family)
+            entry = cache.get(key)
+            warm = None
+            if entry is None:
+                closest = cache.closest(family, sketch)
+                previous = cache.get(closest) if closest is not None else None
+                if previous is not None:
+                    warm = schedule_cache.WarmStart(graph, previous)
+
+        if entry is not None:
+            if self.profiler is not None:
+                self.profiler.count('schedule_cache_hits')
+            order = entry['order']
+            record = [(i, entry['resources'][r], start, end)
+                      for i, r, start, end in entry['placements']]
+            makespan = entry['makespan']
+        else:
+            with self.phase('prioritize_tasks'):
+                if warm is not None and 'path_lengths' not in graph.cache:
+                    upward, downward, recomputed = warm.path_lengths()
+                    graph.cache['path_lengths'] = (upward, downward)
+                    if self.profiler is not None:
+                        self.profiler.count('path_lengths_recomputed', recomputed)
+                order = graph.prioritize(strategy, profile)
+                metrics = graph.priority_metrics(strategy, profile)
+            record = []
+            with self.phase('simulation'):
+                since, prefix = 0, []
+                if warm is not None:
+                    since, prefix = warm.resume_tick(order, metrics)
+                if since is None:
+                    record = prefix
+                    makespan = warm.entry['makespan']
+                elif prefix:
+                    makespan = self.resume_graph(graph, order, prefix, since, record)
+                else:
+                    makespan = self.simulate_graph(graph, order, record=record)
+                if self.profiler is not None:
+                    self.profiler.count('warm_start_placements_reused', len(prefix))
+            with self.phase('schedule_cache.store'):
+                try:
+                    cache.put(key, family, sketch, schedule_cache.make_entry(
+                        graph, self.resources, order, metrics, record, makespan))
+                except (OSError, ValueError):
+                    pass # Caching is only an optimization, carry on without it
+
+        with self.phase('lower_bounds'):
+            lower_bounds = self.lower_bounds()
+        # Task objects end up done, the same as after simulate_events
+        for task in self.tasks.values():
+            task.set_time_left(0)
+        names = graph.names
+        return ScheduleResult(
+            [Placement(names[i], resource, start, end) for i, resource, start, end in record],
+            makespan, [names[i] for i in order], strategy, lower_bounds,
+            utilization=self.utilization_report(graph, makespan, record))
+
+    def find_schedule_coarsened(self, strategy='cores_full_time'):
+        """ find_schedule on the task graph with its chains contracted into
+            super-tasks, see coarsening.py. The super-tasks are prioritized
+            and simulated in place of the tasks then expanded back into a
+            placement per task, the result's coarsening holding a
+            CoarseningReport of how much smaller the graph got """
+        import coarsening
+
+        graph = self.task_graph()
+        profile = self.resource_profile()
+        # Worked out first so the path lengths carry over to the coarse graph
+        with self.phase('lower_bounds'):
+            lower_bounds = self.lower_bounds()
+        with self.phase('coarsen'):
+            coarse = coarsening.Coarsening(graph, self.coarsen)
+        with self.phase('prioritize_tasks'):
+            order = coarse.coarse.prioritize(strategy, profile)
+        record = []
+        timeline = self.usage_timeline(coarse.coarse)
+        with self.phase('simulation'):
+            makespan = self.simulate_graph(coarse.coarse, order, record=record,
+                                           timeline=timeline)
+        # Usage is what the super-tasks held, blocked tasks going by super-task
+        utilization = self.utilization_report(coarse.coarse, makespan, timeline=timeline)
+        with self.phase('expand'):
+            record = coarse.expand(record, self.resources)
+            order = coarse.expand_order(order)
+        uncoarsened = None
+        if self.coarsen_compare:
+            with self.phase('uncoarsened_simulation'):
+                uncoarsened = self.simulate_graph(graph, graph.prioritize(strategy, profile))
+        if self.profiler is not None:
+            self.profiler.count('coarse_tasks', len(coarse.coarse))
+            self.profiler.count('chains_contracted', coarse.chains())
+
+        # Task objects end up done, the same as after simulate_events
+        for task in self.tasks.values():
+            task.set_time_left(0)
+        names = graph.names
+        return ScheduleResult(
+            [Placement(names[i], resource, start, end) for i, resource, start, end in record],
+            makespan, [names[i] for i in order], strategy, lower_bounds,
+            coarsening.CoarseningReport(len(graph), len(coarse.coarse), coarse.chains(),
+                                        makespan, uncoarsened),
+            utilization)
+
+    def improve_schedule(self, budget=1.0, strategy='cores_full_time', result=None,
+                         seed=0, max_iterations=None):
+        """ Look for a schedule with a smaller makespan than list scheduling
+            gives, by local search over priority orders (see local_search.py)
+            for up to budget seconds. Starts from the priority order of
+            result, a ScheduleResult from find_schedule, or strategy's
+            otherwise. With resources of differing speeds it also tries both
+            placement policies, the result's placement saying which one won
+            while self.placement is left as it was. Returns the best
+            ScheduleResult found """
+        import local_search
+
+        graph = self.task_graph()
+        if result is not None:
+            order = [graph.index(name) for name in result.prioritized_tasks]
+            strategy = result.strategy
+        else:
+            with self.phase('check_circular_dependencies'):
+                self.check_circular_dependencies()
+            with self.phase('check_resources_needed'):
+                self.check_resources_needed()
+            order = graph.prioritize(strategy, self.resource_profile())
+        lower_bounds = self.lower_bounds()
+
+        placements = [self.placement]
+        if len(set(r.speed for r in self.resources)) > 1:
+            placements = ['best_fit', 'earliest_finish']
+        best = None
+        original = self.placement
+        try:
+            with self.phase('local_search'):
+                for placement in placements:
+                    self.placement = placement
+                    found = local_search.improve(self, order,
+                        budget / len(placements), seed, max_iterations,
+                        lower_bounds.makespan, self.profiler)
+                    if best is None or found.makespan < best[0].makespan:
+                        best = (found, placement)
+        finally:
+            self.placement = original
+        found, placement = best
+
+        names = graph.names
+        return ScheduleResult(
+            [Placement(names[i], resource, start, end)
+             for i, resource, start, end in found.record],
+            found.makespan, [names[i] for i in found.order], strategy, lower_bounds,
+            utilization=self.utilization_report(graph, found.makespan, found.record),
+            placement=placement)
+
+    def execute(self, result, cpus=None, cwd=None, workers=None):
+        """ Run the commands of the tasks on this machine following result,
+            a ScheduleResult, with each resource's cores mapped onto cpus (all
+            available by default). Returns an executor.ExecutionResult with
+            the actual start and end of each task next to the predicted ones,
+            see executor.py. Given a workers address the tasks are run by
+            worker processes connecting there instead, see workers.py """
+        import executor
+
+        with self.phase('execute'):
+            if workers is not None:
+                import workers as worker_protocol
+                return worker_protocol.Coordinator(self, result, workers).run()
+            return executor.LocalExecutor(self, result, cpus, cwd).run()
+
+    def find_schedule_portfolio(self, strategies=None, processes=None):
+        """ Schedule with several priority strategies (all of
+            PRIORITY_STRATEGIES by default) in a pool of worker processes,
+            returning the StrategyRun with the smallest makespan (earlier
+            strategies win ties) and the runs of every strategy. The graph is
+            pickled once and unpickled once per worker. processes=1 runs
+            every strategy in this process instead """
+        with self.phase('check_circular_dependencies'):
+            self.check_circular_dependencies()
+        with self.phase('check_resources_needed'):
+            self.check_resources_needed()
+
+        graph = self.task_graph()
+        # Path lengths are shared by every strategy, work them out once here
+        # so workers receive them along with the graph
+        with self.phase('path_lengths'):
+            graph.path_lengths()
+        strategies = list(strategies or self.PRIORITY_STRATEGIES)
+        resources = [(r.name, r.cores_total, r.speed, r.memory_total)
+                     for r in self.resources]
+        if processes == 1 or len(strategies) == 1:
+            with self.phase('portfolio'):
+                runs = [run_strategy(graph, resources, s, self.placement, self.backfill)
+                        for s in strategies]
+        else:
+            import multiprocessing
+            import pickle
+
+            state = pickle.dumps((graph, resources, self.placement, self.backfill),
+                                 pickle.HIGHEST_PROTOCOL)
+            pool = multiprocessing.Pool(
+                processes or min(len(strategies), multiprocessing.cpu_count()),
+                portfolio_worker_init, (state,))
+            try:
+                with self.phase('portfolio'):
+                    runs = pool.map(portfolio_worker_run, strategies, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        return min(runs, key=lambda run: run.makespan), runs
+
+    def start_online(self, strategy='cores_full_time', time=0):
+        """ Start scheduling online from the given time, with tasks and
+            resources able to come and go as the schedule runs (see
+            submit_task, add_resource, remove_resource and advance_to).
+            Tasks already loaded are submitted in one go """
+        if strategy not in self.PRIORITY_STRATEGIES:
+            raise ValueError('unknown priority strategy "{0}"'.format(strategy))
+        if self.graph is not None:
+            raise ValueError('online scheduling needs Task objects, load without compact')
+        self.check_circular_dependencies()
+
+        online = self.OnlineState(strategy, time)
+        graph = self.task_graph()
+        upward, downward = graph.path_lengths()
+        for i, name in enumerate(graph.names):
+            online.order[name] = i
+            online.execution_times[name] = graph.execution_times[i]
+            online.upward[name] = upward[i]
+            online.downward[name] = downward[i]
+        self.online = online
+        for i, name in enumerate(graph.names):
+            task = self.tasks[name]
+            online.parents_left[name] = sum(
+                1 for p in graph.task_parents(i) if not self.tasks[graph.names[p]].is_done())
+            if task.is_done():
+                online.finished.add(name)
+            elif online.parents_left[name] == 0:
+                self.make_ready_online(name)
+        return online
+
+    def online_metric(self, name):
+        """ Priority metric of a task as TaskGraph.priority_metrics, from the
+            incrementally kept path lengths """
+        online = self.online
+        if online.strategy == 'cores_full_time':
+            return self.tasks[name].cores_required * online.upward[name]
+        if online.strategy == 'critical_path':
+            return (online.upward[name] + online.downward[name] -
+                    online.execution_times[name])
+        if online.strategy == 'heft_upward_rank':
+            return online.downward[name]
+        return online.execution_times[name]
+
+    def make_ready_online(self, name):
+        online = self.online
+        key = (-self.online_metric(name), online.order[name], name)
+        online.ready_keys[name] = key
+        task = self.tasks[name]
+        online.ready.push((task.cores_required, task.memory_required), key)
+
+    def submit_task(self, name, cores_required, execution_time, parent_tasks=(),
+                    memory_required=0):
+        """ Add a task while scheduling online, parent_tasks naming tasks
+            already submitted (as a list or comma separated string). Only the
+            new task's own priority is worked out, plus the downward path
+            lengths of unfinished ancestors it lengthens for strategies that
+            use them. The task is placed from the next advance_to. Raises
+            ResourceError if there are resources but none could ever hold
+            the task """
+        online = self.online or self.start_online()
+        if name in self.tasks:
+            raise ValueError('task "{0}" has already been submitted'.format(name))
+        if self.resources and not any(
+                r.cores_total >= cores_required and
+                (r.memory_total is None or r.memory_total >= memory_required)
+                for r in self.resources):
+            raise ResourceError('Task {0} needs {1} cores and {2} memory, more than any resource has'.format(
+                name, cores_required, memory_required))
+        if isinstance(parent_tasks, str):
+            parent_tasks = parent_tasks.split(',')
+        parents = []
+        for pname in parent_tasks:
+            pname = pname.strip()
+            if pname:
+                if pname not in self.tasks:
+                    raise ValueError('{0}\'s parent task: "{1}", has not been submitted'.format(name, pname))
+                parents.append(self.tasks[pname])
+
+        task = self.Task(name, cores_required, execution_time, memory_required)
+        for parent in parents:
+            task.add_parent(parent)
+            parent.add_child(task)
+        self.tasks[name] = task
+
+        online.order[name] = len(online.order)
+        online.execution_times[name] = execution_time
+        online.upward[name] = execution_time + max(
+            [online.upward[p.name] for p in parents] or [0])
+        online.downward[name] = execution_time
+        if online.strategy in ('critical_path', 'heft_upward_rank'):
+            self.lengthen_downward(parents, execution_time)
+
+        online.parents_left[name] = sum(1 for p in parents if p.name not in online.finished)
+        if task.is_done():
+            online.finished.add(name)
+        elif online.parents_left[name] == 0:
+            self.make_ready_online(name)
+        return task
+
+    def lengthen_downward(self, parents, below):
+        """ Raise the downward path lengths of parents and their ancestors now
+            that a path of length below hangs off parents, stopping wherever
+            the path isn't any longer than what's already known. Tasks running
+            or finished (and so their ancestors) are left alone """
+        online = self.online
+        stack = [(p, below) for p in parents]
+        while stack:
+            task, below = stack.pop()
+            name = task.name
+            if name in online.finished or name in online.running:
+                continue
+            length = online.execution_times[name] + below
+            if length > online.downward[name]:
+                online.downward[name] = length
+                if name in online.ready_keys:
+                    self.make_ready_online(name)
+                stack.extend((p, length) for p in task.parents)
+
+    def add_resource(self, name, cores_total, speed=1, memory_total=None):
+        """ Add a compute resource while scheduling online, kept in name order
+            the same as loaded resources """
+        if any(r.name == name for r in self.resources):
+            raise ValueError('resource "{0}" already exists'.format(name))
+        resource = self.ComputeResource(name, cores_total, speed, memory_total)
+        position = bisect.bisect([r.name for r in self.resources], name)
+        self.resources.insert(position, resource)
+        return resource
+
+    def remove_resource(self, name):
+        """ Remove a compute resource while scheduling online. Tasks running
+            on it are requeued to start over elsewhere, their names are
+            returned """
+        online = self.online or self.start_online()
+        for position, resource in enumerate(self.resources):
+            if resource.name == name:
+                break
+        else:
+            raise ValueError('resource "{0}" does not exist'.format(name))
+
+        requeued = []
+        for task in list(resource.tasks_in_progress):
+            start = online.running[task.name][3]
+            online.interrupted.append((task.name, name, start, online.time))
+            del online.running[task.name]
+            resource.remove_task(task)
+            task.set_time_left(online.execution_times[task.name])
+            self.make_ready_online(task.name)
+            requeued.append(task.name)
+        del self.resources[position]
+        return requeued
+
+    def place_online(self, placed):
+        """ Place ready tasks onto free resources in priority order at the
+            current time, as simulate_graph does """
+        online = self.online
+        index = self.resource_index()
+        # Entries that didn't fit after all, put back once done
+        deferred = []
+        while True:
+            found = online.ready.best(index.most_memory)
+            if found is None:
+                break
+            key, size = found
+            name = key[2]
+            if online.ready_keys.get(name) != key:
+                # Left behind by a priority change
+                online.ready.pop(size)
+                continue
+            task = self.tasks[name]
+            execution_time = online.execution_times[name]
+            res = index.find(size[0], execution_time, size[1])
+            if res and res.add_task(task):
+                online.ready.pop(size)
+                del online.ready_keys[name]
+                end = online.time + res.scaled_time(execution_time)
+                online.running[name] = (end, online.assigned, res, online.time)
+                heapq.heappush(online.completions, (end, online.assigned, name))
+                online.assigned += 1
+                placement = Placement(name, res.name, online.time, end)
+                online.placements.append(placement)
+                placed.append(placement)
+            else:
+                deferred.append((size, online.ready.pop(size)))
+        for size, key in deferred:
+            online.ready.push(size, key)
+
+    def advance_to(self, time=None):
+        """ Run the online schedule forward to the given time, or until every
+            running task has finished if time is None. Returns the
+            (task name, resource name, start, end) of each task placed on the
+            way. Running until everything has finished raises ResourceError
+            if tasks are left that no resource can hold, with nothing running
+            that could free one up. They stay queued for add_resource and
+            anything placed on the way is still in online.placements """
+        online = self.online or self.start_online()
+        if time is not None and time < online.time:
+            raise ValueError('can not go back to time {0} from {1}'.format(time, online.time))
+        if self._resource_index is None:
+            with self.indexed_resources():
+                return self.advance_to(time)
+        placed = []
+        while True:
+            self.place_online(placed)
+            if not online.completions or (time is not None and
+                                          online.completions[0][0] > time):
+                break
+            # Retire every task finishing at the next completion time
+            online.time = online.completions[0][0]
+            while online.completions and online.completions[0][0] == online.time:
+                _, assigned, name = heapq.heappop(online.completions)
+                running = online.running.get(name)
+                if running is None or running[1] != assigned:
+                    continue # Interrupted by its resource being removed
+                del online.running[name]
+                task = self.tasks[name]
+                task.set_time_left(0)
+                running[2].remove_task(task)
+                online.finished.add(name)
+                for child in task.children:
+                    online.parents_left[child.name] -= 1
+                    if online.parents_left[child.name] == 0 and not child.is_done():
+                        self.make_ready_online(child.name)
+        if time is not None:
+            online.time = time
+        elif online.ready_keys and not online.running:
+            waiting = sorted((name for name, task in self.tasks.items()
+                              if name not in online.finished), key=online.order.get)
+            raise ResourceError('Tasks {0} can never be scheduled'.format(waiting))
+        return placed
+
+
+# Makespans no schedule can beat, the longest path through the graph, the
+# total core time over every core and the larger of the two
+LowerBounds = collections.namedtuple('LowerBounds',
+    ['critical_path', 'work_per_core', 'makespan'])
+
+# Result of scheduling with one priority strategy, placements being
+# (task id, resource name, start, end) tuples in the order tasks were placed
+StrategyRun = collections.namedtuple('StrategyRun',
+    ['strategy', 'makespan', 'seconds', 'placements'])
+
+def run_strategy(graph, resources, strategy, placement='best_fit', backfill=False):
+    """ Schedule a TaskGraph onto fresh resources, given as (name, cores,
+        speed, memory) tuples, using one priority strategy """
+    import time
+
+    start = time.time()
+    ts = TaskScheduler()
+    ts.graph = graph
+    ts.placement = placement
+    ts.backfill = backfill
+    ts.resources = [TaskScheduler.ComputeResource(name, cores, speed, memory)
+                    for name, cores, speed, memory in resources]
+    placements = []
+    makespan = ts.simulate_graph(graph,
+        graph.prioritize(strategy, ts.resource_profile()), record=placements)
+    return StrategyRun(strategy, makespan, time.time() - start, placements)
+
+# Graph and resources for portfolio worker processes, unpickled once when
+# each worker starts rather than once per strategy
+portfolio_state = None
+
+def portfolio_worker_init(state):
+    global portfolio_state
+    import pickle
+    portfolio_state = pickle.loads(state)
+
+def portfolio_worker_run(strategy):
+    graph, resources, placement, backfill = portfolio_state
+    return run_strategy(graph, resources, strategy, placement, backfill)
+
 
 if __name__ == '__main__':
     check_python3()
@@ -237,11 +2251,119 @@ if __name__ == '__main__':
         description='Generates task schedule based on a task list' +
                     ' and compute resources available')
 
-    argparser.add_argument('task_yaml', type=str, help='task description yaml file')
-    argparser.add_argument('resource_yaml', type=str, help='resource description yaml file')
+    argparser.add_argument('task_yaml', type=str, help='task description yaml, json or jsonl file')
+    argparser.add_argument('resource_yaml', type=str, help='resource description yaml, json or jsonl file')
+    argparser.add_argument('--cache-dir', type=str, default=None,
+                           help='directory to keep compiled task/resource descriptions in')
+    argparser.add_argument('--compact', action='store_true',
+                           help='keep tasks in a compact array backed graph instead of objects')
+    argparser.add_argument('--numpy', action='store_true',
+                           help='validate and prioritize with numpy, a topological level at a time')
+    argparser.add_argument('--simulation', choices=['event', 'tick'], default=None,
+                           help='skip between task completions (event, the default) or step every tick (tick)')
+    argparser.add_argument('--strategy', choices=TaskScheduler.PRIORITY_STRATEGIES,
+                           default=None, help='how tasks are prioritized, cores_full_time by default')
+    argparser.add_argument('--portfolio', nargs='*', metavar='STRATEGY', default=None,
+                           help='schedule with several strategies (all by default) in parallel, keeping the best')
+    argparser.add_argument('--placement', choices=['best_fit', 'earliest_finish'],
+                           default='best_fit',
+                           help='place tasks on the tightest fitting resource or the one finishing them soonest')
+    argparser.add_argument('--backfill', action='store_true',
+                           help='reserve cores for the top priority task that is blocked, only backfilling tasks that leave it be')
+    argparser.add_argument('--improve', metavar='SECONDS', type=float, default=None,
+                           help='spend up to SECONDS improving the schedule by local search')
+    argparser.add_argument('--execute', metavar='REPORT', default=None,
+                           help="run the tasks' commands following the schedule, writing actual against predicted times to REPORT, - for stdout")
+    argparser.add_argument('--workers', metavar='ADDRESS', default=None,
+                           help='with --execute, run tasks on worker processes connecting to ADDRESS (host:port or a Unix socket path)')
+    argparser.add_argument('--schedule-cache', metavar='DIR', default=None,
+                           help='keep schedules in DIR, reusing them for the same inputs and warm starting from the closest otherwise')
+    argparser.add_argument('--coarsen', metavar='WASTE', nargs='?', type=float, const=0.0,
+                           default=None,
+                           help='contract chains of tasks before scheduling, optionally letting chains of differing tasks leave up to WASTE (a fraction) of their core time idle')
+    argparser.add_argument('--coarsen-compare', action='store_true',
+                           help='with --coarsen, also schedule the full graph to report the makespan difference')
+    argparser.add_argument('--output', metavar='PATH', default=None,
+                           help='write the schedule to PATH instead of stdout')
+    argparser.add_argument('--format', choices=['text', 'jsonl', 'csv', 'svg'], default=None,
+                           help='schedule output format, text by default or going by the --output extension')
+    argparser.add_argument('--gantt', metavar='PATH', default=None,
+                           help='also write an SVG Gantt chart of the schedule and its idle gaps to PATH')
+    argparser.add_argument('--quiet', action='store_true',
+                           help="don't write the schedule to stdout")
+    argparser.add_argument('--profile', metavar='REPORT', default=None,
+                           help='write a JSON report of time spent in each phase to REPORT, - for stderr')
+    argparser.add_argument('--profile-memory', action='store_true',
+                           help='include tracemalloc peaks in the --profile report')
 
     args = argparser.parse_args()
+    # Combinations find_schedule would only reject once loaded, or that
+    # --portfolio would quietly ignore
+    if args.portfolio is not None:
+        for flag, given in (('--strategy', args.strategy), ('--simulation', args.simulation),
+                            ('--coarsen', args.coarsen is not None),
+                            ('--schedule-cache', args.schedule_cache)):
+            if given:
+                argparser.error('--portfolio can not be combined with {0}'.format(flag))
+    if args.simulation == 'tick':
+        for flag, given in (('--compact', args.compact), ('--backfill', args.backfill),
+                            ('--coarsen', args.coarsen is not None)):
+            if given:
+                argparser.error('{0} needs the event simulation, not --simulation tick'.format(flag))
+    if args.coarsen is not None and args.schedule_cache:
+        argparser.error('--coarsen can not be combined with --schedule-cache')
 
     ts = TaskScheduler()
-    ts.load_yaml(args.resource_yaml, args.task_yaml)
-    ts.find_schedule()
+    ts.vectorized = args.numpy
+    ts.placement = args.placement
+    ts.backfill = args.backfill
+    ts.coarsen = args.coarsen
+    ts.coarsen_compare = args.coarsen_compare
+    # The schedule gets written out below
+    ts.quiet = True
+    if args.profile:
+        ts.profile(memory=args.profile_memory)
+    if args.schedule_cache:
+        import schedule_cache
+        ts.schedule_cache = schedule_cache.ScheduleCache(args.schedule_cache)
+    try:
+        with ts.phase('load'):
+            ts.load(args.resource_yaml, args.task_yaml, cache_dir=args.cache_dir,
+                    compact=args.compact)
+        if args.portfolio is not None:
+            best, runs = ts.find_schedule_portfolio(args.portfolio)
+            if not args.quiet:
+                for run in runs:
+                    print('STRATEGY {0}: MAKESPAN {1} ({2:.3f}s)'.format(
+                        run.strategy, run.makespan, run.seconds))
+                print('\nBEST STRATEGY: {0}\n'.format(best.strategy))
+            graph = ts.task_graph()
+            result = ScheduleResult(
+                [Placement(graph.names[i], resource, start, end)
+                 for i, resource, start, end in best.placements],
+                best.makespan,
+                [graph.names[i] for i in graph.prioritize(best.strategy, ts.resource_profile())],
+                best.strategy, ts.lower_bounds())
+        else:
+            result = ts.find_schedule(simulation=args.simulation or 'event',
+                                      strategy=args.strategy or 'cores_full_time')
+        if args.improve:
+            result = ts.improve_schedule(args.improve, result=result)
+    except SchedulerError as e:
+        print('\nERROR: {0}\n'.format(e))
+        exit(-1)
+
+    with ts.phase('output'):
+        if args.output:
+            result.save(args.output, args.format)
+        elif not args.quiet:
+            result.write(sys.stdout, args.format or 'text')
+        if args.gantt:
+            result.save(args.gantt, 'svg')
+    if args.execute:
+        execution = ts.execute(result, workers=args.workers)
+        execution.save(args.execute)
+    if args.profile:
+        ts.profiler.write_report(args.profile)
+    if args.execute and (execution.failed() or execution.skipped()):
+        exit(1)
@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import random
+import sys
+import unittest
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+sys.path.insert(0, filepath)
+import coarsening
+import task_scheduler
+from test_task_scheduler import load_example
+
+def chain_scheduler(seed, chain_count=30, same_cores=True):
+    """ Scheduler holding random chains of tasks, each chain hanging off a
+        task of an earlier chain, on resources of differing speeds """
+    rng = random.Random(seed)
+    Task = task_scheduler.TaskScheduler.Task
+    ts = task_scheduler.TaskScheduler()
+    ts.quiet = True
+    for i, speed in enumerate((1, 1, 2)):
+        ts.resources.append(task_scheduler.TaskScheduler.ComputeResource(
+            'compute{0}'.format(i), rng.randint(4, 8), speed))
+    tasks = []
+    for c in range(chain_count):
+        cores = rng.randint(1, 4)
+        previous = rng.choice(tasks) if tasks and rng.random() < 0.7 else None
+        for n in range(rng.randint(1, 6)):
+            task = Task('chain{0}_{1}'.format(c, n),
+                        cores if same_cores else rng.randint(1, 4), rng.randint(1, 30))
+            if previous is not None:
+                task.add_parent(previous)
+                previous.add_child(task)
+            ts.tasks[task.name] = task
+            tasks.append(task)
+            previous = task
+    return ts
+
+class TestCoarsening(unittest.TestCase):
+
+    def check_schedule(self, ts, result, original):
+        """ Every task placed once, after its parents, for its own execution
+            time and never more cores in use on a resource than it has """
+        self.assertEqual(sorted(original), sorted(p.task for p in result.placements))
+        placed = dict((p.task, p) for p in result.placements)
+        resources = dict((r.name, r) for r in ts.resources)
+        for p in result.placements:
+            self.assertTrue(all(placed[parent].end <= p.start
+                                for parent in original[p.task][1]))
+            if resources[p.resource].speed == 1:
+                self.assertEqual(original[p.task][2], p.end - p.start)
+        for name, resource in resources.items():
+            # Tasks ending free their cores before tasks starting then take them
+            events = sorted((t, delta) for p in result.placements if p.resource == name
+                            for t, delta in ((p.start, original[p.task][0]),
+                                             (p.end, -original[p.task][0])))
+            used = 0
+            for _, delta in events:
+                used += delta
+                self.assertTrue(used <= resource.cores_total)
+        self.assertEqual(max(p.end for p in result.placements), result.makespan)
+
+    def test_contract(self):
+        # task6 -> task7 is tasks2's only chain
+        ts = load_example('2')
+        graph = ts.task_graph()
+        coarse = coarsening.Coarsening(graph)
+        self.assertEqual(8, len(coarse.coarse))
+        self.assertEqual(1, coarse.chains())
+        s = coarse.coarse.index('task6')
+        self.assertEqual(['task6', 'task7'], [graph.names[i] for i in coarse.members(s)])
+        self.assertEqual((2, 100), (coarse.coarse.cores_required[s], coarse.coarse.execution_times[s]))
+        self.assertEqual(['task2'], [coarse.coarse.names[p] for p in coarse.coarse.task_parents(s)])
+        # Contracting chains leaves every path through the graph as long
+        self.assertEqual(max(graph.path_lengths()[0]), max(coarse.coarse.path_lengths()[0]))
+
+    def test_max_waste(self):
+        # Chains of differing tasks are only contracted with some waste allowed
+        Task = task_scheduler.TaskScheduler.Task
+        ts = task_scheduler.TaskScheduler()
+        tasks = [Task('a', 4, 10), Task('b', 2, 10), Task('c', 4, 10)]
+        for parent, child in zip(tasks, tasks[1:]):
+            child.add_parent(parent)
+            parent.add_child(child)
+        for task in tasks:
+            ts.tasks[task.name] = task
+        graph = ts.task_graph()
+        self.assertEqual(3, len(coarsening.Coarsening(graph).coarse))
+        # Taking b on after a leaves 20 core ticks idle, a third of their own
+        # 60, adding c on makes it 20 of 100
+        self.assertEqual(3, len(coarsening.Coarsening(graph, 0.25).coarse))
+        coarse = coarsening.Coarsening(graph, 0.4)
+        self.assertEqual(1, len(coarse.coarse))
+        self.assertEqual((4, 30), (coarse.coarse.cores_required[0], coarse.coarse.execution_times[0]))
+
+    def test_find_schedule(self):
+        for seed in range(20):
+            for same_cores, waste in ((True, 0.0), (False, 0.5)):
+                ts = chain_scheduler(seed, same_cores=same_cores)
+                original = dict((t.name, (t.cores_required, [p.name for p in t.parents],
+                                          t.execution_time)) for t in ts.tasks.values())
+                ts.coarsen = waste
+                ts.coarsen_compare = True
+                profiler = ts.profile()
+                result = ts.find_schedule()
+                self.check_schedule(ts, result, original)
+                report = result.coarsening
+                self.assertEqual(len(original), report.tasks)
+                self.assertTrue(report.coarse_tasks < report.tasks)
+                self.assertEqual(report.coarse_tasks, profiler.counters['coarse_tasks'])
+                self.assertEqual(result.makespan, report.makespan)
+                self.assertTrue(result.makespan >= result.lower_bounds.makespan)
+                uncoarsened = chain_scheduler(seed, same_cores=same_cores)
+                uncoarsened.quiet = True
+                self.assertEqual(uncoarsened.find_schedule().makespan,
+                                 report.uncoarsened_makespan)
+                self.assertTrue(all(t.is_done() for t in ts.tasks.values()))
+                # Priority order is the super-task order, chains kept together
+                self.assertEqual(sorted(original), sorted(result.prioritized_tasks))
+
+    def test_output(self):
+        ts = load_example('2')
+        ts.quiet = True
+        ts.coarsen = 0.0
+        result = ts.find_schedule()
+        out = io.StringIO()
+        result.write(out)
+        self.assertIn('COARSENED TASKS: 9 -> 8 (11.1% fewer, 1 chains contracted)', out.getvalue())
+        self.assertNotIn('UNCOARSENED', out.getvalue())
+        out = io.StringIO()
+        result.write(out, 'jsonl')
+        summary = json.loads(out.getvalue().splitlines()[-1])
+        self.assertEqual(8, summary['coarsening']['coarse_tasks'])
+
+        ts = load_example('2')
+        ts.coarsen = 0.0
+        self.assertRaises(ValueError, ts.find_schedule, 'tick')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import executor
+import task_scheduler
+
+def write_description(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+class TestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.resources = write_description(os.path.join(self.tmpdir, 'resources.yaml'),
+                                           'compute1: 2\ncompute2: 1\n')
+        self.tasks = write_description(os.path.join(self.tmpdir, 'tasks.yaml'), '''
+build:
+    cores_required: 2
+    execution_time: 10
+    command: "echo $TASK_SCHEDULER_CPUS > build.out"
+test:
+    cores_required: 1
+    execution_time: 5
+    parent_tasks: build
+    command: "test -f build.out"
+docs:
+    cores_required: 1
+    execution_time: 5
+bad:
+    cores_required: 1
+    execution_time: 5
+    command: "exit 3"
+after_bad:
+    cores_required: 1
+    execution_time: 5
+    parent_tasks: bad
+    command: "touch never"
+''')
+
+    def schedule(self, **load):
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        ts.load(self.resources, self.tasks, **load)
+        return ts, ts.find_schedule()
+
+    def test_execute(self):
+        ts, result = self.schedule()
+        self.assertEqual('exit 3', ts.tasks['bad'].command)
+        self.assertEqual(None, ts.tasks['docs'].command)
+        execution = ts.execute(result, cwd=self.tmpdir)
+
+        records = dict((r.task, r) for r in execution)
+        self.assertEqual(5, len(execution))
+        # Predicted times are carried over from the schedule
+        predicted = dict((p.task, p) for p in result.placements)
+        for name, record in records.items():
+            self.assertEqual((predicted[name].resource, predicted[name].start,
+                              predicted[name].end),
+                             (record.resource, record.predicted_start, record.predicted_end))
+        # test only starts once build has actually finished
+        self.assertEqual(0, records['build'].returncode)
+        self.assertTrue(records['test'].start >= records['build'].end)
+        self.assertEqual(0, records['test'].returncode)
+        self.assertEqual(0, records['docs'].returncode)
+        # A failed command skips everything depending on it
+        self.assertEqual(['bad'], [r.task for r in execution.failed()])
+        self.assertEqual(['after_bad'], [r.task for r in execution.skipped()])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'never')))
+
+        # build was told which CPUs it has and was only allowed on those
+        with open(os.path.join(self.tmpdir, 'build.out')) as f:
+            cpus = [int(c) for c in f.read().strip().split(',')]
+        self.assertEqual(records['build'].cpus, cpus)
+
+        out = io.StringIO()
+        execution.write(out)
+        self.assertEqual(6, len(out.getvalue().splitlines()))
+
+    def test_execute_cached(self):
+        # Commands survive the compiled graph cache, compact graphs included
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.schedule(cache_dir=cache_dir)
+        ts, result = self.schedule(cache_dir=cache_dir, compact=True)
+        self.assertEqual('exit 3', ts.graph.commands[ts.graph.index('bad')])
+        execution = ts.execute(result, cwd=self.tmpdir)
+        self.assertEqual(['bad'], [r.task for r in execution.failed()])
+
+    def test_core_limits(self):
+        # Three one core tasks on a two core resource never run three at once
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        ts.resources.append(task_scheduler.TaskScheduler.ComputeResource('compute1', 2))
+        for n in range(3):
+            task = task_scheduler.TaskScheduler.Task('task{0}'.format(n), 1, 1)
+            task.command = 'sleep 0.2'
+            ts.tasks[task.name] = task
+        execution = ts.execute(ts.find_schedule(), cpus=[0])
+        starts = sorted(r.start for r in execution)
+        self.assertTrue(starts[2] >= min(r.end for r in execution))
+        self.assertTrue(all(r.cpus == [0] for r in execution))
+
+    def test_core_cpus(self):
+        resources = [task_scheduler.TaskScheduler.ComputeResource('compute1', 2),
+                     task_scheduler.TaskScheduler.ComputeResource('compute2', 3)]
+        self.assertEqual({'compute1': [0, 1], 'compute2': [2, 3, 0]},
+                         executor.core_cpus(resources, [0, 1, 2, 3]))
+
+    def test_command_validation(self):
+        write_description(self.tasks, 'task1:\n    cores_required: 1\n    execution_time: 1\n    command: [make]\n')
+        ts = task_scheduler.TaskScheduler()
+        self.assertRaises(task_scheduler.DescriptionError, ts.load, self.resources, self.tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import array
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import graph_cache
+
+class TestGraphCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_round_trip(self):
+        graph = graph_cache.CompiledGraph(['task1', 'task2', 'task3'],
+            array.array('q', [2, 1, 4]), array.array('q', [100, 200, 50]),
+            array.array('q', [0, 0, 1, 3]), array.array('q', [0, 0, 1]),
+            ['compute1', 'compute2'], array.array('q', [2, 6]),
+            array.array('d', [1.0, 2.5]), ['make all', '', 'echo done'],
+            array.array('q', [512, 0, 2048]), array.array('q', [-1, 4096]))
+        path = os.path.join(self.tmpdir, 'graph')
+        graph_cache.write_graph(path, graph)
+
+        # Everything read back matches what was written
+        read = graph_cache.read_graph(path)
+        for name in graph_cache.CompiledGraph._fields:
+            self.assertEqual(list(getattr(graph, name)), list(getattr(read, name)))
+
+    def test_empty_graph(self):
+        graph = graph_cache.CompiledGraph([], [], [], [0], [], [], [], [])
+        path = os.path.join(self.tmpdir, 'graph')
+        graph_cache.write_graph(path, graph)
+        read = graph_cache.read_graph(path)
+        self.assertEqual([], read.task_names)
+        self.assertEqual([0], list(read.parent_offsets))
+        self.assertEqual(None, read.task_commands)
+        self.assertEqual((None, None), (read.memory_required, read.resource_memory))
+
+    def test_read_foreign_file(self):
+        # Files that aren't compiled graphs are treated as a cache miss
+        path = os.path.join(self.tmpdir, 'graph')
+        with open(path, 'wb') as f:
+            f.write(b'task1:\n    cores_required: 2\n' * 10)
+        self.assertEqual(None, graph_cache.read_graph(path))
+
+    def test_read_truncated(self):
+        # A graph cut short anywhere, or with bytes left over, is a miss
+        graph = graph_cache.CompiledGraph(['task1', 'task2'],
+            array.array('q', [2, 4]), array.array('q', [100, 50]),
+            array.array('q', [0, 0, 1]), array.array('q', [0]),
+            ['compute1'], array.array('q', [4]), array.array('d', [1.0]))
+        path = os.path.join(self.tmpdir, 'graph')
+        graph_cache.write_graph(path, graph)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for cut in list(range(len(data))) + [len(data) + 1]:
+            with open(path, 'wb') as f:
+                f.write(data[:cut] if cut < len(data) else data + b'\0')
+            self.assertEqual(None, graph_cache.read_graph(path))
+
+    def test_description_hash(self):
+        paths = [os.path.join(self.tmpdir, n) for n in ('a', 'b')]
+        for path, content in zip(paths, (b'compute1: 2\n', b'task1: {}\n')):
+            with open(path, 'wb') as f:
+                f.write(content)
+        digest = graph_cache.description_hash(*paths)
+        self.assertEqual(digest, graph_cache.description_hash(*paths))
+        # Changing either file changes the hash
+        with open(paths[1], 'ab') as f:
+            f.write(b'task2: {}\n')
+        self.assertNotEqual(digest, graph_cache.description_hash(*paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
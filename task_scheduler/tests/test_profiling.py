@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import sys
+import unittest
+from contextlib import redirect_stdout
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+sys.path.insert(0, filepath)
+import profiling
+import task_scheduler
+from test_task_scheduler import load_example
+
+class TestProfiler(unittest.TestCase):
+
+    def test_phases(self):
+        profiler = profiling.Profiler()
+        for i in range(3):
+            with profiler.phase('outer'):
+                with profiler.phase('inner'):
+                    pass
+        report = profiler.report()
+        self.assertEqual(['inner', 'outer'], [p['name'] for p in report['phases']])
+        self.assertEqual([3, 3], [p['calls'] for p in report['phases']])
+        inner, outer = report['phases']
+        self.assertTrue(outer['seconds'] >= inner['seconds'])
+        self.assertNotIn('tracemalloc_peak_bytes', outer)
+        # The report is plain JSON
+        json.dumps(report)
+
+    def test_memory(self):
+        profiler = profiling.Profiler(memory=True)
+        self.addCleanup(__import__('tracemalloc').stop)
+        with profiler.phase('outer'):
+            with profiler.phase('inner'):
+                block = bytearray(1 << 20)
+                del block
+        inner, outer = profiler.report()['phases']
+        # The enclosing phase's peak includes what happened inside it
+        self.assertTrue(inner['tracemalloc_peak_bytes'] >= 1 << 20)
+        self.assertTrue(outer['tracemalloc_peak_bytes'] >= inner['tracemalloc_peak_bytes'])
+
+    def test_count_calls(self):
+        profiler = profiling.Profiler()
+        Task = task_scheduler.TaskScheduler.Task
+        original = Task.is_ready
+        task = Task('task', 1, 10)
+        with profiler.count_calls(Task, 'is_ready', 'Task.is_ready'):
+            for i in range(5):
+                self.assertTrue(task.is_ready())
+        task.is_ready()
+        self.assertEqual(5, profiler.counters['Task.is_ready'])
+        # Counting stops once the context closes
+        self.assertIs(original, Task.is_ready)
+
+        # Instance attributes looked up through the class are removed again
+        ts = task_scheduler.TaskScheduler()
+        with profiler.count_calls(ts, 'prioritize_tasks'):
+            ts.prioritize_tasks()
+        self.assertEqual(1, profiler.counters['prioritize_tasks'])
+        self.assertNotIn('prioritize_tasks', vars(ts))
+
+class TestSchedulerProfiling(unittest.TestCase):
+
+    def test_disabled(self):
+        ts = load_example('2')
+        self.assertIsNone(ts.profiler)
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(600, ts.find_schedule().makespan)
+        self.assertNotIn('find_free_compute_resource', vars(ts))
+
+    def test_find_schedule(self):
+        for simulation, counters in (('event', ['find_free_compute_resource', 'events', 'tasks_placed']),
+                                     ('tick', ['find_free_compute_resource', 'Task.is_ready', 'ticks'])):
+            ts = task_scheduler.TaskScheduler()
+            profiler = ts.profile()
+            ts.load(os.path.join(filepath, 'yaml_files', 'resources2.yaml'),
+                    os.path.join(filepath, 'yaml_files', 'tasks2.yaml'))
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(600, ts.find_schedule(simulation=simulation).makespan)
+
+            report = profiler.report()
+            self.assertEqual(['load.parse', 'load.compile', 'load.build',
+                              'check_circular_dependencies', 'check_resources_needed',
+                              'prioritize_tasks', 'lower_bounds', 'simulation', 'utilization',
+                              'output'],
+                             [p['name'] for p in report['phases']])
+            self.assertEqual(counters, list(report['counters']))
+            self.assertEqual(9, report['counters'].get('tasks_placed', 9))
+            if simulation == 'tick':
+                self.assertEqual(600, report['counters']['ticks'])
+            self.assertNotIn('find_free_compute_resource', vars(ts))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+sys.path.insert(0, filepath)
+import schedule_cache
+import task_scheduler
+from test_task_scheduler import random_scheduler
+
+def change_graph(ts, rng, changes):
+    """ Make a few random changes to a scheduler's tasks, new execution
+        times, new tasks, removed tasks and new core counts """
+    Task = task_scheduler.TaskScheduler.Task
+    for n in range(changes):
+        names = sorted(ts.tasks)
+        kind = rng.randrange(4)
+        if kind == 0:
+            ts.tasks[rng.choice(names)].execution_time = rng.randint(1, 50)
+        elif kind == 1:
+            task = Task('new{0}'.format(n), 1, rng.randint(1, 50))
+            parent = ts.tasks[rng.choice(names)]
+            task.add_parent(parent)
+            parent.add_child(task)
+            ts.tasks[task.name] = task
+        elif kind == 2:
+            task = ts.tasks.pop(rng.choice(names))
+            for child in task.children:
+                child.parents.remove(task)
+            for parent in task.parents:
+                parent.children.remove(task)
+        else:
+            ts.tasks[rng.choice(names)].cores_required = 1
+
+class TestScheduleCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def scheduler(self, seed, rng=None, changes=0, backfill=False, cache=True):
+        ts = random_scheduler(seed, task_count=150)
+        ts.quiet = True
+        ts.backfill = backfill
+        if changes:
+            change_graph(ts, rng, changes)
+        if cache:
+            ts.schedule_cache = schedule_cache.ScheduleCache(self.tmpdir)
+        return ts
+
+    def test_hit(self):
+        result = self.scheduler(0).find_schedule()
+        ts = self.scheduler(0)
+        profiler = ts.profile()
+        cached = ts.find_schedule()
+        self.assertEqual(1, profiler.counters['schedule_cache_hits'])
+        self.assertEqual(list(result.placements), list(cached.placements))
+        self.assertEqual(result.prioritized_tasks, cached.prioritized_tasks)
+        self.assertEqual((result.makespan, result.lower_bounds),
+                         (cached.makespan, cached.lower_bounds))
+        self.assertTrue(all(t.is_done() for t in ts.tasks.values()))
+
+        # Other parameters are cached separately
+        ts = self.scheduler(0, backfill=True)
+        profiler = ts.profile()
+        ts.find_schedule()
+        self.assertNotIn('schedule_cache_hits', profiler.counters)
+
+    def test_warm_start(self):
+        # Warm starts give the same schedule as scheduling from scratch
+        reused = 0
+        for seed in range(20):
+            for backfill in (False, True):
+                self.scheduler(seed, backfill=backfill).find_schedule()
+                changes = 1 + seed % 3
+                ts = self.scheduler(seed, random.Random(seed), changes, backfill)
+                profiler = ts.profile()
+                warm = ts.find_schedule()
+                cold = self.scheduler(seed, random.Random(seed), changes, backfill,
+                                      cache=False).find_schedule()
+                self.assertEqual(list(cold.placements), list(warm.placements))
+                self.assertEqual(cold.makespan, warm.makespan)
+                self.assertEqual(cold.prioritized_tasks, warm.prioritized_tasks)
+                # Changes can leave the graph as it was, a plain hit
+                reused += profiler.counters.get('warm_start_placements_reused', 0)
+                self.assertTrue(profiler.counters.get('path_lengths_recomputed', 0) < 2 * 151)
+        self.assertTrue(reused > 0)
+
+    def test_warm_path_lengths(self):
+        for seed in range(10):
+            ts = self.scheduler(seed)
+            graph = ts.task_graph()
+            entry = schedule_cache.make_entry(graph, ts.resources, [], [], [], 0)
+            changed = self.scheduler(seed, random.Random(seed), 3, cache=False)
+            changed_graph = changed.task_graph()
+            warm = schedule_cache.WarmStart(changed_graph, entry)
+            upward, downward, _ = warm.path_lengths()
+            self.assertEqual(changed_graph.path_lengths(), (upward, downward))
+
+        # Nothing changed means nothing worked out again
+        warm = schedule_cache.WarmStart(graph, entry)
+        self.assertEqual((list(graph.path_lengths()[0]), list(graph.path_lengths()[1]), 0),
+                         warm.path_lengths())
+
+    def test_eviction(self):
+        cache = schedule_cache.ScheduleCache(self.tmpdir, max_entries=2)
+        for seed in range(3):
+            ts = self.scheduler(seed)
+            ts.schedule_cache = cache
+            ts.find_schedule()
+            # mtimes can be too coarse to tell writes apart
+            for name in os.listdir(self.tmpdir):
+                path = os.path.join(self.tmpdir, name)
+                os.utime(path, (os.path.getmtime(path) - 10,) * 2)
+        self.assertEqual(2, len(cache.read_index()['entries']))
+        self.assertEqual(3, len(os.listdir(self.tmpdir)))  # index included
+
+        # The least recently used schedule went, the others are still hits
+        for seed, hit in ((1, 1), (2, 1), (0, None)):
+            ts = self.scheduler(seed)
+            ts.schedule_cache = cache
+            profiler = ts.profile()
+            ts.find_schedule()
+            self.assertEqual(hit, profiler.counters.get('schedule_cache_hits'))
+
+    def test_similarity(self):
+        self.assertEqual(1.0, schedule_cache.similarity([1, 2, 3], [1, 2, 3]))
+        self.assertEqual(0.0, schedule_cache.similarity([1, 2], [3, 4]))
+        self.assertEqual(0.0, schedule_cache.similarity([], [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import schedule_output
+import task_scheduler
+
+def example_result():
+    return schedule_output.ScheduleResult(
+        [schedule_output.Placement('task2', 'compute1', 0, 10),
+         schedule_output.Placement('task1', 'compute2', 0, 5),
+         schedule_output.Placement('task3', 'compute2', 10, 30)],
+        30, ['task2', 'task1', 'task3'])
+
+class TestScheduleResult(unittest.TestCase):
+
+    def test_text(self):
+        out = io.StringIO()
+        example_result().write(out)
+        self.assertEqual("PRIORITIZED_TASKS: ['task2', 'task1', 'task3']\n\n"
+                         "task2: compute1\ntask1: compute2\ntask3: compute2\n"
+                         "\nSCHEDULE MAKESPAN: 30\n", out.getvalue())
+
+    def test_jsonl(self):
+        out = io.StringIO()
+        example_result().write(out, 'jsonl')
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual({'task': 'task2', 'resource': 'compute1', 'start': 0, 'end': 10},
+                         lines[0])
+        self.assertEqual({'makespan': 30}, lines[-1])
+        self.assertEqual(4, len(lines))
+
+    def test_csv(self):
+        out = io.StringIO()
+        example_result().write(out, 'csv')
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        self.assertEqual(['task', 'resource', 'start', 'end'], rows[0])
+        self.assertEqual(['task3', 'compute2', '10', '30'], rows[-1])
+        self.assertRaises(ValueError, example_result().write, out, 'xml')
+
+    def test_write_blocks(self):
+        # Large schedules are written a block at a time
+        placements = [schedule_output.Placement('task{0}'.format(i), 'compute', i, i + 1)
+                      for i in range(schedule_output.WRITE_BLOCK + 10)]
+        out = io.StringIO()
+        schedule_output.ScheduleResult(placements, len(placements)).write(out)
+        self.assertEqual(len(placements) + 4, len(out.getvalue().splitlines()))
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        # The format goes by the extension unless given
+        for name, first_line in (('schedule.jsonl', '{"task": "task2"'),
+                                 ('schedule.csv', 'task,resource,start,end'),
+                                 ('schedule.txt', 'PRIORITIZED_TASKS')):
+            path = os.path.join(tmpdir, name)
+            example_result().save(path)
+            with open(path) as f:
+                self.assertTrue(f.readline().startswith(first_line))
+
+class TestFindSchedule(unittest.TestCase):
+
+    def test_quiet(self):
+        ts = task_scheduler.TaskScheduler()
+        ts.load(os.path.join(filepath, 'yaml_files', 'resources1.yaml'),
+                os.path.join(filepath, 'yaml_files', 'tasks1.yaml'))
+        ts.quiet = True
+        out = io.StringIO()
+        with redirect_stdout(out):
+            result = ts.find_schedule()
+        self.assertEqual('', out.getvalue())
+        self.assertEqual(350, result.makespan)
+        self.assertEqual(len(ts.tasks), len(result))
+        # Every task ends by the makespan and after its parents
+        ends = dict((p.task, p.end) for p in result)
+        starts = dict((p.task, p.start) for p in result)
+        self.assertEqual(result.makespan, max(ends.values()))
+        for task in ts.tasks.values():
+            for parent in task.parents:
+                self.assertTrue(ends[parent.name] <= starts[task.name])
+
+
+if __name__ == '__main__':
+    unittest.main()
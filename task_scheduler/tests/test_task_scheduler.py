@@ -1,11 +1,69 @@
+import io
+import json
 import os
+import random
+import shutil
+import subprocess
 import sys
+import tempfile
 import unittest
+from contextlib import redirect_stdout
 
 filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
 sys.path.insert(0, os.path.join(filepath, '..'))
 import task_scheduler
 
+def load_example(n):
+    """ Load the tasks<n>.yaml and resources<n>.yaml example files """
+    ts = task_scheduler.TaskScheduler()
+    ts.load_yaml(os.path.join(filepath, 'yaml_files', 'resources{0}.yaml'.format(n)),
+                 os.path.join(filepath, 'yaml_files', 'tasks{0}.yaml'.format(n)))
+    return ts
+
+def random_scheduler(seed, task_count=40, resource_count=4):
+    """ Build a scheduler holding a random (acyclic) task graph """
+    rng = random.Random(seed)
+    ts = task_scheduler.TaskScheduler()
+    for i in range(resource_count):
+        ts.resources.append(task_scheduler.TaskScheduler.ComputeResource(
+            'compute{0}'.format(i), rng.randint(2, 8)))
+    max_cores = max(r.cores_total for r in ts.resources)
+    for i in range(task_count):
+        task = task_scheduler.TaskScheduler.Task('task{0}'.format(i),
+            rng.randint(1, max_cores), rng.randint(1, 50))
+        # Parents are only ever picked from earlier tasks so no cycles
+        for p in rng.sample(range(i), min(i, rng.randint(0, 3))):
+            parent = ts.tasks['task{0}'.format(p)]
+            task.add_parent(parent)
+            parent.add_child(task)
+        ts.tasks[task.name] = task
+    return ts
+
+def add_memory(ts, seed):
+    """ Give a scheduler's resources memory limits and its tasks memory
+        needs that always fit somewhere alongside their cores """
+    rng = random.Random(seed)
+    for resource in ts.resources:
+        resource.memory_total = rng.choice([4, 8, 16, 32]) * 1024
+    for task in ts.tasks.values():
+        most = max(r.memory_total for r in ts.resources
+                   if r.cores_total >= task.cores_required)
+        task.memory_required = rng.randint(0, most)
+    return ts
+
+def peak_memory(ts, placements):
+    """ Most memory in use on each resource at once, going by placements """
+    memory = dict((r.name, 0) for r in ts.resources)
+    peak = dict(memory)
+    events = []
+    for p in placements:
+        events.append((p.start, 1, p))
+        events.append((p.end, 0, p))
+    for _, starting, p in sorted(events, key=lambda e: (e[0], e[1])):
+        memory[p.resource] += ts.tasks[p.task].memory_required * (1 if starting else -1)
+        peak[p.resource] = max(peak[p.resource], memory[p.resource])
+    return peak
+
 class TestTaskScheduler(unittest.TestCase):
 
     def test_initializtion(self):
@@ -21,6 +79,54 @@ class TestTaskScheduler(unittest.TestCase):
         # Verify that our priority metric is a tasks cores * full execution time
         self.assertEqual(200, ts.get_priority_metric(t.name))
 
+    def test_get_path_lengths(self):
+        ts = task_scheduler.TaskScheduler()
+        # Diamond, root feeding a short and a long branch which both feed leaf
+        root = task_scheduler.TaskScheduler.Task('root', 1, 10)
+        short = task_scheduler.TaskScheduler.Task('short', 1, 20)
+        long = task_scheduler.TaskScheduler.Task('long', 1, 30)
+        leaf = task_scheduler.TaskScheduler.Task('leaf', 1, 5)
+        for t in (root, short, long, leaf):
+            ts.tasks[t.name] = t
+        for parent, child in ((root, short), (root, long), (short, leaf), (long, leaf)):
+            child.add_parent(parent)
+            parent.add_child(child)
+
+        # Upward follows the longest chain of ancestors, downward the longest
+        # chain of descendants, with the root only counted once
+        upward, downward = ts.get_path_lengths()
+        self.assertEqual({'root': 10, 'short': 30, 'long': 40, 'leaf': 45}, upward)
+        self.assertEqual({'root': 45, 'short': 25, 'long': 35, 'leaf': 5}, downward)
+        self.assertEqual(45, ts.get_priority_metric('leaf'))
+
+        # Path lengths are cached until the graph changes
+        self.assertIs(upward, ts.get_path_lengths()[0])
+        tail = task_scheduler.TaskScheduler.Task('tail', 2, 100)
+        ts.tasks[tail.name] = tail
+        tail.add_parent(leaf)
+        leaf.add_child(tail)
+        upward, downward = ts.get_path_lengths()
+        self.assertEqual(145, upward['tail'])
+        self.assertEqual(145, downward['root'])
+        self.assertEqual(290, ts.get_priority_metric('tail'))
+
+    def test_prioritize_tasks_long_chain(self):
+        # A chain far deeper than the recursion limit is prioritized in one
+        # pass, deepest task first
+        ts = task_scheduler.TaskScheduler()
+        parent = None
+        for i in range(50000):
+            task = task_scheduler.TaskScheduler.Task('task{0}'.format(i), 1, 1)
+            if parent is not None:
+                task.add_parent(parent)
+                parent.add_child(task)
+            ts.tasks[task.name] = task
+            parent = task
+        prioritized = ts.prioritize_tasks()
+        self.assertEqual('task49999', prioritized[0])
+        self.assertEqual('task0', prioritized[-1])
+        self.assertEqual(50000, ts.get_priority_metric('task49999'))
+
     def test_prioritize_tasks(self):
         ts = task_scheduler.TaskScheduler()
         t1 = task_scheduler.TaskScheduler.Task('task1', 1, 100)
@@ -34,6 +140,43 @@ class TestTaskScheduler(unittest.TestCase):
         # order based on their priority metrics
         self.assertEqual([t2.name, t3.name, t1.name], ts.prioritize_tasks())
 
+    def test_graph_cache_invalidation(self):
+        # Changing or replacing tasks drops whatever was worked out from them
+        Task = task_scheduler.TaskScheduler.Task
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        ts.resources.append(task_scheduler.TaskScheduler.ComputeResource('compute1', 1))
+        for task in (Task('a', 1, 100), Task('b', 1, 10)):
+            ts.tasks[task.name] = task
+        self.assertEqual(['a', 'b'], ts.prioritize_tasks())
+        ts.tasks['b'].execution_time = 1000
+        self.assertEqual(['b', 'a'], ts.prioritize_tasks())
+        self.assertEqual(1100, ts.lower_bounds().makespan)
+        ts.tasks['b'] = Task('b', 1, 1)
+        self.assertEqual(101, ts.lower_bounds().makespan)
+        ts.tasks['a'].cores_required = 2
+        self.assertEqual(201, ts.lower_bounds().makespan)
+        ts.tasks['a'].cores_required = 1
+        c = Task('c', 1, 50)
+        c.add_parent(ts.tasks['a'])
+        ts.tasks['a'].add_child(c)
+        ts.tasks.setdefault('c', c)
+        self.assertEqual(150, ts.lower_bounds().critical_path)
+        del ts.tasks['c']
+        ts.tasks['a'].children.remove(c)
+        self.assertEqual(100, ts.lower_bounds().critical_path)
+        # Commands are compiled into the graph too
+        self.assertIsNone(ts.task_graph().commands)
+        ts.tasks['a'].command = 'echo hi'
+        self.assertEqual(['echo hi', None], ts.task_graph().commands)
+
+        # Simulating uses up execution times without counting as a change,
+        # so the schedule can still be improved on afterwards
+        result = ts.find_schedule()
+        self.assertTrue(all(t.is_done() for t in ts.tasks.values()))
+        self.assertEqual(101, ts.lower_bounds().makespan)
+        self.assertEqual(result.makespan, ts.improve_schedule(1, result=result).makespan)
+
     def test_find_free_compute_resource(self):
         ts = task_scheduler.TaskScheduler()
         r1 = task_scheduler.TaskScheduler.ComputeResource('resource1', 1)
@@ -59,8 +202,797 @@ class TestTaskScheduler(unittest.TestCase):
         self.assertEqual(r1, ts.find_free_compute_resource(t1))
         self.assertEqual(r2, ts.find_free_compute_resource(t2))        
 
-    # TODO test load_yaml, check_circular_dependencies, check_resources_needed
-    # and find_schedule
+    def test_find_free_compute_resource_index(self):
+        ts = task_scheduler.TaskScheduler()
+        ts.resources = [task_scheduler.TaskScheduler.ComputeResource(
+            'resource{0}'.format(i), cores) for i, cores in enumerate([4, 2, 4, 2])]
+        t1 = task_scheduler.TaskScheduler.Task('task1', 1, 100)
+        t3 = task_scheduler.TaskScheduler.Task('task3', 3, 100)
+
+        # Ties between equally tight resources go to the earlier resource
+        self.assertEqual(ts.resources[1], ts.find_free_compute_resource(t1))
+        self.assertEqual(ts.resources[0], ts.find_free_compute_resource(t3))
+
+        # Adding and removing tasks keeps the index up to date
+        with redirect_stdout(io.StringIO()):
+            ts.resources[0].add_task(t3)
+        self.assertEqual(ts.resources[0], ts.find_free_compute_resource(t1))
+        self.assertEqual(ts.resources[2], ts.find_free_compute_resource(t3))
+        ts.resources[0].remove_task(t3)
+        self.assertEqual(ts.resources[1], ts.find_free_compute_resource(t1))
+
+        # and lookups always agree with sorting every resource by cores
+        # available, over a long run of random adds and removes
+        rng = random.Random(0)
+        ts.resources = [task_scheduler.TaskScheduler.ComputeResource(
+            'resource{0}'.format(i), rng.randint(1, 16)) for i in range(50)]
+        running = []
+        for i in range(2000):
+            task = task_scheduler.TaskScheduler.Task('task', rng.randint(1, 8), 1)
+            expected = None
+            for r in sorted(ts.resources, key=lambda r: r.cores_available()):
+                if r.cores_available() >= task.cores_required:
+                    expected = r
+                    break
+            self.assertIs(expected, ts.find_free_compute_resource(task))
+            if expected is not None and rng.random() < 0.6:
+                with redirect_stdout(io.StringIO()):
+                    expected.add_task(task)
+                running.append((expected, task))
+            elif running:
+                r, t = running.pop(rng.randrange(len(running)))
+                r.remove_task(t)
+
+    def test_resources_replaced(self):
+        # Lookups go by the resources as they are now, however they changed
+        Resource = task_scheduler.TaskScheduler.ComputeResource
+        ts = task_scheduler.TaskScheduler()
+        ts.resources = [Resource('a', 2), Resource('b', 4)]
+        task = task_scheduler.TaskScheduler.Task('task', 2, 10)
+        self.assertEqual('a', ts.find_free_compute_resource(task).name)
+        ts.resources.append(Resource('c', 2))
+        ts.resources.pop(0)
+        self.assertEqual('c', ts.find_free_compute_resource(task).name)
+        ts.resources = [Resource('d', 8), Resource('e', 4)]
+        self.assertEqual('e', ts.find_free_compute_resource(task).name)
+        ts.resources[1] = Resource('f', 2)
+        ts.tasks[task.name] = task
+        ts.quiet = True
+        self.assertEqual([('task', 'f', 0, 10)], [tuple(p) for p in ts.find_schedule()])
+        self.assertTrue(all(r.index is None for r in ts.resources))
+
+    def test_find_free_compute_resource_memory(self):
+        ts = task_scheduler.TaskScheduler()
+        ts.resources = [task_scheduler.TaskScheduler.ComputeResource('small', 4, 1, 4096),
+                        task_scheduler.TaskScheduler.ComputeResource('large', 8, 1, 65536),
+                        task_scheduler.TaskScheduler.ComputeResource('unlimited', 8)]
+        # The tightest fit in cores and memory together wins, resources that
+        # don't limit memory count as having all of it to spare
+        self.assertEqual('small', ts.find_free_compute_resource(
+            task_scheduler.TaskScheduler.Task('task1', 2, 10, 1024)).name)
+        self.assertEqual('large', ts.find_free_compute_resource(
+            task_scheduler.TaskScheduler.Task('task2', 2, 10, 16384)).name)
+        self.assertEqual('unlimited', ts.find_free_compute_resource(
+            task_scheduler.TaskScheduler.Task('task3', 2, 10, 100000)).name)
+
+        # Lookups agree with scoring every resource, over random adds and removes
+        rng = random.Random(0)
+        ts.resources = [task_scheduler.TaskScheduler.ComputeResource(
+            'resource{0}'.format(i), rng.randint(1, 16), 1,
+            rng.choice([None, rng.randint(1, 64) * 1024])) for i in range(50)]
+        most_cores = max(r.cores_total for r in ts.resources)
+        most_memory = max(r.memory_total for r in ts.resources if r.memory_total)
+        running = []
+        for i in range(2000):
+            task = task_scheduler.TaskScheduler.Task('task', rng.randint(1, 8), 1,
+                                                     rng.randint(0, 32) * 1024)
+            expected = None
+            for pos, r in enumerate(ts.resources):
+                if r.fits(task):
+                    spare = (r.cores_available() - task.cores_required) / float(most_cores)
+                    if r.memory_total is None:
+                        spare += 1.0
+                    else:
+                        spare += (r.memory_available() - task.memory_required) / float(most_memory)
+                    if expected is None or (spare, pos) < expected[0]:
+                        expected = ((spare, pos), r)
+            expected = expected[1] if expected else None
+            self.assertIs(expected, ts.find_free_compute_resource(task))
+            if expected is not None and rng.random() < 0.6:
+                expected.add_task(task)
+                running.append((expected, task))
+            elif running:
+                r, t = running.pop(rng.randrange(len(running)))
+                r.remove_task(t)
+
+    def test_memory_schedule(self):
+        # Two memory hungry tasks fit large's cores but not its memory, so
+        # they run one after the other
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        ts.resources = [task_scheduler.TaskScheduler.ComputeResource('small', 4, 1, 4096),
+                        task_scheduler.TaskScheduler.ComputeResource('large', 8, 1, 65536)]
+        for name in ('a', 'b'):
+            ts.tasks[name] = task_scheduler.TaskScheduler.Task(name, 2, 10, 40000)
+        ts.tasks['c'] = task_scheduler.TaskScheduler.Task('c', 2, 10, 1024)
+        result = ts.find_schedule()
+        self.assertEqual([('a', 'large', 0, 10), ('c', 'small', 0, 10), ('b', 'large', 10, 20)],
+                         [tuple(p) for p in result.placements])
+
+        # Online scheduling keeps to memory limits too
+        ts = task_scheduler.TaskScheduler()
+        ts.add_resource('large', 8, 1, 65536)
+        for name in ('a', 'b'):
+            ts.submit_task(name, 2, 10, memory_required=40000)
+        self.assertEqual([('a', 'large', 0, 10), ('b', 'large', 10, 20)],
+                         [tuple(p) for p in ts.advance_to()])
+
+    def test_memory_event_matches_tick(self):
+        for placement in ('best_fit', 'earliest_finish'):
+            for seed in range(10):
+                outputs = []
+                for simulation in ('event', 'tick'):
+                    ts = add_memory(random_scheduler(seed), seed)
+                    ts.placement = placement
+                    placements = []
+                    prioritized = ts.prioritize_tasks()
+                    if simulation == 'event':
+                        makespan = ts.simulate_events(prioritized, placements)
+                    else:
+                        makespan = ts.simulate_ticks(prioritized, placements)
+                    outputs.append((makespan, placements))
+                self.assertEqual(outputs[0], outputs[1])
+                # No resource ever has more memory in use than it has
+                for resource in ts.resources:
+                    self.assertTrue(peak_memory(ts, placements)[resource.name]
+                                    <= resource.memory_total)
+
+    def test_memory_backfill(self):
+        for seed in range(10):
+            ts = add_memory(random_scheduler(seed, task_count=200), seed)
+            ts.quiet = True
+            ts.backfill = True
+            result = ts.find_schedule()
+            self.assertEqual(sorted(ts.tasks), sorted(p.task for p in result.placements))
+            for resource in ts.resources:
+                self.assertTrue(peak_memory(ts, result.placements)[resource.name]
+                                <= resource.memory_total)
+
+    def test_simulate_events_memory_large(self):
+        # Thousands of tasks ready at once, each needing a different amount
+        # of memory, go through without every blocked size being checked
+        # against every ready size on every event
+        rng = random.Random(0)
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        ts.track_usage = False
+        for i in range(20):
+            ts.resources.append(task_scheduler.TaskScheduler.ComputeResource(
+                'compute{0}'.format(i), 16, 1, 65536))
+        root = task_scheduler.TaskScheduler.Task('root', 1, 1)
+        ts.tasks[root.name] = root
+        for i in range(4000):
+            task = task_scheduler.TaskScheduler.Task('task{0}'.format(i),
+                rng.randint(1, 16), rng.randint(1, 100), rng.randint(0, 65536))
+            task.add_parent(root)
+            root.add_child(task)
+            ts.tasks[task.name] = task
+        result = ts.find_schedule()
+        self.assertEqual(len(ts.tasks), len(result.placements))
+        self.assertTrue(result.makespan >= ts.lower_bounds().makespan)
+        for resource in ts.resources:
+            self.assertTrue(peak_memory(ts, result.placements)[resource.name]
+                            <= resource.memory_total)
+
+    def test_check_memory_needed(self):
+        # Enough cores on one resource and enough memory on another isn't
+        # enough, the task needs both on the same resource
+        for cores, fits in ((4, False), (2, True)):
+            ts = task_scheduler.TaskScheduler()
+            ts.resources = [task_scheduler.TaskScheduler.ComputeResource('wide', 8, 1, 1024),
+                            task_scheduler.TaskScheduler.ComputeResource('deep', 2, 1, 65536)]
+            ts.tasks['task'] = task_scheduler.TaskScheduler.Task('task', cores, 10, 2048)
+            if fits:
+                ts.check_resources_needed()
+            else:
+                self.assertRaises(task_scheduler.ResourceError, ts.check_resources_needed)
+
+    def test_find_schedule(self):
+        # The example yamls have known makespans for either simulator
+        for n, makespan in (('1', 350), ('2', 600)):
+            for simulation in ('event', 'tick'):
+                ts = load_example(n)
+                with redirect_stdout(io.StringIO()):
+                    self.assertEqual(makespan,
+                        ts.find_schedule(simulation=simulation).makespan)
+                # Every task has run to completion
+                self.assertTrue(all(t.is_done() for t in ts.tasks.values()))
+
+    def test_find_schedule_event_matches_tick(self):
+        def run(build, simulation):
+            ts = build()
+            prioritized_tasks = ts.prioritize_tasks()
+            placements = []
+            if simulation == 'tick':
+                makespan = ts.simulate_ticks(prioritized_tasks, placements)
+            else:
+                makespan = ts.simulate_events(prioritized_tasks, placements)
+            return makespan, placements
+
+        # The event driven simulator must place the same tasks on the same
+        # resources in the same order and end up with the same makespan
+        # as stepping tick by tick, for the example yamls
+        for n in ('1', '2'):
+            build = lambda: load_example(n)
+            self.assertEqual(run(build, 'tick'), run(build, 'event'))
+
+        # and for a batch of random graphs
+        for seed in range(20):
+            build = lambda: random_scheduler(seed)
+            self.assertEqual(run(build, 'tick'), run(build, 'event'))
+
+    def test_simulate_events_large(self):
+        # Tens of thousands of tasks go through the ready queue without
+        # rescanning the whole priority list on every event
+        ts = random_scheduler(0, task_count=20000, resource_count=16)
+        upward, _ = ts.get_path_lengths()
+        with redirect_stdout(io.StringIO()):
+            makespan = ts.simulate_events(ts.prioritize_tasks())
+        self.assertTrue(all(t.is_done() for t in ts.tasks.values()))
+        self.assertTrue(all(r.task_count() == 0 for r in ts.resources))
+        # The makespan can never beat the longest dependency chain
+        self.assertTrue(makespan >= max(upward.values()))
+
+    def test_prioritize_tasks_strategies(self):
+        ts = load_example('2')
+        # Every strategy ranks every task once
+        for strategy in ts.PRIORITY_STRATEGIES:
+            self.assertEqual(sorted(ts.tasks), sorted(ts.prioritize_tasks(strategy)))
+        # Longest processing time only looks at each task's own time
+        self.assertEqual(['task4', 'task2', 'task8', 'task9', 'task1', 'task5',
+                          'task3', 'task6', 'task7'],
+                         ts.prioritize_tasks('longest_processing_time'))
+        # HEFT's upward rank follows the longest path to an exit task
+        self.assertEqual(['task1', 'task2', 'task4', 'task8', 'task9', 'task5',
+                          'task6', 'task3', 'task7'],
+                         ts.prioritize_tasks('heft_upward_rank'))
+        self.assertRaises(ValueError, ts.prioritize_tasks, 'fastest')
+
+    def test_find_schedule_portfolio(self):
+        for processes in (1, 2):
+            ts = random_scheduler(3, task_count=200)
+            best, runs = ts.find_schedule_portfolio(processes=processes)
+            self.assertEqual(list(ts.PRIORITY_STRATEGIES), [r.strategy for r in runs])
+            self.assertEqual(min(r.makespan for r in runs), best.makespan)
+
+            # Each run matches scheduling with that strategy on its own
+            for run in runs:
+                ts = random_scheduler(3, task_count=200)
+                with redirect_stdout(io.StringIO()):
+                    self.assertEqual(run.makespan,
+                                     ts.find_schedule(strategy=run.strategy).makespan)
+                self.assertEqual(200, len(run.placements))
+                self.assertTrue(run.seconds >= 0)
+
+    def test_find_schedule_portfolio_compact(self):
+        # Memory mapped graphs are pickled once as plain arrays for workers
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        paths = [os.path.join(filepath, 'yaml_files', n)
+                 for n in ('resources2.yaml', 'tasks2.yaml')]
+        task_scheduler.TaskScheduler().load(*paths, cache_dir=tmpdir)
+        ts = task_scheduler.TaskScheduler()
+        ts.load(*paths, cache_dir=tmpdir, compact=True)
+        self.assertIsInstance(ts.graph.execution_times, memoryview)
+        best, runs = ts.find_schedule_portfolio(['critical_path', 'heft_upward_rank'],
+                                                processes=2)
+        self.assertEqual(600, best.makespan)
+        self.assertEqual('critical_path', best.strategy)
+
+    def test_backfill(self):
+        def schedule(resources, tasks, backfill):
+            """ Placements of tasks, given as (name, cores, time) in priority
+                order, onto resources given as (name, cores) """
+            ts = task_scheduler.TaskScheduler()
+            ts.backfill = backfill
+            for name, cores in resources:
+                ts.resources.append(task_scheduler.TaskScheduler.ComputeResource(name, cores))
+            for name, cores, time in tasks:
+                ts.tasks[name] = task_scheduler.TaskScheduler.Task(name, cores, time)
+            record = []
+            ts.simulate_events([name for name, _, _ in tasks], record)
+            return dict((p.task, p) for p in record)
+
+        # wide needs the whole resource and comes second in priority behind a
+        # task already taking half of it
+        resources = [('compute1', 4)]
+        tasks = [('first', 2, 10), ('wide', 4, 10), ('short', 2, 5),
+                 ('long1', 2, 15), ('long2', 2, 15), ('long3', 2, 15)]
+        # Without backfilling the long tasks keep taking the cores freed up
+        # until they've all started
+        self.assertEqual(35, schedule(resources, tasks, False)['wide'].start)
+        # With it wide gets the resource once first finishes, only short
+        # (done by then) gets to run alongside first
+        placed = schedule(resources, tasks, True)
+        self.assertEqual(10, placed['wide'].start)
+        self.assertEqual(0, placed['short'].start)
+        self.assertTrue(all(placed[name].start >= 20 for name in ('long1', 'long2', 'long3')))
+
+        # Tasks held back from the reserved resource still go elsewhere
+        resources = [('compute1', 6), ('compute2', 3)]
+        tasks = [('first', 4, 10), ('wide', 6, 10), ('long1', 2, 15)]
+        placed = schedule(resources, tasks, False)
+        self.assertEqual(('compute1', 0), placed['long1'][1:3])
+        self.assertEqual(15, placed['wide'].start)
+        placed = schedule(resources, tasks, True)
+        self.assertEqual(('compute2', 0), placed['long1'][1:3])
+        self.assertEqual(('compute1', 10), placed['wide'][1:3])
+
+        ts = load_example('2')
+        ts.backfill = True
+        self.assertRaises(ValueError, ts.find_schedule, simulation='tick')
+
+    def test_backfill_random(self):
+        for seed in range(10):
+            for placement in ('best_fit', 'earliest_finish'):
+                ts = random_scheduler(seed, task_count=200)
+                ts.quiet = True
+                ts.backfill = True
+                ts.placement = placement
+                result = ts.find_schedule()
+                self.assertEqual(sorted(ts.tasks), sorted(p.task for p in result.placements))
+                self.assertTrue(result.makespan >= result.lower_bounds.makespan)
+                self.assertTrue(all(r.task_count() == 0 for r in ts.resources))
+                # Children never start before their parents finish
+                end = dict((p.task, p.end) for p in result.placements)
+                for p in result.placements:
+                    self.assertTrue(all(end[parent.name] <= p.start
+                                        for parent in ts.tasks[p.task].parents))
+
+    def test_lower_bounds(self):
+        # tasks2's longest chain is the makespan list scheduling finds
+        ts = load_example('2')
+        bounds = ts.lower_bounds()
+        self.assertEqual((600, 400, 600), tuple(bounds))
+        with redirect_stdout(io.StringIO()):
+            result = ts.find_schedule()
+        self.assertEqual(bounds, result.lower_bounds)
+        self.assertEqual(0, result.gap())
+
+        # No schedule gets under either bound
+        for seed in range(10):
+            ts = random_scheduler(seed)
+            ts.quiet = True
+            result = ts.find_schedule()
+            self.assertTrue(result.makespan >= result.lower_bounds.critical_path)
+            self.assertTrue(result.makespan >= result.lower_bounds.work_per_core)
+            self.assertTrue(result.gap() >= 0)
+
+    def test_improve_schedule(self):
+        for seed in range(5):
+            ts = random_scheduler(seed, task_count=100)
+            ts.quiet = True
+            result = ts.find_schedule()
+            improved = ts.improve_schedule(5, result=result, max_iterations=50)
+            self.assertTrue(improved.makespan <= result.makespan)
+            self.assertTrue(improved.makespan >= improved.lower_bounds.makespan)
+            self.assertEqual(sorted(ts.tasks), sorted(p.task for p in improved.placements))
+
+            # The improved priority order gives the same schedule when
+            # simulated again from scratch
+            self.assertEqual('best_fit', improved.placement)
+            graph = ts.task_graph()
+            record = []
+            order = [graph.index(name) for name in improved.prioritized_tasks]
+            self.assertEqual(improved.makespan, ts.simulate_graph(graph, order, record=record))
+            self.assertEqual([tuple(p) for p in improved.placements],
+                             [(graph.names[i], r, s, e) for i, r, s, e in record])
+
+        # Trying both placement policies leaves the scheduler's own alone
+        ts = random_scheduler(0, task_count=100)
+        ts.quiet = True
+        for resource, speed in zip(ts.resources, (1, 2, 1, 3)):
+            resource.speed = speed
+        improved = ts.improve_schedule(5, max_iterations=20)
+        self.assertEqual('best_fit', ts.placement)
+        self.assertIn(improved.placement, ('best_fit', 'earliest_finish'))
+        ts.placement = improved.placement
+        graph = ts.task_graph()
+        order = [graph.index(name) for name in improved.prioritized_tasks]
+        self.assertEqual(improved.makespan, ts.simulate_graph(graph, order))
+
+        # Nothing to do once the schedule is already at its lower bound
+        ts = load_example('2')
+        ts.quiet = True
+        self.assertEqual(600, ts.improve_schedule(1).makespan)
+
+    def test_find_cycle(self):
+        ts = task_scheduler.TaskScheduler()
+        with redirect_stdout(io.StringIO()):
+            ts.load_yaml(os.path.join(filepath, 'yaml_files', 'resources1.yaml'),
+                         os.path.join(filepath, 'yaml_files', 'tasks_circular_dependency.yaml'))
+        # task2 and task3 each list the other as a parent, task1 is fine
+        cycle = ts.find_cycle()
+        self.assertEqual(cycle[0], cycle[-1])
+        self.assertEqual({'task2', 'task3'}, set(cycle))
+        self.assertEqual(['task1'], ts.topological_order())
+        with self.assertRaises(task_scheduler.CircularDependencyError) as raised:
+            ts.check_circular_dependencies()
+        self.assertEqual(cycle, raised.exception.cycle)
+
+        # A task depending on itself is a cycle of one
+        t = task_scheduler.TaskScheduler.Task('task', 1, 1)
+        t.add_parent(t)
+        t.add_child(t)
+        ts = task_scheduler.TaskScheduler()
+        ts.tasks[t.name] = t
+        self.assertEqual(['task', 'task'], ts.find_cycle())
+
+    def test_check_circular_dependencies(self):
+        # Wide fan-out/fan-in graphs are acyclic and checked in linear time,
+        # handing back a topological order
+        ts = task_scheduler.TaskScheduler()
+        root = task_scheduler.TaskScheduler.Task('root', 1, 1)
+        sink = task_scheduler.TaskScheduler.Task('sink', 1, 1)
+        ts.tasks[root.name] = root
+        for i in range(2000):
+            t = task_scheduler.TaskScheduler.Task('task{0}'.format(i), 1, 1)
+            for parent, child in ((root, t), (t, sink)):
+                child.add_parent(parent)
+                parent.add_child(child)
+            ts.tasks[t.name] = t
+        ts.tasks[sink.name] = sink
+        self.assertEqual(None, ts.find_cycle())
+        order = ts.check_circular_dependencies()
+        self.assertEqual(len(ts.tasks), len(order))
+        self.assertEqual('root', order[0])
+        self.assertEqual('sink', order[-1])
+
+    def test_load_yaml(self):
+        ts = load_example('2')
+        # Tasks keep the order of the yaml, resources are sorted by name
+        self.assertEqual(['task{0}'.format(i) for i in range(1, 10)], list(ts.tasks))
+        self.assertEqual(['compute1', 'compute2', 'compute3'],
+                         [r.name for r in ts.resources])
+        self.assertEqual([6, 200], [ts.tasks['task8'].cores_required,
+                                    ts.tasks['task8'].execution_time])
+        self.assertEqual(['task1', 'task2'],
+                         [p.name for p in ts.tasks['task3'].parents])
+        self.assertEqual(['task3', 'task4', 'task5', 'task6'],
+                         [c.name for c in ts.tasks['task2'].children])
+
+        # Parents that don't exist are an error
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        tasks_path = os.path.join(tmpdir, 'tasks.json')
+        with open(tasks_path, 'w') as f:
+            json.dump({'task1': {'cores_required': 1, 'execution_time': 1,
+                                 'parent_tasks': 'task0'}}, f)
+        ts = task_scheduler.TaskScheduler()
+        self.assertRaises(task_scheduler.DescriptionError, ts.load_yaml,
+            os.path.join(filepath, 'yaml_files', 'resources1.yaml'), tasks_path)
+
+    def test_load_json(self):
+        def describe(ts):
+            return ([(t.name, t.cores_required, t.execution_time,
+                      [p.name for p in t.parents]) for t in ts.tasks.values()],
+                    [(r.name, r.cores_total) for r in ts.resources])
+
+        expected = describe(load_example('2'))
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        resources = dict(expected[1])
+        tasks = dict((name, {'cores_required': cores, 'execution_time': time,
+                             'parent_tasks': parents})
+                     for name, cores, time, parents in expected[0])
+
+        # A single JSON object loads the same as yaml, parent_tasks can be
+        # given as a list of names
+        paths = [os.path.join(tmpdir, n) for n in ('resources.json', 'tasks.json')]
+        for path, description in zip(paths, (resources, tasks)):
+            with open(path, 'w') as f:
+                json.dump(description, f)
+        ts = task_scheduler.TaskScheduler()
+        ts.load(*paths)
+        self.assertEqual(expected, describe(ts))
+
+        # as does JSON lines, one object per line
+        paths = [os.path.join(tmpdir, n) for n in ('resources.jsonl', 'tasks.jsonl')]
+        for path, description in zip(paths, (resources, tasks)):
+            with open(path, 'w') as f:
+                for name, value in description.items():
+                    f.write(json.dumps({name: value}) + '\n')
+        ts = task_scheduler.TaskScheduler()
+        ts.load(*paths)
+        self.assertEqual(expected, describe(ts))
+
+    def test_load_cache_dir(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        paths = [os.path.join(filepath, 'yaml_files', n)
+                 for n in ('resources2.yaml', 'tasks2.yaml')]
+
+        # The first load compiles the descriptions into the cache dir
+        ts = task_scheduler.TaskScheduler()
+        ts.load(*paths, cache_dir=tmpdir)
+        self.assertEqual(1, len(os.listdir(tmpdir)))
+
+        # later loads read the compiled graph back instead of the yaml,
+        # giving the same schedule
+        ts_cached = task_scheduler.TaskScheduler()
+        graph = ts_cached.load(*paths, cache_dir=tmpdir)
+        self.assertIsInstance(graph.execution_times, memoryview)
+        self.assertEqual(list(ts.tasks), list(ts_cached.tasks))
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(ts.find_schedule().placements,
+                             ts_cached.find_schedule().placements)
+
+    def test_load_speeds(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        paths = [os.path.join(tmpdir, n) for n in ('resources.json', 'tasks.json')]
+        with open(paths[1], 'w') as f:
+            json.dump({'task': {'cores_required': 1, 'execution_time': 10}}, f)
+
+        # Resources are either a core count or cores with a speed
+        with open(paths[0], 'w') as f:
+            json.dump({'slow': 4, 'fast': {'cores': 2, 'speed': 2.5}}, f)
+        ts = task_scheduler.TaskScheduler()
+        ts.load(*paths)
+        self.assertEqual([('fast', 2, 2.5), ('slow', 4, 1)],
+            [(r.name, r.cores_total, r.speed) for r in ts.resources])
+
+        # Resources can limit memory, which tasks can ask for
+        with open(paths[0], 'w') as f:
+            json.dump({'slow': 4, 'fast': {'cores': 2, 'memory': 8192}}, f)
+        with open(paths[1], 'w') as f:
+            json.dump({'task': {'cores_required': 1, 'execution_time': 10,
+                                'memory_required': 4096}}, f)
+        for compact in (False, True):
+            ts = task_scheduler.TaskScheduler()
+            ts.load(*paths, cache_dir=os.path.join(tmpdir, 'cache'), compact=compact)
+            self.assertEqual([8192, None], [r.memory_total for r in ts.resources])
+            self.assertEqual([4096], list(ts.task_graph().memory_required))
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual('fast', ts.find_schedule().placements[0].resource)
+        for memory in (-2, 1.5, 'lots'):
+            with open(paths[0], 'w') as f:
+                json.dump({'node': {'cores': 2, 'memory': memory}}, f)
+            with self.assertRaises(task_scheduler.DescriptionError):
+                task_scheduler.TaskScheduler().load(*paths)
+        with open(paths[1], 'w') as f:
+            json.dump({'task': {'cores_required': 1, 'execution_time': 10,
+                                'memory_required': 'lots'}}, f)
+        with self.assertRaises(task_scheduler.DescriptionError):
+            task_scheduler.TaskScheduler().load(paths[0], paths[1])
+        with open(paths[1], 'w') as f:
+            json.dump({'task': {'cores_required': 1, 'execution_time': 10}}, f)
+
+        # speeds have to be positive numbers
+        for speed in (0, -1, 'fast', True):
+            with open(paths[0], 'w') as f:
+                json.dump({'node': {'cores': 2, 'speed': speed}}, f)
+            with self.assertRaises(task_scheduler.DescriptionError):
+                task_scheduler.TaskScheduler().load(*paths)
+
+    def test_earliest_finish(self):
+        ts = task_scheduler.TaskScheduler()
+        ts.resources = [task_scheduler.TaskScheduler.ComputeResource('slow', 2),
+                        task_scheduler.TaskScheduler.ComputeResource('fast', 4, 2)]
+        for name in ('a', 'b', 'c'):
+            task = task_scheduler.TaskScheduler.Task(name, 2, 10)
+            ts.tasks[name] = task
+
+        # Best fit takes the tightest fitting resource, however slow it is
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(10, ts.simulate_events(['a', 'b', 'c']))
+        self.assertEqual('slow', ts.find_free_compute_resource(ts.tasks['a']).name)
+
+        # earliest finish goes for the faster resource while it has room
+        for task in ts.tasks.values():
+            task.execution_time = 10
+        ts.placement = 'earliest_finish'
+        self.assertEqual('fast', ts.find_free_compute_resource(ts.tasks['a']).name)
+        record = []
+        with redirect_stdout(io.StringIO()):
+            graph = ts.task_graph()
+            self.assertEqual(10, ts.simulate_graph(graph,
+                [graph.index(n) for n in ('a', 'b', 'c')], record=record))
+        self.assertEqual([('fast', 0, 5), ('fast', 0, 5), ('slow', 0, 10)],
+                         [(resource, start, end) for _, resource, start, end in record])
+
+    def test_speeds_event_matches_tick(self):
+        for placement in ('best_fit', 'earliest_finish'):
+            for seed in range(5):
+                outputs = []
+                for simulation in ('event', 'tick'):
+                    ts = random_scheduler(seed)
+                    ts.placement = placement
+                    # Whole speeds keep every scaled time exact
+                    for i, resource in enumerate(ts.resources):
+                        resource.speed = 1 + i % 3
+                    prioritized = ts.prioritize_tasks('heft_upward_rank')
+                    placements = []
+                    if simulation == 'event':
+                        makespan = ts.simulate_events(prioritized, placements)
+                    else:
+                        makespan = ts.simulate_ticks(prioritized, placements)
+                    outputs.append((makespan, placements))
+                self.assertEqual(outputs[0], outputs[1])
+
+    # TODO test check_resources_needed
+
+class TestOnline(unittest.TestCase):
+
+    def test_matches_offline(self):
+        # Submitting everything up front schedules the same as find_schedule
+        for seed in range(5):
+            for strategy in task_scheduler.TaskScheduler.PRIORITY_STRATEGIES:
+                ts = random_scheduler(seed)
+                expected = []
+                with redirect_stdout(io.StringIO()):
+                    graph = ts.task_graph()
+                    makespan = ts.simulate_graph(graph,
+                        graph.prioritize(strategy), record=expected)
+                expected = [(graph.names[i], r, start, end)
+                            for i, r, start, end in expected]
+
+                ts = random_scheduler(seed)
+                with redirect_stdout(io.StringIO()):
+                    ts.start_online(strategy)
+                    self.assertEqual(expected, ts.advance_to())
+                self.assertEqual(makespan, ts.online.time)
+
+    def test_incremental_priorities(self):
+        # Priorities kept up as tasks are submitted one at a time match
+        # working them out for the whole graph
+        for strategy in task_scheduler.TaskScheduler.PRIORITY_STRATEGIES:
+            offline = random_scheduler(3, task_count=80)
+            ts = task_scheduler.TaskScheduler()
+            ts.resources = offline.resources
+            ts.start_online(strategy)
+            for task in offline.tasks.values():
+                ts.submit_task(task.name, task.cores_required, task.execution_time,
+                               [p.name for p in task.parents])
+            graph = offline.task_graph()
+            metrics = graph.priority_metrics(strategy)
+            self.assertEqual(metrics, [ts.online_metric(n) for n in graph.names])
+
+    def test_arrivals(self):
+        ts = task_scheduler.TaskScheduler()
+        ts.add_resource('compute1', 4)
+        ts.submit_task('a', 4, 10)
+        ts.submit_task('b', 2, 5, 'a')
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual([('a', 'compute1', 0, 10)], ts.advance_to(5))
+            # A task arriving mid run starts from when it arrived
+            ts.submit_task('c', 2, 20)
+            ts.add_resource('compute0', 2)
+            self.assertEqual([('c', 'compute0', 5, 25)], ts.advance_to(6))
+            self.assertEqual([('b', 'compute1', 10, 15)], ts.advance_to())
+        self.assertEqual(25, ts.online.time)
+
+        with self.assertRaises(ValueError):
+            ts.submit_task('a', 1, 1)
+        with self.assertRaises(ValueError):
+            ts.submit_task('d', 1, 1, ['missing'])
+        with self.assertRaises(ValueError):
+            ts.advance_to(10)
+
+    def test_never_fits(self):
+        # Tasks no resource can hold are turned away, or reported once
+        # running to completion leaves them stranded
+        ts = task_scheduler.TaskScheduler()
+        ts.add_resource('compute1', 2)
+        with self.assertRaises(task_scheduler.ResourceError):
+            ts.submit_task('big', 4, 10)
+        self.assertNotIn('big', ts.tasks)
+
+        ts.add_resource('compute2', 4)
+        ts.submit_task('a', 2, 10)
+        ts.submit_task('b', 4, 10)
+        ts.submit_task('c', 1, 10, 'b')
+        ts.advance_to(5)
+        self.assertEqual(['b'], ts.remove_resource('compute2'))
+        with self.assertRaises(task_scheduler.ResourceError) as raised:
+            ts.advance_to()
+        self.assertIn("['b', 'c']", str(raised.exception))
+        # Still queued, a resource big enough picks them up
+        ts.add_resource('compute3', 4)
+        self.assertEqual([('b', 'compute3', 10, 20), ('c', 'compute1', 20, 30)],
+                         ts.advance_to())
+
+    def test_remove_resource(self):
+        ts = task_scheduler.TaskScheduler()
+        ts.add_resource('compute0', 4)
+        ts.add_resource('compute1', 2)
+        ts.submit_task('a', 2, 10)
+        ts.submit_task('b', 4, 10)
+        with redirect_stdout(io.StringIO()):
+            ts.advance_to(4)
+            # Tasks on a removed resource start over elsewhere
+            self.assertEqual(['a'], ts.remove_resource('compute1'))
+            self.assertEqual([('a', 'compute0', 10, 20)], ts.advance_to())
+        self.assertEqual([('a', 'compute1', 0, 4)], ts.online.interrupted)
+        self.assertEqual(20, ts.online.time)
+        self.assertEqual(['compute0'], [r.name for r in ts.resources])
+
+class TestTaskGraph(unittest.TestCase):
+
+    def test_from_tasks(self):
+        ts = load_example('2')
+        graph = task_scheduler.TaskScheduler.TaskGraph.from_tasks(ts.tasks.values())
+        self.assertEqual(list(ts.tasks), graph.names)
+        self.assertEqual([t.cores_required for t in ts.tasks.values()],
+                         list(graph.cores_required))
+        self.assertEqual([t.execution_time for t in ts.tasks.values()],
+                         list(graph.execution_times))
+        # Parent and child links are both held as CSR arrays of task ids
+        for i, task in enumerate(ts.tasks.values()):
+            self.assertEqual([p.name for p in task.parents],
+                             [graph.names[p] for p in graph.task_parents(i)])
+            self.assertEqual([c.name for c in task.children],
+                             [graph.names[c] for c in graph.task_children(i)])
+        self.assertEqual(3, graph.index('task4'))
+
+    def test_path_lengths(self):
+        # root -> (a, b) -> leaf, with the upward and downward lengths
+        # following the longer branch
+        graph = task_scheduler.TaskScheduler.TaskGraph(
+            ['root', 'a', 'b', 'leaf'], [1, 2, 1, 3], [10, 20, 30, 5],
+            [0, 0, 1, 2, 4], [0, 0, 1, 2])
+        self.assertEqual([0, 1, 2, 3], graph.topological_order())
+        self.assertEqual(([10, 30, 40, 45], [45, 25, 35, 5]), graph.path_lengths())
+        self.assertEqual([10, 60, 40, 135], graph.priority_metrics())
+        self.assertEqual([3, 1, 2, 0], graph.prioritize())
+        self.assertEqual(None, graph.find_cycle())
+
+        # root <- a <- b <- root is a cycle
+        graph = task_scheduler.TaskScheduler.TaskGraph(
+            ['root', 'a', 'b'], [1, 1, 1], [1, 1, 1], [0, 1, 2, 3], [2, 0, 1])
+        self.assertEqual([], graph.topological_order())
+        cycle = graph.find_cycle()
+        self.assertEqual(4, len(cycle))
+        self.assertEqual({0, 1, 2}, set(cycle))
+
+    def test_mean_costs(self):
+        ts = task_scheduler.TaskScheduler()
+        small = task_scheduler.TaskScheduler.Task('small', 1, 12)
+        large = task_scheduler.TaskScheduler.Task('large', 4, 12)
+        large.add_parent(small)
+        small.add_child(large)
+        ts.tasks = {'small': small, 'large': large}
+        graph = ts.task_graph()
+
+        # Costs average over the resources a task fits on, so only the fast
+        # resource counts for the large task
+        profile = [(2, 1), (4, 3)]
+        self.assertEqual([8.0, 4.0], graph.mean_costs(profile))
+        self.assertEqual([12.0, 4.0],
+                         graph.priority_metrics('heft_upward_rank', profile))
+        # and with every speed 1 the rank is the downward path length
+        self.assertEqual([24, 12], graph.priority_metrics('heft_upward_rank',
+                                                          [(2, 1), (4, 1)]))
+
+    def test_compact_schedule(self):
+        # Scheduling straight off the compact graph gives the same placements
+        # and makespan as scheduling Task objects
+        paths = [os.path.join(filepath, 'yaml_files', n)
+                 for n in ('resources2.yaml', 'tasks2.yaml')]
+        outputs = []
+        for compact in (False, True):
+            ts = task_scheduler.TaskScheduler()
+            ts.load(*paths, compact=compact)
+            out = io.StringIO()
+            with redirect_stdout(out):
+                result = ts.find_schedule()
+            outputs.append((result.makespan, result.placements, out.getvalue()))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual({}, ts.tasks)
+        self.assertEqual(9, len(ts.graph))
+        # The compact graph is left untouched so it can be scheduled again
+        ts.quiet = True
+        self.assertEqual(600, ts.find_schedule().makespan)
 
 class TestTask(unittest.TestCase):
 
@@ -97,27 +1029,6 @@ class TestTask(unittest.TestCase):
         t.add_child(c)
         self.assertEqual([c], t.children)
 
-    def test_get_full_execution_time(self):
-        t = task_scheduler.TaskScheduler.Task('test', 1, 100)
-        self.assertEqual(100, t.get_full_execution_time())
-
-        # Add a parent and verify that it affects our full execution time
-        p = task_scheduler.TaskScheduler.Task('parent', 2, 200)
-        t.add_parent(p)
-        self.assertEqual(300, t.get_full_execution_time())
-        # Test that our exclution list gets utilized properly
-        self.assertEqual(100, t.get_full_execution_time(exclude_parents=[p]))
-
-        # Add a grandparent and verify that that increases our full exec time
-        gp = task_scheduler.TaskScheduler.Task('grandparent', 3, 300)
-        p.add_parent(gp)
-        self.assertEqual(600, t.get_full_execution_time())
-
-        # If a task's grandparent is also it's parent the grandparents time
-        # should only be counted once
-        t.add_parent(gp)
-        self.assertEqual(600, t.get_full_execution_time())
-
     def test_is_done(self):
         t = task_scheduler.TaskScheduler.Task('test', 1, 100)
         self.assertFalse(t.is_done())
@@ -250,6 +1161,56 @@ class TestComputeResource(unittest.TestCase):
         # and any cores that were claimed by the task will be freed up
         self.assertEqual(r.cores_total, r.cores_available())
 
+    def test_memory(self):
+        r = task_scheduler.TaskScheduler.ComputeResource('test', 5, 1, 1024)
+        t1 = task_scheduler.TaskScheduler.Task('task1', 1, 100, 768)
+        t2 = task_scheduler.TaskScheduler.Task('task2', 1, 100, 512)
+
+        # Tasks need room in every dimension, not just cores
+        self.assertTrue(r.add_task(t1))
+        self.assertEqual((4, 256), r.available())
+        self.assertFalse(r.add_task(t2))
+        r.remove_task(t1)
+        self.assertTrue(r.add_task(t2))
+        self.assertEqual(512, r.memory_used)
+
+        # Resources without a memory limit take any task
+        r = task_scheduler.TaskScheduler.ComputeResource('test', 5)
+        self.assertEqual((5, float('inf')), r.available())
+        self.assertTrue(r.add_task(t1))
+
+    def test_speed(self):
+        r = task_scheduler.TaskScheduler.ComputeResource('test', 5, 4)
+        t = task_scheduler.TaskScheduler.Task('task', 1, 50)
+
+        # A faster resource gets through a task in fewer ticks, rounded up
+        self.assertEqual(13, r.scaled_time(t.execution_time))
+        r.add_task(t)
+        ticks = 1
+        while not r.iterate():
+            ticks += 1
+        self.assertEqual(13, ticks)
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def test_conflicting_flags(self):
+        # Options that can't go together are rejected before loading anything
+        paths = [os.path.join(filepath, 'yaml_files', n)
+                 for n in ('tasks2.yaml', 'resources2.yaml')]
+        script = os.path.join(filepath, '..', 'task_scheduler.py')
+        for flags in (['--coarsen', '--simulation', 'tick'], ['--compact', '--simulation', 'tick'],
+                      ['--backfill', '--simulation', 'tick'], ['--coarsen', '--schedule-cache', 'x'],
+                      ['--portfolio', '--coarsen'], ['--portfolio', '--schedule-cache', 'x'],
+                      ['--portfolio', '--strategy', 'critical_path'],
+                      ['--portfolio', '--simulation', 'event']):
+            run = subprocess.run([sys.executable, script] + paths + flags,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+            self.assertEqual(2, run.returncode, flags)
+            self.assertIn('error:', run.stderr)
+            self.assertNotIn('Traceback', run.stderr)
+
 
 if __name__ == '__main__':
     unittest.main()
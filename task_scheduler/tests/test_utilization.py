@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+sys.path.insert(0, filepath)
+import task_scheduler
+import utilization
+from test_task_scheduler import add_memory, load_example, random_scheduler
+
+class TestUtilization(unittest.TestCase):
+
+    def test_report(self):
+        ts = load_example('2')
+        ts.quiet = True
+        report = ts.find_schedule().utilization
+        self.assertEqual(2000, report.idle)
+        self.assertAlmostEqual(2.0 / 3, report.utilization)
+        self.assertEqual([('compute1', 2, 1000, 200), ('compute2', 2, 400, 800),
+                          ('compute3', 6, 2600, 1000)],
+                         [(r.resource, r.cores, r.busy, r.idle) for r in report.resources])
+        # Largest idle core time first
+        self.assertEqual([('compute3', 450, 600, 6, 900), ('compute2', 0, 300, 2, 600)],
+                         [g[:5] for g in report.gaps[:2]])
+
+        # The tick simulation is replayed into the same report
+        ts = load_example('2')
+        ts.quiet = True
+        ticks = ts.find_schedule(simulation='tick').utilization
+        self.assertEqual((report.resources, report.gaps), (ticks.resources, ticks.gaps))
+
+    def test_timeline_matches_replay(self):
+        # Keeping the timeline while simulating gives the same one as
+        # replaying the placements afterwards, and core time adds up
+        for seed in range(20):
+            ts = random_scheduler(seed)
+            if seed % 2:
+                add_memory(ts, seed)
+            ts.quiet = True
+            ts.backfill = seed % 3 == 0
+            graph = ts.task_graph()
+            result = ts.find_schedule()
+            timeline = result.utilization.timeline
+            record = [(graph.index(p.task), p.resource, p.start, p.end)
+                      for p in result.placements]
+            replayed = utilization.UsageTimeline.replay(ts.resources, graph, record)
+            self.assertEqual((timeline.ticks, timeline.used), (replayed.ticks, replayed.used))
+            self.assertEqual((timeline.ready, timeline.started),
+                             (replayed.ready, replayed.started))
+            busy = dict((r.name, 0) for r in ts.resources)
+            for i, name, start, end in record:
+                busy[name] += graph.cores_required[i] * (end - start)
+            self.assertEqual(busy, dict((r.resource, r.busy)
+                                        for r in result.utilization.resources))
+            for gap in result.utilization.gaps:
+                self.assertTrue(all(b.waited > 0 for b in gap.blocked))
+
+    def test_blocked(self):
+        # b needs all four cores, so waits out a with two of them idle
+        Task = task_scheduler.TaskScheduler.Task
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        ts.resources.append(task_scheduler.TaskScheduler.ComputeResource('compute1', 4))
+        for task in (Task('a', 2, 100), Task('b', 4, 10)):
+            ts.tasks[task.name] = task
+        report = ts.find_schedule().utilization
+        self.assertEqual(utilization.IdleGap('compute1', 0, 100, 2, 200,
+                                             [utilization.BlockedTask('b', 4, 100)]),
+                         report.gaps[0])
+        self.assertEqual(1, len(report.gaps))
+
+        ts.track_usage = False
+        ts.tasks = {}
+        for task in (Task('a', 2, 100), Task('b', 4, 10)):
+            ts.tasks[task.name] = task
+        self.assertIsNone(ts.find_schedule().utilization)
+
+    def test_output(self):
+        ts = load_example('2')
+        ts.quiet = True
+        result = ts.find_schedule()
+        out = io.StringIO()
+        result.write(out)
+        self.assertIn('RESOURCE UTILIZATION: 66.7% (idle core time 2000)\n', out.getvalue())
+        self.assertIn('IDLE GAP: compute3 450-600, 6 cores free (idle core time 900), blocked: none\n',
+                      out.getvalue())
+        out = io.StringIO()
+        result.write(out, 'jsonl')
+        summary = json.loads(out.getvalue().splitlines()[-1])
+        self.assertEqual(2000, summary['utilization']['idle'])
+        self.assertEqual([], summary['utilization']['gaps'][0]['blocked'])
+
+        # A bar per task, the idle gaps outlined
+        out = io.StringIO()
+        result.write(out, 'svg')
+        svg = ElementTree.fromstring(out.getvalue())
+        rects = svg.findall('{http://www.w3.org/2000/svg}rect')
+        titled = [r for r in rects if r.find('{http://www.w3.org/2000/svg}title') is not None]
+        self.assertEqual(len(result.placements) + len(result.utilization.gaps), len(titled))
+        out = io.StringIO()
+        utilization.write_gantt(result, out, max_tasks=0)
+        svg = ElementTree.fromstring(out.getvalue())
+        self.assertEqual(3, len(svg.findall('{http://www.w3.org/2000/svg}polygon')))
+
+
+if __name__ == '__main__':
+    unittest.main()
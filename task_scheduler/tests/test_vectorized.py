@@ -0,0 +1,98 @@
+import os
+import random
+import sys
+import unittest
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import task_scheduler
+
+try:
+    import numpy
+    import vectorized
+except ImportError:
+    numpy = None
+
+def random_graph(seed, task_count=500):
+    """ Random acyclic TaskGraph, parents are always earlier tasks """
+    rng = random.Random(seed)
+    parent_offsets = [0]
+    parents = []
+    for i in range(task_count):
+        parents.extend(rng.sample(range(i), min(i, rng.randint(0, 4))))
+        parent_offsets.append(len(parents))
+    return task_scheduler.TaskScheduler.TaskGraph(
+        ['task{0}'.format(i) for i in range(task_count)],
+        [rng.randint(1, 8) for i in range(task_count)],
+        [rng.randint(1, 100) for i in range(task_count)],
+        parent_offsets, parents)
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestVectorized(unittest.TestCase):
+
+    def test_path_lengths(self):
+        # Level at a time results match the per task loops exactly
+        for seed in range(10):
+            graph = random_graph(seed)
+            upward, downward = vectorized.path_lengths(graph)
+            self.assertEqual(graph.path_lengths(), (upward.tolist(), downward.tolist()))
+            for strategy in task_scheduler.TaskScheduler.PRIORITY_STRATEGIES:
+                metrics = vectorized.priority_metrics(graph, strategy)
+                self.assertEqual(graph.priority_metrics(strategy), metrics.tolist())
+                self.assertEqual(graph.prioritize(strategy),
+                                 vectorized.prioritize(graph, metrics).tolist())
+
+    def test_weighted_path_lengths(self):
+        # Mean costs for resources of differing speeds weigh paths the same
+        profile = [(4, 1), (8, 2), (6, 1.5)]
+        for seed in range(5):
+            graph = random_graph(seed)
+            costs = graph.mean_costs(profile)
+            upward, downward = vectorized.path_lengths(graph, costs)
+            self.assertEqual(graph.path_lengths(costs),
+                             (upward.tolist(), downward.tolist()))
+
+    def test_topological_levels(self):
+        graph = random_graph(0)
+        levels = vectorized.topological_levels(graph)
+        self.assertEqual(len(graph), sum(len(level) for level in levels))
+        # Every task's parents sit in earlier levels
+        level_of = {}
+        for depth, level in enumerate(levels):
+            for i in level.tolist():
+                level_of[i] = depth
+        for i in range(len(graph)):
+            for p in graph.task_parents(i):
+                self.assertTrue(level_of[p] < level_of[i])
+
+        # Tasks caught in a cycle are left out of the order
+        graph = task_scheduler.TaskScheduler.TaskGraph(
+            ['a', 'b', 'c'], [1, 1, 1], [1, 1, 1], [0, 0, 2, 3], [0, 2, 1])
+        self.assertEqual([0], vectorized.topological_order(graph).tolist())
+
+    def test_oversized_tasks(self):
+        self.assertEqual([1, 3], vectorized.oversized_tasks(
+            [2, 7, 6, 9], [2, 6, 4]).tolist())
+        self.assertEqual([0], vectorized.oversized_tasks([1], []).tolist())
+
+    def test_non_integer_counts(self):
+        self.assertEqual([], vectorized.non_integer_counts([1, 2, 3]).tolist())
+        self.assertEqual([1, 3], vectorized.non_integer_counts(
+            [1, 'foo', 3, 2.5]).tolist())
+
+    def test_scheduler(self):
+        # The scheduler gives the same priorities either way
+        for n in ('1', '2'):
+            paths = [os.path.join(filepath, 'yaml_files', name.format(n))
+                     for name in ('resources{0}.yaml', 'tasks{0}.yaml')]
+            expected = task_scheduler.TaskScheduler()
+            expected.load(*paths)
+            ts = task_scheduler.TaskScheduler()
+            ts.vectorized = True
+            ts.load(*paths, compact=True)
+            self.assertEqual(expected.prioritize_tasks(), ts.prioritize_tasks())
+            self.assertEqual(expected.get_path_lengths(), ts.get_path_lengths())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+filepath = os.path.join(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(filepath, '..'))
+import task_scheduler
+import workers
+
+class TestWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.address = os.path.join(self.tmpdir, 'coordinator.sock')
+
+    def start_worker(self, name, cores):
+        """ Start a local worker process standing in for a node """
+        process = subprocess.Popen([sys.executable, os.path.join(filepath, '..', 'workers.py'),
+                                    name, str(cores), self.address, '--cwd', self.tmpdir,
+                                    '--heartbeat', '0.1'])
+        # Stopped workers still need killing off
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        return process
+
+    def scheduler(self, tasks):
+        """ Scheduler for tasks given as (name, cores, command, parents) on
+            compute1 (2 cores) and compute2 (4 cores) """
+        ts = task_scheduler.TaskScheduler()
+        ts.quiet = True
+        for name, cores in (('compute1', 2), ('compute2', 4)):
+            ts.resources.append(task_scheduler.TaskScheduler.ComputeResource(name, cores))
+        for name, cores, command, parents in tasks:
+            task = task_scheduler.TaskScheduler.Task(name, cores, 10)
+            task.command = command
+            for parent in parents:
+                task.add_parent(ts.tasks[parent])
+                ts.tasks[parent].add_child(task)
+            ts.tasks[name] = task
+        return ts
+
+    def test_parse_address(self):
+        self.assertEqual(('tcp', '127.0.0.1', 7000), workers.parse_address('127.0.0.1:7000'))
+        self.assertEqual(('unix', '/tmp/scheduler.sock'), workers.parse_address('/tmp/scheduler.sock'))
+
+    def test_run(self):
+        tasks = [('task{0}'.format(n), 1 + n % 2, 'echo $TASK_SCHEDULER_CPUS > task{0}.out'.format(n), [])
+                 for n in range(20)]
+        tasks.append(('last', 2, 'cat task*.out > last.out', [t[0] for t in tasks]))
+        tasks.append(('bad', 1, 'exit 2', []))
+        tasks.append(('after_bad', 1, 'touch never', ['bad']))
+        ts = self.scheduler(tasks)
+        result = ts.find_schedule()
+        for name, cores in (('compute1', 2), ('compute2', 4)):
+            self.start_worker(name, cores)
+        execution = workers.Coordinator(ts, result, self.address,
+                                        heartbeat_timeout=5).run()
+
+        records = dict((r.task, r) for r in execution)
+        self.assertEqual(23, len(records))
+        self.assertEqual(['bad'], [r.task for r in execution.failed()])
+        self.assertEqual(['after_bad'], [r.task for r in execution.skipped()])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'never')))
+        # Every task ran on the resource it was placed on, after its parents
+        placed = dict((p.task, p.resource) for p in result.placements)
+        for name, record in records.items():
+            if record.returncode is not None:
+                self.assertEqual(placed[name], record.resource)
+        self.assertTrue(all(records['last'].start >= records[t[0]].end for t in tasks[:20]))
+        with open(os.path.join(self.tmpdir, 'last.out')) as f:
+            self.assertEqual(20, len(f.read().splitlines()))
+
+    def test_failed_worker(self):
+        # The first task to run stops its own worker, which then goes quiet
+        # and has its tasks rescheduled onto the other worker
+        stop = 'if [ ! -f stopped ]; then touch stopped; kill -STOP $PPID; fi'
+        ts = self.scheduler([('wide', 2, stop, []),
+                             ('after', 1, 'touch after.out', ['wide'])])
+        result = ts.find_schedule()
+        planned = dict((p.task, p.resource) for p in result.placements)
+        self.assertEqual('compute1', planned['wide'])
+        for name, cores in (('compute1', 2), ('compute2', 4)):
+            self.start_worker(name, cores)
+        execution = workers.Coordinator(ts, result, self.address,
+                                        heartbeat_timeout=0.5).run()
+
+        records = dict((r.task, r) for r in execution)
+        self.assertEqual('compute2', records['wide'].resource)
+        self.assertEqual('compute2', records['after'].resource)
+        self.assertEqual([], execution.failed() + execution.skipped())
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'after.out')))
+
+    def test_missing_worker(self):
+        # Tasks placed on a resource whose worker never connects move on once
+        # connect_timeout passes, tasks too wide for any live worker are skipped
+        ts = self.scheduler([('small', 1, 'true', []), ('wide', 4, 'true', [])])
+        result = ts.find_schedule()
+        self.start_worker('compute1', 2)
+        execution = workers.Coordinator(ts, result, self.address,
+                                        connect_timeout=0.5).run()
+        records = dict((r.task, r) for r in execution)
+        self.assertEqual(0, records['small'].returncode)
+        self.assertEqual(['wide'], [r.task for r in execution.skipped()])
+
+
+if __name__ == '__main__':
+    unittest.main()
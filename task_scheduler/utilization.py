@@ -0,0 +1,236 @@
+""" Where a schedule left capacity unused
+
+simulate_graph keeps a UsageTimeline of the cores in use on each resource,
+recorded only at the ticks that changes, so a task costs at most two entries
+however long it runs and there's nothing per tick. Along with it go the tick
+each task became ready and the tick it started.
+
+From that come each resource's utilization and idle core time (idle cores
+times ticks), the largest idle gaps (stretches of unchanging usage with cores
+free, biggest idle core time first) along with the tasks that sat ready while
+a gap was open and would have fitted on its resource, and a Gantt chart of
+the schedule as SVG. A task that was ready but didn't go into a gap mostly
+needed more cores than were free, so the blocked tasks say which tasks the
+cores were being held for """
+import array
+import collections
+import heapq
+from xml.sax.saxutils import escape
+
+# Largest idle gaps reported, and blocked tasks listed per gap
+GAPS = 5
+BLOCKED = 3
+
+# Placements beyond this many are left out of Gantt charts, only the cores in
+# use on each resource are drawn
+GANTT_TASKS = 10000
+
+# busy and idle are core time (cores times ticks) over the schedule
+ResourceUsage = collections.namedtuple('ResourceUsage',
+    ['resource', 'cores', 'busy', 'idle', 'utilization'])
+
+# free_cores cores of resource free from start up to end, idle core time in
+# all. blocked holds the BlockedTasks that could have used them
+IdleGap = collections.namedtuple('IdleGap',
+    ['resource', 'start', 'end', 'free_cores', 'idle', 'blocked'])
+
+# A task that sat ready for waited ticks of an idle gap without being placed
+BlockedTask = collections.namedtuple('BlockedTask', ['task', 'cores_required', 'waited'])
+
+# ResourceUsage of every resource, the largest IdleGaps and the utilization
+# and idle core time over all resources. timeline is the UsageTimeline they
+# came from
+UtilizationReport = collections.namedtuple('UtilizationReport',
+    ['resources', 'gaps', 'utilization', 'idle', 'timeline'])
+
+
+class UsageTimeline:
+    """ Cores in use on each resource from the start tick on, ticks[name]
+        holding the ticks usage changed and used[name] the cores in use
+        from each of them. ready and started hold the tick each task became
+        ready and started, -1 if it didn't """
+    def __init__(self, resources, task_count, start=0):
+        self.start = start
+        self.cores = collections.OrderedDict((r.name, r.cores_total) for r in resources)
+        self.memory = dict((r.name, r.memory_total) for r in resources)
+        self.ticks = dict((r.name, array.array('q', [start])) for r in resources)
+        self.used = dict((r.name, array.array('q', [0])) for r in resources)
+        self.ready = array.array('q', [-1]) * task_count
+        self.started = array.array('q', [-1]) * task_count
+
+    def change(self, resource, tick):
+        """ Note the cores in use on resource (a ComputeResource) from tick
+            on, only the last change on any one tick counts """
+        ticks, used = self.ticks[resource.name], self.used[resource.name]
+        cores = resource.cores_total - resource.cores_available()
+        if ticks[-1] == tick:
+            used[-1] = cores
+            if len(used) > 1 and used[-2] == cores:
+                ticks.pop()
+                used.pop()
+        elif used[-1] != cores:
+            ticks.append(tick)
+            used.append(cores)
+
+    @classmethod
+    def replay(cls, resources, graph, record, start=0):
+        """ UsageTimeline of a schedule that was found some other way than
+            simulate_graph, from record holding (task id, resource name,
+            start, end) for each placement of a task of graph. Tasks count as
+            ready once their last parent ended """
+        timeline = cls(resources, len(graph), start)
+        cores_required = graph.cores_required
+        ends = [None] * len(graph)
+        changes = dict((name, collections.defaultdict(int)) for name in timeline.cores)
+        for i, name, begin, end in record:
+            timeline.started[i] = begin
+            ends[i] = end
+            changes[name][begin] += cores_required[i]
+            changes[name][end] -= cores_required[i]
+        for i, _, _, _ in record:
+            timeline.ready[i] = max([start] + [ends[p] for p in graph.task_parents(i)
+                                               if ends[p] is not None])
+        for name, deltas in changes.items():
+            ticks, used = timeline.ticks[name], timeline.used[name]
+            for tick in sorted(deltas):
+                cores = used[-1] + deltas[tick]
+                if tick == ticks[-1]:
+                    used[-1] = cores
+                elif cores != used[-1]:
+                    ticks.append(tick)
+                    used.append(cores)
+        return timeline
+
+    def intervals(self, name, end):
+        """ (start, end, cores in use) of each stretch of unchanging usage on
+            resource name up to the end tick """
+        ticks, used = self.ticks[name], self.used[name]
+        for k in range(len(ticks)):
+            stop = ticks[k+1] if k + 1 < len(ticks) else end
+            if stop > ticks[k]:
+                yield ticks[k], min(stop, end), used[k]
+
+    def report(self, makespan, graph, gaps=GAPS, blocked=BLOCKED):
+        """ UtilizationReport of the schedule up to makespan, graph being
+            the TaskGraph simulated """
+        resources = []
+        found = []
+        for name, cores in self.cores.items():
+            busy = 0
+            for start, end, used in self.intervals(name, makespan):
+                busy += used * (end - start)
+                if used < cores:
+                    found.append((name, start, end, cores - used, (cores - used) * (end - start)))
+            capacity = cores * (makespan - self.start)
+            resources.append(ResourceUsage(name, cores, busy, capacity - busy,
+                                           float(busy) / capacity if capacity else 0.0))
+        found = heapq.nlargest(gaps, found, key=lambda gap: gap[4])
+        busy = sum(r.busy for r in resources)
+        capacity = busy + sum(r.idle for r in resources)
+        return UtilizationReport(resources,
+            [IdleGap(*(gap + (tasks,))) for gap, tasks in zip(found, self.blocked(graph, found, blocked))],
+            float(busy) / capacity if capacity else 0.0, capacity - busy, self)
+
+    def blocked(self, graph, gaps, count):
+        """ Lists of the count BlockedTasks waiting longest in each of gaps,
+            (resource name, start, end, ...) tuples. A task is waiting from
+            when it became ready until it started, and only counts for a gap
+            if it needs no more cores or memory than the gap's resource has """
+        waiting = [[] for _ in gaps]
+        if not gaps:
+            return waiting
+        first = min(gap[1] for gap in gaps)
+        last = max(gap[2] for gap in gaps)
+        cores_required = graph.cores_required
+        memory_required = graph.memory_required
+        for i, ready in enumerate(self.ready):
+            started = self.started[i]
+            if ready < 0 or started <= ready or started <= first or ready >= last:
+                continue
+            for k, (name, start, end, _, _) in enumerate(gaps):
+                waited = min(started, end) - max(ready, start)
+                if waited <= 0 or cores_required[i] > self.cores[name]:
+                    continue
+                memory = self.memory[name]
+                if memory_required is not None and memory is not None and \
+                        memory_required[i] > memory:
+                    continue
+                # Longest waiting first, earlier task ids winning ties
+                entry = (waited, -i)
+                if len(waiting[k]) < count:
+                    heapq.heappush(waiting[k], entry)
+                elif entry > waiting[k][0]:
+                    heapq.heapreplace(waiting[k], entry)
+        names = graph.names
+        return [[BlockedTask(names[-i], cores_required[-i], waited)
+                 for waited, i in sorted(entries, reverse=True)] for entries in waiting]
+
+
+def write_gantt(result, f, max_tasks=GANTT_TASKS, width=1000):
+    """ SVG Gantt chart of a ScheduleResult, a band per resource as high as
+        its cores with the cores in use shaded, the reported idle gaps
+        outlined in red and each task a bar in the first lane free when it
+        started (with up to max_tasks tasks) """
+    report = result.utilization
+    makespan = max(result.makespan, 1)
+    margin, band, gap = 120, 60, 10
+    if report is not None:
+        names = [r.resource for r in report.resources]
+        cores = dict((r.resource, r.cores) for r in report.resources)
+    else:
+        names = list(collections.OrderedDict((p.resource, None) for p in result.placements))
+        cores = {}
+    scale = float(width) / makespan
+    height = len(names) * (band + gap) + 30
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" font-family="sans-serif" font-size="11">\n'.format(
+        margin + width + 10, height)]
+    top = dict((name, 10 + k * (band + gap)) for k, name in enumerate(names))
+    for name in names:
+        y = top[name]
+        out.append('<text x="4" y="{0}">{1}</text>\n'.format(y + band // 2 + 4, escape(name)))
+        out.append('<rect x="{0}" y="{1}" width="{2}" height="{3}" fill="#eeeeee"/>\n'.format(
+            margin, y, width, band))
+        if report is None or not cores[name]:
+            continue
+        # Cores in use as a step outline, filled down to the bottom of the band
+        points = ['{0:.2f},{1}'.format(margin, y + band)]
+        for start, end, used in report.timeline.intervals(name, result.makespan):
+            level = y + band - band * float(used) / cores[name]
+            points.append('{0:.2f},{1:.2f} {2:.2f},{1:.2f}'.format(
+                margin + start * scale, level, margin + end * scale))
+        points.append('{0:.2f},{1}'.format(margin + width, y + band))
+        out.append('<polygon points="{0}" fill="#9ecae1"/>\n'.format(' '.join(points)))
+    if report is not None:
+        for g in report.gaps:
+            out.append('<rect x="{0:.2f}" y="{1}" width="{2:.2f}" height="{3:.2f}" fill="none" stroke="#d62728">'
+                       '<title>{4}: {5} cores free {6}-{7}</title></rect>\n'.format(
+                margin + g.start * scale, top[g.resource], (g.end - g.start) * scale,
+                band * float(g.free_cores) / cores[g.resource],
+                escape(g.resource), g.free_cores, g.start, g.end))
+    if len(result.placements) <= max_tasks:
+        lanes = collections.defaultdict(list)
+        placed = collections.defaultdict(list)
+        for p in sorted(result.placements, key=lambda p: (p.start, p.end)):
+            # First lane whose last task has ended, a new lane otherwise
+            ends = lanes[p.resource]
+            lane = next((k for k, end in enumerate(ends) if end <= p.start), len(ends))
+            if lane == len(ends):
+                ends.append(p.end)
+            else:
+                ends[lane] = p.end
+            placed[p.resource].append((lane, p))
+        for name, bars in placed.items():
+            if name not in top:
+                continue
+            lane_height = float(band) / len(lanes[name])
+            for lane, p in bars:
+                out.append('<rect x="{0:.2f}" y="{1:.2f}" width="{2:.2f}" height="{3:.2f}" '
+                           'fill="#3182bd" fill-opacity="0.5" stroke="#08519c" stroke-width="0.5">'
+                           '<title>{4} {5}-{6}</title></rect>\n'.format(
+                    margin + p.start * scale, top[name] + lane * lane_height,
+                    (p.end - p.start) * scale, lane_height, escape(p.task), p.start, p.end))
+    out.append('<text x="{0}" y="{1}">0</text>\n'.format(margin, height - 6))
+    out.append('<text x="{0}" y="{1}" text-anchor="end">{2}</text>\n'.format(
+        margin + width, height - 6, result.makespan))
+    out.append('</svg>\n')
+    f.write(''.join(out))
@@ -0,0 +1,127 @@
+""" NumPy versions of the per task graph computations
+
+Everything here works on a TaskScheduler.TaskGraph one topological level at a
+time (a level being every task whose parents are all in earlier levels), so
+the per task Python loops become a handful of array operations per level.
+Results match the pure Python TaskGraph methods exactly. Graphs made of
+long chains have about as many levels as tasks, for those the pure Python
+methods are the better choice """
+import array
+
+import numpy as np
+
+
+def as_array(values):
+    """ View a typed array (or memory mapped memoryview) as a numpy array
+        without copying it """
+    if isinstance(values, (array.array, memoryview)):
+        typecode = getattr(values, 'typecode', None) or values.format
+        return np.frombuffer(values,
+            dtype=np.float64 if typecode == 'd' else np.int64)
+    return np.asarray(values)
+
+
+def gather(offsets, indexes, ids):
+    """ CSR rows for the given ids concatenated, along with how many entries
+        each row had """
+    starts = offsets[ids]
+    counts = offsets[ids + 1] - starts
+    total = int(counts.sum())
+    # Position of each entry within the concatenation, shifted onto its row
+    shift = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return indexes[np.arange(total, dtype=np.int64) + shift], counts
+
+
+def segment_max(values, counts):
+    """ Max of each consecutive run of counts values, 0 for empty runs """
+    result = np.zeros(len(counts), dtype=values.dtype)
+    nonempty = counts > 0
+    if nonempty.any():
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        result[nonempty] = np.maximum.reduceat(values, starts)
+    return result
+
+
+def topological_levels(graph):
+    """ Task ids grouped into topological levels (Kahn's algorithm a whole
+        level at a time), tasks caught in a dependency cycle are left out """
+    if 'topological_levels' not in graph.cache:
+        parent_offsets = as_array(graph.parent_offsets)
+        child_offsets = as_array(graph.child_offsets)
+        children = as_array(graph.children)
+        parents_left = np.diff(parent_offsets)
+        frontier = np.flatnonzero(parents_left == 0)
+        levels = []
+        while len(frontier):
+            levels.append(frontier)
+            reached, _ = gather(child_offsets, children, frontier)
+            candidates, links = np.unique(reached, return_counts=True)
+            parents_left[candidates] -= links
+            frontier = candidates[parents_left[candidates] == 0]
+        graph.cache['topological_levels'] = levels
+    return graph.cache['topological_levels']
+
+
+def topological_order(graph):
+    levels = topological_levels(graph)
+    if not levels:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(levels)
+
+
+def path_lengths(graph, costs=None):
+    """ Upward and downward longest execution time paths, as
+        TaskGraph.path_lengths """
+    levels = topological_levels(graph)
+    execution_times = as_array(graph.execution_times if costs is None else costs)
+
+    offsets, parents = as_array(graph.parent_offsets), as_array(graph.parents)
+    upward = execution_times.copy()
+    for level in levels:
+        above, counts = gather(offsets, parents, level)
+        upward[level] += segment_max(upward[above], counts)
+
+    offsets, children = as_array(graph.child_offsets), as_array(graph.children)
+    downward = execution_times.copy()
+    for level in reversed(levels):
+        below, counts = gather(offsets, children, level)
+        downward[level] += segment_max(downward[below], counts)
+    return upward, downward
+
+
+def priority_metrics(graph, strategy='cores_full_time'):
+    """ Priority metric of every task, as TaskGraph.priority_metrics """
+    upward, downward = path_lengths(graph)
+    if strategy == 'cores_full_time':
+        return as_array(graph.cores_required) * upward
+    if strategy == 'critical_path':
+        return upward + downward - as_array(graph.execution_times)
+    if strategy == 'heft_upward_rank':
+        return downward
+    return as_array(graph.execution_times).copy()
+
+
+def prioritize(graph, metrics=None):
+    """ Task ids by descending priority metric, ties keep id order """
+    if metrics is None:
+        metrics = priority_metrics(graph)
+    return np.argsort(-metrics, kind='stable')
+
+
+def oversized_tasks(cores_required, resource_cores):
+    """ Ids of tasks needing more cores than any resource has """
+    cores_required = as_array(cores_required)
+    largest = max(resource_cores) if len(resource_cores) else 0
+    return np.flatnonzero(cores_required > largest)
+
+
+def non_integer_counts(values):
+    """ Positions of values that aren't integers, checked in bulk when the
+        values all parse to a numeric array """
+    try:
+        if np.asarray(values).dtype.kind in 'iub':
+            return np.zeros(0, dtype=np.int64)
+    except (ValueError, OverflowError):
+        pass # Mixed values that numpy can't pack, fall back to checking each
+    return np.array([i for i, v in enumerate(values) if not isinstance(v, int)],
+                    dtype=np.int64)
@@ -0,0 +1,405 @@
+""" Running scheduled tasks on worker processes, possibly on other machines
+
+A Worker stands in for one ComputeResource. It connects to a Coordinator
+over TCP ("host:port") or a Unix socket (any other address, a path) and runs
+the commands the coordinator dispatches to it, pinned to its own CPUs the
+same way executor.py does. The coordinator follows a ScheduleResult like
+LocalExecutor, sending each task to the worker for the resource it was
+placed on once its parents have finished and that worker has the cores free.
+
+Messages are JSON objects, one per line. Every dispatch pass sends one
+message per worker holding all the tasks it was given and workers gather up
+completions for batch_interval seconds before sending them, so busy runs
+cost a message per batch rather than per task. Workers send heartbeats, a
+worker that goes quiet for heartbeat_timeout seconds (or whose connection
+drops) is taken to have failed. The tasks it was running are rescheduled
+onto the tightest fitting live worker, as are tasks placed on resources whose
+workers never connected within connect_timeout seconds. Tasks no live worker
+has the cores for are skipped along with everything depending on them
+
+To try it out on one machine start a worker process per resource
+python3 workers.py compute1 4 /tmp/scheduler.sock
+and run the scheduler with --workers /tmp/scheduler.sock """
+import asyncio
+import json
+import sys
+import time
+
+import executor
+
+# Longest message line accepted, dispatch and completion batches included
+LINE_LIMIT = 1 << 24
+
+
+def parse_address(address):
+    """ ('tcp', host, port) for "host:port" addresses, ('unix', path)
+        otherwise """
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and '/' not in address:
+        return ('tcp', host, int(port))
+    return ('unix', address)
+
+
+async def serve(address, callback):
+    parsed = parse_address(address)
+    if parsed[0] == 'tcp':
+        return await asyncio.start_server(callback, parsed[1], parsed[2],
+                                          limit=LINE_LIMIT)
+    return await asyncio.start_unix_server(callback, parsed[1], limit=LINE_LIMIT)
+
+
+async def connect(address):
+    parsed = parse_address(address)
+    if parsed[0] == 'tcp':
+        return await asyncio.open_connection(parsed[1], parsed[2], limit=LINE_LIMIT)
+    return await asyncio.open_unix_connection(parsed[1], limit=LINE_LIMIT)
+
+
+def send(writer, message):
+    writer.write(json.dumps(message).encode('utf-8') + b'\n')
+
+
+class Worker:
+    def __init__(self, name, cores, address, cpus=None, cwd=None,
+                 heartbeat_interval=1.0, batch_interval=0.005, connect_timeout=30.0):
+        """ Worker for the resource called name with the given number of
+            cores, mapped onto cpus (all of this process's by default). The
+            coordinator is retried for up to connect_timeout seconds so
+            workers can be started before it """
+        self.name = name
+        self.cores = cores
+        self.address = address
+        cpus = cpus or executor.available_cpus()
+        self.cpus = [cpus[c % len(cpus)] for c in range(cores)]
+        self.cwd = cwd
+        self.heartbeat_interval = heartbeat_interval
+        self.batch_interval = batch_interval
+        self.connect_timeout = connect_timeout
+        self.free = list(range(cores))
+        self.completed = []
+        self.flush_handle = None
+        self.writer = None
+
+    def run(self):
+        asyncio.run(self.work())
+
+    async def work(self):
+        """ Run dispatched tasks until the coordinator shuts us down or goes
+            away """
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                reader, self.writer = await connect(self.address)
+                break
+            except (ConnectionError, OSError):
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+        send(self.writer, {'type': 'hello', 'resource': self.name, 'cores': self.cores})
+        heartbeat = asyncio.ensure_future(self.heartbeat())
+        running = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message['type'] == 'dispatch':
+                    for task in message['tasks']:
+                        future = asyncio.ensure_future(self.run_task(task))
+                        running.add(future)
+                        future.add_done_callback(running.discard)
+                elif message['type'] == 'shutdown':
+                    break
+        finally:
+            heartbeat.cancel()
+            for future in running:
+                future.cancel()
+            self.writer.close()
+
+    async def heartbeat(self):
+        while True:
+            send(self.writer, {'type': 'heartbeat'})
+            await self.writer.drain()
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def run_task(self, task):
+        cores = self.free[:task['cores']]
+        del self.free[:task['cores']]
+        cpus = sorted(set(self.cpus[c] for c in cores))
+        start = time.monotonic()
+        try:
+            returncode = 0
+            if task['command']:
+                returncode = await executor.run_command(task['command'], cpus, self.cwd)
+        finally:
+            self.free.extend(cores)
+        self.completed.append({'task': task['task'], 'cpus': cpus, 'start': start,
+                               'end': time.monotonic(), 'returncode': returncode})
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_interval, self.flush)
+
+    def flush(self):
+        """ Send the completions gathered since the last flush, along with
+            our clock so the coordinator can put their times onto its own """
+        self.flush_handle = None
+        send(self.writer, {'type': 'done', 'time': time.monotonic(),
+                           'tasks': self.completed})
+        self.completed = []
+
+
+class WorkerConnection:
+    """ The coordinator's view of a connected worker """
+    def __init__(self, name, cores_total, writer):
+        self.name = name
+        self.cores_total = cores_total
+        self.cores_free = cores_total
+        self.writer = writer
+        self.last_seen = time.monotonic()
+        self.alive = True
+        # Task ids dispatched to the worker and not yet completed
+        self.tasks = set()
+
+
+class Coordinator:
+    def __init__(self, scheduler, result, address, heartbeat_timeout=5.0,
+                 connect_timeout=30.0):
+        """ Run the tasks of scheduler following result, a ScheduleResult
+            from it, on workers connecting to address """
+        graph = scheduler.task_graph()
+        self.graph = graph
+        self.commands = graph.commands or [None] * len(graph)
+        self.address = address
+        self.heartbeat_timeout = heartbeat_timeout
+        self.connect_timeout = connect_timeout
+        self.placements = dict((graph.index(p.task), p) for p in result.placements)
+        if len(self.placements) != len(graph):
+            raise ValueError('the schedule does not place every task')
+        self.rank = dict((graph.index(p.task), position)
+                         for position, p in enumerate(result.placements))
+        # Cores of every resource a worker is expected for
+        self.expected = dict((r.name, r.cores_total) for r in scheduler.resources)
+        self.live = {}
+        self.failed = set()
+        # Times each task was started on a worker that then failed
+        self.attempts = [0] * len(graph)
+
+    def run(self):
+        """ Run every task, returning an executor.ExecutionResult """
+        return asyncio.run(self.coordinate())
+
+    def now(self):
+        return time.monotonic() - self.started
+
+    async def coordinate(self):
+        graph = self.graph
+        self.started = time.monotonic()
+        self.changed = asyncio.Event()
+        self.parents_left = [len(graph.task_parents(i)) for i in range(len(graph))]
+        self.ready = [(self.rank[i], i) for i in range(len(graph))
+                      if self.parents_left[i] == 0]
+        # Records of tasks dispatched or finished, finished counting those
+        # that have completed
+        self.records = {}
+        self.finished = 0
+        # Tasks serving each worker connection
+        self.connections = set()
+        self.skipped = set()
+        server = await serve(self.address, self.connected)
+        try:
+            while self.finished + len(self.skipped) < len(graph):
+                self.check_workers()
+                self.dispatch()
+                if self.finished + len(self.skipped) == len(graph):
+                    break
+                try:
+                    await asyncio.wait_for(self.changed.wait(),
+                                           self.heartbeat_timeout / 2.0)
+                except asyncio.TimeoutError:
+                    pass
+                self.changed.clear()
+                for worker in list(self.live.values()):
+                    await self.drain(worker)
+        finally:
+            for worker in list(self.live.values()):
+                try:
+                    send(worker.writer, {'type': 'shutdown'})
+                    await worker.writer.drain()
+                except (ConnectionError, OSError):
+                    pass
+                worker.writer.close()
+            server.close()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await server.wait_closed()
+
+        records = sorted((r for r in self.records.values() if r.end is not None),
+                         key=lambda r: r.start)
+        records.extend(executor.ExecutionRecord(graph.names[i],
+            self.placements[i].resource, [], self.placements[i].start,
+            self.placements[i].end, None, None, None) for i in sorted(self.skipped))
+        return executor.ExecutionResult(records, self.now())
+
+    async def connected(self, reader, writer):
+        """ Serve one worker connection """
+        try:
+            hello = json.loads(await reader.readline() or b'null')
+        except ValueError:
+            hello = None
+        if not hello or hello.get('type') != 'hello' or hello['resource'] in self.live:
+            writer.close()
+            return
+        worker = WorkerConnection(hello['resource'], hello['cores'], writer)
+        self.connections.add(asyncio.current_task())
+        self.live[worker.name] = worker
+        self.failed.discard(worker.name)
+        self.changed.set()
+        try:
+            while worker.alive:
+                line = await reader.readline()
+                if not line:
+                    break
+                worker.last_seen = time.monotonic()
+                message = json.loads(line)
+                if message['type'] == 'done':
+                    self.completed(worker, message)
+        except (ConnectionError, ValueError):
+            pass
+        self.lost(worker)
+
+    def completed(self, worker, message):
+        """ Record a batch of completions from worker """
+        if not worker.alive:
+            return
+        # Worker clock times onto ours, ignoring the time the message took
+        offset = self.now() - message['time']
+        for done in message['tasks']:
+            i = self.graph.index(done['task'])
+            if i not in worker.tasks:
+                continue
+            worker.tasks.discard(i)
+            worker.cores_free += self.graph.cores_required[i]
+            self.records[i] = self.records[i]._replace(cpus=done['cpus'],
+                start=done['start'] + offset, end=done['end'] + offset,
+                returncode=done['returncode'])
+            self.finished += 1
+            if done['returncode'] != 0:
+                self.skip_below(i)
+                continue
+            for c in self.graph.task_children(i):
+                self.parents_left[c] -= 1
+                if self.parents_left[c] == 0 and c not in self.skipped:
+                    self.ready.append((self.rank[c], c))
+        self.changed.set()
+
+    def skip_below(self, i):
+        below = list(self.graph.task_children(i))
+        while below:
+            c = below.pop()
+            if c not in self.skipped:
+                self.skipped.add(c)
+                below.extend(self.graph.task_children(c))
+
+    def lost(self, worker):
+        """ Give up on a worker, rescheduling the tasks it was running """
+        if not worker.alive:
+            return
+        worker.alive = False
+        if self.live.get(worker.name) is worker:
+            del self.live[worker.name]
+        self.failed.add(worker.name)
+        for i in worker.tasks:
+            self.attempts[i] += 1
+            del self.records[i]
+            self.ready.append((self.rank[i], i))
+        worker.tasks = set()
+        worker.writer.close()
+        self.changed.set()
+
+    def check_workers(self):
+        """ Fail workers that have gone quiet and resources whose workers
+            never turned up """
+        now = time.monotonic()
+        for worker in list(self.live.values()):
+            if now - worker.last_seen > self.heartbeat_timeout:
+                self.lost(worker)
+        if now - self.started > self.connect_timeout:
+            self.failed.update(name for name in self.expected if name not in self.live)
+
+    def choose(self, i):
+        """ Worker to start task i on now, None to leave it waiting. Tasks go
+            to the worker for the resource they were placed on, or if that's
+            failed the tightest fitting live worker """
+        cores = self.graph.cores_required[i]
+        planned = self.placements[i].resource
+        if planned not in self.failed:
+            worker = self.live.get(planned)
+            return worker if worker and worker.cores_free >= cores else None
+        fits = [w for w in self.live.values() if w.cores_free >= cores]
+        if not fits:
+            return None
+        return min(fits, key=lambda w: (w.cores_free, w.name))
+
+    def runnable(self, i):
+        """ Whether some worker, live or still to connect, could ever take
+            task i """
+        cores = self.graph.cores_required[i]
+        return (any(w.cores_total >= cores for w in self.live.values()) or
+                any(total >= cores for name, total in self.expected.items()
+                    if name not in self.failed and name not in self.live))
+
+    def dispatch(self):
+        """ Start every ready task that has a worker with the cores free,
+            sending each worker its tasks in one message """
+        pending = sorted(self.ready)
+        self.ready = []
+        batches = {}
+        for rank, i in pending:
+            worker = self.choose(i)
+            if worker is None:
+                if self.runnable(i):
+                    self.ready.append((rank, i))
+                else:
+                    self.skipped.add(i)
+                    self.skip_below(i)
+                continue
+            worker.cores_free -= self.graph.cores_required[i]
+            worker.tasks.add(i)
+            placement = self.placements[i]
+            self.records[i] = executor.ExecutionRecord(placement.task, worker.name,
+                [], placement.start, placement.end, self.now(), None, None)
+            batches.setdefault(worker, []).append({'task': placement.task,
+                'command': self.commands[i], 'cores': self.graph.cores_required[i]})
+        for worker, tasks in batches.items():
+            try:
+                send(worker.writer, {'type': 'dispatch', 'tasks': tasks})
+            except (ConnectionError, OSError):
+                self.lost(worker)
+
+    async def drain(self, worker):
+        try:
+            await worker.writer.drain()
+        except (ConnectionError, OSError):
+            self.lost(worker)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    argparser = argparse.ArgumentParser(
+        description='Worker running the tasks a coordinator dispatches to one compute resource')
+    argparser.add_argument('resource', type=str, help='name of the compute resource this worker is')
+    argparser.add_argument('cores', type=int, help='cores the resource has')
+    argparser.add_argument('address', type=str, help='coordinator address, host:port or a Unix socket path')
+    argparser.add_argument('--cwd', type=str, default=None,
+                           help='directory to run commands in')
+    argparser.add_argument('--heartbeat', type=float, default=1.0, metavar='SECONDS',
+                           help='seconds between heartbeats')
+    args = argparser.parse_args()
+
+    try:
+        Worker(args.resource, args.cores, args.address, cwd=args.cwd,
+               heartbeat_interval=args.heartbeat).run()
+    except (ConnectionError, OSError) as e:
+        print('\nERROR: {0}\n'.format(e))
+        sys.exit(-1)